@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Compare building entities row by row with the columnar builder.
+
+Usage : python benchmarks/bench_columnar.py [n]
+"""
+
+import sys
+import timeit
+
+from datetime import datetime, timedelta
+
+from ngsildclient import ColumnarEntityBuilder, Entity
+
+
+def columns(n: int) -> dict:
+    start = datetime(2022, 1, 1)
+    return {
+        "name": [f"Specimen{i}" for i in range(n)],
+        "seen": [start + timedelta(seconds=i) for i in range(n)],
+        "legs": [i % 8 for i in range(n)],
+        "wings": [i % 2 for i in range(n)],
+        "amount": [float(i) for i in range(n)],
+    }
+
+
+def by_row(data: dict) -> list:
+    res = []
+    for name, seen, legs, wings, amount in zip(*data.values()):
+        e = Entity("SpecimenObserved", name)
+        e.obs(seen)
+        e.prop("legs", legs).prop("wings", wings).prop("amountObserved", amount, observedat=seen)
+        res.append(e)
+    return res
+
+
+def by_column(data: dict) -> list:
+    builder = ColumnarEntityBuilder("SpecimenObserved", "name").obs("seen")
+    builder.prop("legs", "legs").prop("wings", "wings").prop("amountObserved", "amount", observedat="seen")
+    return builder.build(data)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    data = columns(n)
+    for name, f in (("by row", by_row), ("by column", by_column)):
+        best = min(timeit.repeat(lambda: f(data), number=1, repeat=3))
+        print(f"{name:<12} {best * 1e6 / n:8.2f} µs/entity ({n / best:,.0f} entities/s)")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Measure the per-entity cost of decoding query results and of cloning a template.
+
+Usage : python benchmarks/bench_entity.py [n]
+"""
+
+import copy
+import sys
+import timeit
+
+from ngsildclient import Entity, EntityTemplate
+
+
+def payloads(n: int) -> list:
+    e = Entity("AirQualityObserved", "RZ:Obsv0")
+    e.tprop("dateObserved", "2018-08-07T12:00:00Z")
+    e.prop("NO2", 22, unitcode="GP", observedat="2018-08-07T12:00:00Z").prop("accuracy", 0.95, nested=True)
+    e.rel("refPointOfInterest", "PointOfInterest:RZ:MainSquare")
+    payload = e.to_dict()
+    res = []
+    for i in range(n):
+        p = copy.deepcopy(payload)
+        p["id"] = f"urn:ngsi-ld:AirQualityObserved:RZ:Obsv{i}"
+        res.append(p)
+    return res
+
+
+def bench(name: str, f, n: int, repeat: int = 5):
+    data = [payloads(n) for _ in range(repeat)]
+    timings = timeit.repeat(lambda: [f(p) for p in data.pop()], number=1, repeat=repeat)
+    best = min(timings)
+    print(f"{name:<12} {best * 1e6 / n:8.2f} µs/entity ({n / best:,.0f} entities/s)")
+
+
+def bench_clone(n: int, repeat: int = 5):
+    template = Entity.from_dict(payloads(1)[0])
+
+    def f(e: Entity, i: int):
+        e.id = f"urn:ngsi-ld:AirQualityObserved:RZ:Obsv{i}"
+        e["NO2"].value = i
+
+    best = min(timeit.repeat(lambda: Entity.clone(template, n, f), number=1, repeat=repeat))
+    print(f"{'clone':<12} {best * 1e6 / n:8.2f} µs/entity ({n / best:,.0f} entities/s)")
+
+
+def bench_template(n: int, repeat: int = 5):
+    def build(i: int) -> Entity:
+        e = Entity("AirQualityObserved", f"RZ:Obsv{i}")
+        e.tprop("dateObserved", "2018-08-07T12:00:00Z")
+        e.prop("NO2", i, unitcode="GP", observedat="2018-08-07T12:00:00Z").prop("accuracy", 0.95, nested=True)
+        e.rel("refPointOfInterest", "PointOfInterest:RZ:MainSquare")
+        return e
+
+    template = EntityTemplate(build(0), date="dateObserved", no2="NO2", observed="NO2.observedAt")
+
+    def new(i: int) -> Entity:
+        date = "2018-08-07T12:00:00Z"
+        return template.new(f"RZ:Obsv{i}", date=date, no2=i, observed=date)
+
+    for name, f in (("build", build), ("template", new)):
+        best = min(timeit.repeat(lambda: [f(i) for i in range(n)], number=1, repeat=repeat))
+        print(f"{name:<12} {best * 1e6 / n:8.2f} µs/entity ({n / best:,.0f} entities/s)")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    bench("from_dict", Entity.from_dict, n)
+    bench("from_broker", Entity.from_broker, n)
+    bench_clone(n)
+    bench_template(n)
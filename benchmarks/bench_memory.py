@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Measure the memory footprint of a working set of entities.
+
+Slotted Entity/NgsiDict instances are compared with their unslotted equivalents (subclasses with a __dict__),
+as well as with the raw payloads.
+Attributes are read once so that their typed views get cached.
+
+Usage : python benchmarks/bench_memory.py [n]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from ngsildclient import Entity
+from ngsildclient.model.ngsidict import NgsiDict
+
+from bench_entity import payloads
+
+
+class DictEntity(Entity):
+    pass
+
+
+class DictNgsiDict(NgsiDict):
+    pass
+
+
+def build(n: int, entity_cls: type, dict_cls: type) -> list:
+    entities = []
+    for p in payloads(n):
+        e = entity_cls._wrap(p)
+        if dict_cls is not NgsiDict:
+            e._lastprop = e.root = dict_cls._wrap(p)
+        e["NO2"].value, e["refPointOfInterest"].value
+        entities.append(e)
+    return entities
+
+
+def measure(name: str, f, n: int, baseline: int = 0) -> int:
+    gc.collect()
+    tracemalloc.start()
+    working_set = f()  # noqa F841
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<12} {size / n:8.0f} bytes/entity {(size - baseline) / n:8.0f} bytes/entity over the payload")
+    return size
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    baseline = measure("payload", lambda: payloads(n), n)
+    measure("unslotted", lambda: build(n, DictEntity, DictNgsiDict), n, baseline)
+    measure("slotted", lambda: build(n, Entity, NgsiDict), n, baseline)
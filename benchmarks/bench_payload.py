@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Measure the CPU time and peak memory needed to build the body of a batch request.
+
+The historical way (one JSON string per entity through the NgsiEncoder hook, then joined)
+is compared with the current one, for each JSON backend available.
+
+Usage : python benchmarks/bench_payload.py [batchsize]
+"""
+
+import json
+import sys
+import timeit
+import tracemalloc
+
+from ngsildclient import Entity
+from ngsildclient.api.batch import payload
+from ngsildclient.model.utils import NgsiEncoder
+from ngsildclient.settings import globalsettings
+from ngsildclient.utils import jsoncodec
+
+from bench_entity import payloads
+
+
+def legacy(entities: list) -> str:
+    return f"[{','.join(json.dumps(e, cls=NgsiEncoder) for e in entities)}]"
+
+
+def bench(name: str, f, entities: list, number: int = 200):
+    best = min(timeit.repeat(lambda: f(entities), number=number, repeat=5)) / number
+    tracemalloc.start()
+    f(entities)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<16} {best * 1e6:9.0f} µs/body {peak / 1024:9.0f} KiB peak")
+
+
+if __name__ == "__main__":
+    batchsize = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    entities = [Entity.from_broker(p) for p in payloads(batchsize)]
+    bench("legacy", legacy, entities)
+    for backend in ("json", "orjson", "msgspec"):
+        try:
+            jsoncodec.get_codec(backend)
+        except ModuleNotFoundError:
+            continue
+        globalsettings.jsonlib = backend
+        bench(f"payload {backend}", payload, entities)
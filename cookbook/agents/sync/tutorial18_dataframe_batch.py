@@ -10,17 +10,7 @@
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
 import pandas as pd
-from ngsildclient import Entity, Client, iso8601
-
-
-def build_entity(specimen: tuple) -> Entity:
-    e = Entity("SpecimenObserved", f"{specimen[0]}:{iso8601.utcnow()}")
-    e.obs()
-    e.prop("specimenName", specimen[0])
-    e.prop("legs", specimen[1])
-    e.prop("wings", specimen[2])
-    e.prop("amountObserved", specimen[3])
-    return e
+from ngsildclient import ColumnarEntityBuilder, Client, iso8601
 
 
 def main():
@@ -29,8 +19,15 @@ def main():
         {"num_legs": [2, 4, 8, 0], "num_wings": [2, 0, 0, 0], "num_specimen_seen": [10, 2, 1, 8]},
         index=["falcon", "dog", "spider", "fish"],
     )
-    entities = [build_entity(specimen) for specimen in df.itertuples()]
-    client.upsert(entities)
+    now = iso8601.utcnow()
+    df = df.rename_axis("specimenName").reset_index()
+    df["id"] = df["specimenName"] + f":{now}"
+    df["dateObserved"] = now
+    # the mapping is declared once, then entities are built column by column
+    builder = ColumnarEntityBuilder("SpecimenObserved", "id")
+    builder.obs("dateObserved").prop("specimenName", "specimenName")
+    builder.prop("legs", "num_legs").prop("wings", "num_wings").prop("amountObserved", "num_specimen_seen")
+    client.upsert(builder.build(df))
 
 
 if __name__ == "__main__":
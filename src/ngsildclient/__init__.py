@@ -19,11 +19,15 @@ from ngsildclient.settings import globalsettings as settings
 from .utils import iso8601, is_interactive
 from .utils.uuid import shortuuid
 from .model.entity import Entity, mkprop, mktprop, mkgprop, mkrel
+from .model.template import EntityTemplate
 from .model.helper.postal import PostalAddressBuilder
 from .model.helper.openinghours import OpeningHoursBuilder
+from .model.helper.columnar import ColumnarEntityBuilder
 from .model.constants import CORE_CONTEXT, SmartDataModels, Rel, UTC, MultAttrValue
 from .api.client import Client
 from .api.asyn.client import AsyncClient
+from .api.temporal_sync import TemporalSync
+from .api.temporal_cache import TemporalCache
 from .api.helper.subscription import SubscriptionBuilder
 from .exceptions import NgsiError
 from .model.exceptions import NgsiModelError
@@ -39,15 +43,19 @@ __all__ = [
     "mktprop",
     "mkrel",
     "Entity",
+    "EntityTemplate",
     "AttrValue",
     "PostalAddressBuilder",
     "OpeningHoursBuilder",
+    "ColumnarEntityBuilder",
     "CORE_CONTEXT",
     "Rel",
     "UTC",
     "MultAttrValue",
     "Client",
     "AsyncClient",
+    "TemporalSync",
+    "TemporalCache",
     "SubscriptionBuilder",
     "SmartDataModels",
     "NgsiError",
@@ -13,7 +13,6 @@ from __future__ import annotations
 from typing import TYPE_CHECKING, Generator, Callable
 
 import logging
-import json
 
 if TYPE_CHECKING:
     from .client import Client
@@ -24,20 +23,20 @@ from pathlib import Path
 from ngsildclient.model.entity import Entity
 from ngsildclient.api.constants import PAGINATION_LIMIT_MAX
 from ngsildclient.api.exceptions import NgsiClientTooManyResultsError
+from ngsildclient.api.session import ClientSession
+from ngsildclient.utils import jsoncodec
 
 
 logger = logging.getLogger(__name__)
 
 
-class Alt:
+class Alt(ClientSession):
     def __init__(self, client: Client):
         self._client = client
-        self._session = client.session
 
     def count(self, query: Union[dict, Path], ctx: str = None) -> int:
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         return self._client.entities._count_alt(query, ctx)
 
     def query_head(self, query: Union[dict, Path], ctx: str = None, n: int = 5) -> List[Entity]:
@@ -67,8 +66,7 @@ class Alt:
         >>>     client.alt.query_head(query)
         """
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         return self._client.entities._query_alt(query, ctx, limit=n)
 
     def query(
@@ -104,8 +102,7 @@ class Alt:
         >>>     client.alt.query(query)
         """
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         entities: list[Entity] = []
         count = self.count(query, ctx=ctx)
         if count > max:
@@ -140,8 +137,7 @@ class Alt:
             Retrieved a generator of entities (matching the given type and/or query string)
         """
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         count = self.count(query)
         for page in range(ceil(count / limit)):
             if batch:
@@ -10,23 +10,83 @@
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Sequence, Literal
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Sequence,
+    Literal,
+    Callable,
+    Awaitable,
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Optional,
+    Union,
+)
+from collections import deque
 
+import asyncio
 import logging
-import json
+import time
 
 if TYPE_CHECKING:
     from .client import AsyncClient, EntityOrId
 
+from ...utils import jsoncodec
 from ..constants import BATCHSIZE
-from ..exceptions import NgsiApiError, rfc7807_error_handle_async
-from ..batch import BatchResult
+from ..exceptions import NgsiApiError, rfc7807_error_handle_async, http_status
+from ..batch import (
+    AdaptiveBatchSize,
+    BatchResult,
+    BatchOp,
+    ChangeSet,
+    ChunkBuilder,
+    RetryPolicy,
+    chunked,
+    encode_entity,
+    encode_id,
+    entity_id,
+    failed_items,
+    payload,
+    subchunk,
+)
 from ...model.entity import Entity
-from ngsildclient.model.utils import NgsiEncoder
 
 logger = logging.getLogger(__name__)
 
 
+async def achunked(
+    entities: Union[Iterable, AsyncIterable],
+    batchsize: Union[int, AdaptiveBatchSize],
+    encode: Callable[[Any], bytes] = encode_entity,
+) -> AsyncIterator[Sequence]:
+    """Split entities into chunks of at most batchsize items.
+
+    Accepts either an iterable or an async iterable, that is consumed lazily.
+    If batchsize is an AdaptiveBatchSize, chunks are also bounded by the payload size.
+    """
+    if not isinstance(entities, AsyncIterable):
+        for chunk in chunked(entities, batchsize, encode):
+            yield chunk
+        return
+    if isinstance(batchsize, AdaptiveBatchSize):
+        builder = ChunkBuilder(batchsize, encode)
+        async for entity in entities:
+            if (chunk := builder.push(entity)) is not None:
+                yield chunk
+        if (chunk := builder.flush()) is not None:
+            yield chunk
+        return
+    chunk = []
+    async for entity in entities:
+        chunk.append(entity)
+        if len(chunk) == batchsize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 class Batch:
     """A wrapper for the NGSI-LD API batch endpoint."""
 
@@ -35,28 +95,143 @@ class Batch:
         self._session = client.client
         self.url = url
 
+    async def _send_chunk(
+        self,
+        f: Callable[..., Awaitable[BatchResult]],
+        chunk: Sequence,
+        sizer: Optional[AdaptiveBatchSize],
+        *args,
+    ) -> BatchResult:
+        start = time.perf_counter()
+        try:
+            r = await f(chunk, *args)
+        except Exception as e:
+            if sizer is None:
+                raise
+            status = http_status(e)
+            if status == 413 or (status is not None and status >= 500):
+                sizer.shrink()
+                if status == 413 and len(chunk) > 1:
+                    # nothing has been processed : resend the chunk in two halves
+                    left, right = chunk.split()
+                    r = await self._send_chunk(f, left, sizer, *args)
+                    r += await self._send_chunk(f, right, sizer, *args)
+                    return r
+            raise
+        elapsed = time.perf_counter() - start
+        r.elapsed.append(elapsed)
+        if sizer is not None:
+            sizer.feedback(len(chunk), elapsed)
+        return r
+
+    async def _send(
+        self,
+        f: Callable[..., Awaitable[BatchResult]],
+        chunk: Sequence,
+        sizer: Optional[AdaptiveBatchSize],
+        retry: Optional[RetryPolicy],
+        *args,
+    ) -> BatchResult:
+        if retry is None:
+            return await self._send_chunk(f, chunk, sizer, *args)
+        result: BatchResult = None
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                r = await self._send_chunk(f, chunk, sizer, *args)
+            except Exception as e:
+                if attempt < retry.max_attempts and http_status(e) in retry.statuses:
+                    logger.warning(f"Batch request failed with {http_status(e)}. Attempt {attempt}/{retry.max_attempts}")
+                    await asyncio.sleep(retry.delay(attempt))
+                    continue
+                if result is None:
+                    raise
+                # some entities have already been processed : report the remaining ones as failed
+                logger.warning(f"Retry of {len(chunk)} entities failed with {http_status(e)}")
+                result.errors.extend(failed_items(chunk, e))
+                result.retries += attempt - 1
+                return result
+            if result is None:
+                result = BatchResult(r.op)
+            retryable = [e for e in r.errors if retry.is_retryable(e)]
+            r.errors = [e for e in r.errors if not retry.is_retryable(e)]
+            result += r
+            if not retryable or attempt >= retry.max_attempts:
+                result.errors.extend(retryable)
+                result.retries += attempt - 1
+                return result
+            logger.info(f"Retry {len(retryable)} failed entities. Attempt {attempt}/{retry.max_attempts}")
+            chunk = subchunk(chunk, {eid for eid in (e.get("entityId") for e in retryable) if eid is not None})
+            await asyncio.sleep(retry.delay(attempt))
+
+    async def _dispatch(
+        self,
+        op: BatchOp,
+        f: Callable[..., Awaitable[BatchResult]],
+        entities: Union[Iterable, AsyncIterable],
+        batchsize: Union[int, AdaptiveBatchSize],
+        max_inflight: int,
+        retry: Optional[RetryPolicy],
+        *args,
+    ) -> BatchResult:
+        """Send entities by chunks of batchsize, keeping up to max_inflight requests in flight.
+
+        Chunks are filled lazily from the input and sent as soon as they are full.
+        At most 2 * max_inflight chunks are pending at once, so memory stays bounded whatever the input size.
+        Per-chunk results are merged in input order, whatever the order the responses come back.
+        """
+        r = BatchResult(op)
+        sizer = batchsize if isinstance(batchsize, AdaptiveBatchSize) else None
+        encode = encode_id if op == "delete" else encode_entity
+        if max_inflight <= 1:
+            async for chunk in achunked(entities, batchsize, encode):
+                r += await self._send(f, chunk, sizer, retry, *args)
+            return r
+        semaphore = asyncio.Semaphore(max_inflight)
+
+        async def send(chunk: Sequence) -> BatchResult:
+            async with semaphore:
+                return await self._send(f, chunk, sizer, retry, *args)
+
+        pending: deque[asyncio.Task] = deque()
+        try:
+            async for chunk in achunked(entities, batchsize, encode):
+                if len(pending) >= 2 * max_inflight:
+                    r += await pending.popleft()
+                pending.append(asyncio.create_task(send(chunk)))
+            while pending:
+                r += await pending.popleft()
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        return r
+
     @rfc7807_error_handle_async
     async def _create(self, entities: Sequence[Entity]) -> BatchResult:
         headers = {"Content-Type": "application/ld+json"}
-        r = await self._session.post(
-            f"{self.url}/create/", headers=headers, content=json.dumps([e for e in entities], cls=NgsiEncoder)
-        )
+        r = await self._session.post(f"{self.url}/create/", headers=headers, content=payload(entities))
         self._client.raise_for_status(r)
         if r.status_code == 201:
-            success, errors = r.json(), []
+            success, errors = jsoncodec.loads(r.content), []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Create : Unkown HTTP response code {}", r.status_code)
         return BatchResult("create", success, errors)
 
     @rfc7807_error_handle_async
-    async def create(self, entities: Sequence[Entity], batchsize: int = BATCHSIZE) -> BatchResult:
-        r = BatchResult("create")
-        for i in range(0, len(entities), batchsize):
-            r += await self._create(entities[i : i + batchsize])
-        return r
+    async def create(
+        self,
+        entities: Union[Iterable[Entity], AsyncIterable[Entity]],
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        *,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
+        return await self._dispatch("create", self._create, entities, batchsize, max_inflight, retry)
 
     @rfc7807_error_handle_async
     async def _upsert(self, entities: Sequence[Entity], opt: Literal["replace", "update"] = "replace") -> BatchResult:
@@ -64,17 +239,17 @@ class Batch:
         params = {"options": opt} if opt else {}
         r = await self._session.post(
             f"{self.url}/upsert/",
-            content=json.dumps([e for e in entities], cls=NgsiEncoder),
+            content=payload(entities),
             headers=headers,
             params=params,
         )
         self._client.raise_for_status(r)
         if r.status_code == 201:
-            success, errors = r.json(), []
+            success, errors = jsoncodec.loads(r.content), []
         elif r.status_code == 204:
-            success, errors = [e.id for e in entities], []
+            success, errors = [entity_id(e) for e in entities], []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Upsert : Unkown HTTP response code {}", r.status_code)
@@ -82,14 +257,17 @@ class Batch:
 
     @rfc7807_error_handle_async
     async def upsert(
-        self, entities: Sequence[Entity], *, update: bool = False, batchsize: int = BATCHSIZE
+        self,
+        entities: Union[Iterable[Entity], AsyncIterable[Entity]],
+        *,
+        update: bool = False,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
     ) -> BatchResult:
         # default mode (without any option) is "replace", anyway always force the option
         opt = "update" if update else "replace"
-        r = BatchResult("upsert")
-        for i in range(0, len(entities), batchsize):
-            r += await self._upsert(entities[i : i + batchsize], opt)
-        return r
+        return await self._dispatch("upsert", self._upsert, entities, batchsize, max_inflight, retry, opt)
 
     @rfc7807_error_handle_async
     async def _update(self, entities: Sequence[Entity], opt: Literal["noOverwrite"] = None) -> BatchResult:
@@ -97,15 +275,15 @@ class Batch:
         params = {"options": opt} if opt else {}
         r = await self._session.post(
             f"{self.url}/update/",
-            content=json.dumps([e for e in entities], cls=NgsiEncoder),
+            content=payload(entities),
             headers=headers,
             params=params,
         )
         self._client.raise_for_status(r)
         if r.status_code == 204:
-            success, errors = [e.id for e in entities], []
+            success, errors = [entity_id(e) for e in entities], []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Update : Unkown HTTP response code {}", r.status_code)
@@ -113,32 +291,73 @@ class Batch:
 
     @rfc7807_error_handle_async
     async def update(
-        self, entities: Sequence[Entity], *, overwrite: bool = True, batchsize: int = BATCHSIZE
+        self,
+        entities: Union[Iterable[Entity], AsyncIterable[Entity]],
+        *,
+        overwrite: bool = True,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
     ) -> BatchResult:
         opt = "noOverwrite" if not overwrite else None
-        r = BatchResult("update")
-        for i in range(0, len(entities), batchsize):
-            r += await self._update(entities[i : i + batchsize], opt)
+        return await self._dispatch("update", self._update, entities, batchsize, max_inflight, retry, opt)
+
+    @rfc7807_error_handle_async
+    async def update_changed(
+        self,
+        entities: Union[Iterable[Entity], AsyncIterable[Entity]],
+        *,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
+        """Send only the attributes changed since the entities were loaded from the broker or last synced.
+
+        Unchanged entities are skipped. Partial entities are sent to the batch update endpoint,
+        then removed attributes are deleted and the entities successfully updated are marked as synced.
+        """
+        changes = ChangeSet()
+        if isinstance(entities, AsyncIterable):
+
+            async def fragments():
+                async for entity in entities:
+                    if (fragment := changes.fragment(entity)) is not None:
+                        yield fragment
+
+        else:
+
+            def fragments():
+                return changes.fragments(entities)
+
+        r = await self._dispatch("update", self._update, fragments(), batchsize, max_inflight, retry)
+        for entity, removed in changes.updated(r):
+            for attr in removed:
+                await self._client.entities.delete_attr(entity, attr)
+            entity.mark_synced()
         return r
 
     @rfc7807_error_handle_async
     async def _delete(self, entities: Sequence[EntityOrId]) -> BatchResult:
         r = await self._session.post(
-            f"{self.url}/delete/", json=[e.id if isinstance(e, Entity) else e for e in entities]
+            f"{self.url}/delete/", content=payload(entities, entity_id), headers={"Content-Type": "application/json"}
         )
         self._client.raise_for_status(r)
         if r.status_code == 204:
-            success, errors = [e.id for e in entities], []
+            success, errors = [entity_id(e) for e in entities], []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Delete : Unkown HTTP response code {}", r.status_code)
         return BatchResult("delete", success, errors)
 
     @rfc7807_error_handle_async
-    async def delete(self, entities: Sequence[EntityOrId], batchsize: int = BATCHSIZE) -> BatchResult:
-        r = BatchResult("delete")
-        for i in range(0, len(entities), batchsize):
-            r += await self._delete(entities[i : i + batchsize])
-        return r
+    async def delete(
+        self,
+        entities: Union[Iterable[EntityOrId], AsyncIterable[EntityOrId]],
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        *,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
+        return await self._dispatch("delete", self._delete, entities, batchsize, max_inflight, retry)
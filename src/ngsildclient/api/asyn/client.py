@@ -11,11 +11,12 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 import httpx
 from httpx._types import AuthTypes
 from typing import TYPE_CHECKING, Generator, List, Union, Callable
-from math import ceil
 
 from ...model.entity import Entity
 from ..constants import (
@@ -30,14 +31,20 @@ from ..constants import (
     ENDPOINT_SUBSCRIPTIONS,
     NGSILD_BASEPATH,
     PAGINATION_LIMIT_MAX,
+    BATCHSIZE,
+    AttrsFormat,
 )
 from .entities import Entities
 from .batch import Batch, BatchResult
+from ..batch import AdaptiveBatchSize, RetryPolicy
+from ..purge import PURGE_MAX_INFLIGHT, PurgeProgress
+from .purge import Purge
 from .types import Types
 from .contexts import Contexts
 from .subscriptions import Subscriptions
 from .temporal import Temporal
 from ..exceptions import NgsiClientTooManyResultsError
+from ...utils.prefetch import aprefetch
 
 if TYPE_CHECKING:
     from ngsildclient.model.constants import EntityOrId
@@ -204,7 +211,13 @@ class AsyncClient:
         """
         await self.client.aclose()
 
-    async def create(self, *entities) -> Union[bool, BatchResult]:
+    async def create(
+        self,
+        *entities,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Create one or many entities.
 
         Facade method backed by Batch.create() or Entities.create()
@@ -213,7 +226,15 @@ class AsyncClient:
         ----------
         entities :
             Entities to be created by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable or async iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         Returns
         -------
@@ -226,15 +247,19 @@ class AsyncClient:
                 return await self.entities.create(entity)
             else:
                 entities = entities[0]
-        return await self.batch.create(entities)
+        return await self.batch.create(entities, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
 
     async def get(
         self,
         entity: EntityOrId,
         ctx: str = None,
         asdict: bool = False,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        track: bool = False,
         **kwargs,
-    ) -> Entity:
+    ) -> Union[Entity, dict]:
         """Retrieve an entity given its id.
 
         Facade method for Entities.retrieve().
@@ -248,15 +273,27 @@ class AsyncClient:
             The context
         asdict : bool
             If set (instead of returning an Entity) returns the raw API response (a Python dict that represents the JSON response), by default False
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entity, by default normalized. The entity is returned as a dict for any other format.
+        track: bool
+            If set the entity tracks its changes, to be sent with update_changed(), by default False
 
         Returns
         -------
         Entity
             The retrieved entity
         """
-        return await self.entities.get(entity, ctx, asdict, **kwargs)
+        return await self.entities.get(entity, ctx, asdict, attrs=attrs, format=format, track=track, **kwargs)
 
-    async def delete(self, *entities) -> Union[bool, BatchResult]:
+    async def delete(
+        self,
+        *entities,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Delete one or many entities.
 
         Facade method backed by Batch.delete() or Entities.delete()
@@ -265,7 +302,15 @@ class AsyncClient:
         ----------
         entities :
             Entities to be deleted by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable or async iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         Returns
         -------
@@ -278,7 +323,7 @@ class AsyncClient:
                 return await self.entities.delete(entity)
             else:
                 entities = entities[0]
-        return await self.batch.delete(entities)
+        return await self.batch.delete(entities, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
 
     async def delete_from_file(self, filename: str) -> Union[bool, dict]:
         """Delete in the broker all entities present in the JSON file.
@@ -309,7 +354,14 @@ class AsyncClient:
         """
         return await self.entities.exists(entity)
 
-    async def upsert(self, *entities, update: bool = False) -> Union[bool, BatchResult]:
+    async def upsert(
+        self,
+        *entities,
+        update: bool = False,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Upsert one or many entities.
 
         Facade method backed by Batch.upsert() or Entities.upsert()
@@ -318,7 +370,15 @@ class AsyncClient:
         ----------
         entities :
             Entities to be upserted by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable or async iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         update: bool
             For batch mode only.
@@ -336,7 +396,9 @@ class AsyncClient:
                 return await self.entities.upsert(entity)
             else:
                 entities = entities[0]
-        return await self.batch.upsert(entities, update=update)
+        return await self.batch.upsert(
+            entities, update=update, batchsize=batchsize, max_inflight=max_inflight, retry=retry
+        )
 
     async def bulk_import(self, filename: str) -> Union[bool, dict]:
         """Upsert all entities from a JSON file.
@@ -349,7 +411,14 @@ class AsyncClient:
         entities = await Entity.load_async(filename)
         return await self.upsert(entities)
 
-    async def update(self, *entities, overwrite=True) -> Union[bool, BatchResult]:
+    async def update(
+        self,
+        *entities,
+        overwrite=True,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Upsert one or many entities.
 
         Facade method backed by Batch.update() or Entities.update()
@@ -358,7 +427,15 @@ class AsyncClient:
         ----------
         entities :
             Entities to be upserted by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable or async iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         overwrite: bool
             For batch mode only.
@@ -376,10 +453,59 @@ class AsyncClient:
                 return await self.entities.update(entity)
             else:
                 entities = entities[0]
-        return await self.batch.update(entities, overwrite=overwrite)
+        return await self.batch.update(
+            entities, overwrite=overwrite, batchsize=batchsize, max_inflight=max_inflight, retry=retry
+        )
+
+    async def update_changed(
+        self,
+        *entities,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
+        """Update one or many entities, sending only the attributes changed since they were loaded or last synced.
+
+        Facade method backed by Batch.update_changed() or Entities.update_changed()
+        Entities retrieved with track=True track their changes. Untracked entities are sent as a whole.
+
+        Parameters
+        ----------
+        entities :
+            Entities to be updated by the Context Broker
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable or async iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
+
+        Returns
+        -------
+        Union[bool, BatchResult]
+            For a single entity, True if some attributes have been sent. The batch result otherwise.
+        """
+        if len(entities) == 1:
+            if isinstance(entities[0], Entity):
+                return await self.entities.update_changed(entities[0])
+            else:
+                entities = entities[0]
+        return await self.batch.update_changed(entities, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
 
     async def query_head(
-        self, type: str = None, q: str = None, gq: str = None, ctx: str = None, n: int = 5
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        n: int = 5,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
     ) -> List[Entity]:
         """Retrieve entities given its type and/or query string.
 
@@ -399,6 +525,14 @@ class AsyncClient:
             The context
         n: int
             The first n entities to be retrieved
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entities, by default normalized.
+            Entities are returned as Python dicts for any other format.
+        asdict: bool
+            If set returns Python dicts instead of entities, by default False.
+            Skipping the Entity construction speeds up large or projected reads.
         Returns
         -------
         list[Entity]
@@ -412,7 +546,7 @@ class AsyncClient:
         >>> with AsyncClient() as client:
         >>>     await client.query(type="AgriFarm", q='contactPoint[email]=="wheatfarm@email.com"') # match type and query
         """
-        return await self.entities._query(type, q, gq, ctx, limit=n)
+        return await self.entities._query(type, q, gq, ctx, limit=n, attrs=attrs, format=format, asdict=asdict)
 
     async def query(
         self,
@@ -422,11 +556,18 @@ class AsyncClient:
         ctx: str = None,
         limit: int = PAGINATION_LIMIT_MAX,
         max: int = 1_000_000,
+        max_inflight: int = 1,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+        track: bool = False,
     ) -> List[Entity]:
         """Retrieve entities given its type and/or query string.
 
         Retrieve all entities by sending as many requests as needed, using pagination.
         Assume data hold in memory. Should not be an issue except for very large datasets.
+        Since the number of entities is known up front, pages can be fetched concurrently.
 
         Parameters
         ----------
@@ -440,6 +581,20 @@ class AsyncClient:
             The context
         limit: int
             The number of entities retrieved in each request
+        max: int
+            The maximum number of entities allowed
+        max_inflight: int
+            The number of pages fetched concurrently, by default 1 (sequential)
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entities, by default normalized.
+            Entities are returned as Python dicts for any other format.
+        asdict: bool
+            If set returns Python dicts instead of entities, by default False.
+            Skipping the Entity construction speeds up large or projected reads.
+        track: bool
+            If set the entities track their changes, to be sent with update_changed(), by default False
 
         Returns
         -------
@@ -455,12 +610,27 @@ class AsyncClient:
         >>>     await client.query(type="AgriFarm", q='contactPoint[email]=="wheatfarm@email.com"') # match type and query
         """
 
-        entities: list[Entity] = []
-        count = await self.entities.count(type, q, gq, ctx=ctx)
+        # the count comes along with the first page
+        projection = dict(attrs=attrs, format=format, asdict=asdict, track=track)
+        entities, count = await self.entities._query_page(type, q, gq, ctx, limit, count=True, **projection)
+        if count is None:
+            count = await self.entities.count(type, q, gq, ctx=ctx)
         if count > max:
             raise NgsiClientTooManyResultsError(f"{count} results exceed maximum {max}")
-        for page in range(ceil(count / limit)):
-            entities.extend(await self.entities._query(type, q, gq, ctx, limit, page * limit))
+        offsets = range(limit, count, limit)
+        if max_inflight <= 1:
+            for offset in offsets:
+                entities.extend(await self.entities._query(type, q, gq, ctx, limit, offset, **projection))
+            return entities
+        semaphore = asyncio.Semaphore(max_inflight)
+
+        async def fetch(offset: int) -> List[Entity]:
+            async with semaphore:
+                return await self.entities._query(type, q, gq, ctx, limit, offset, **projection)
+
+        # gather() returns the pages in offset order, whatever the order the responses come back
+        for page in await asyncio.gather(*[fetch(offset) for offset in offsets]):
+            entities.extend(page)
         return entities
 
     async def query_generator(
@@ -471,10 +641,17 @@ class AsyncClient:
         ctx: str = None,
         limit: int = PAGINATION_LIMIT_MAX,
         batch: bool = False,
+        prefetch: int = 0,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+        track: bool = False,
     ) -> Generator[Entity, None, None]:
         """Retrieve (as a generator) entities given its type and/or query string.
 
         By returning a generator it allows to process entities on the fly without any risk of exhausting memory.
+        With prefetch, the next pages are fetched in a background task while the current one is processed.
 
         Parameters
         ----------
@@ -488,6 +665,20 @@ class AsyncClient:
             The context
         limit: int
             The number of entities retrieved in each request
+        batch: bool
+            Yield pages (lists of entities) instead of entities, by default False
+        prefetch: int
+            The number of pages fetched ahead, by default 0 (no read-ahead)
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entities, by default normalized.
+            Entities are returned as Python dicts for any other format.
+        asdict: bool
+            If set returns Python dicts instead of entities, by default False.
+            Skipping the Entity construction speeds up large or projected reads.
+        track: bool
+            If set the entities track their changes, to be sent with update_changed(), by default False
 
         Returns
         -------
@@ -500,9 +691,10 @@ class AsyncClient:
         >>>     async for entity in await client.query_handle(type="AgriFarm"):
                     print(entity)
         """
-        count = await self.entities.count(type, q, gq)
-        for page in range(ceil(count / limit)):
-            entities = await self.entities._query(type, q, gq, ctx, limit, page * limit)
+        pages = self.entities._pages(type, q, gq, ctx, limit, attrs=attrs, format=format, asdict=asdict, track=track)
+        if prefetch > 0:
+            pages = aprefetch(pages, prefetch)
+        async for entities in pages:
             if batch:
                 yield entities
             else:
@@ -518,6 +710,8 @@ class AsyncClient:
         limit: int = PAGINATION_LIMIT_MAX,
         *,
         callback: Callable[[Entity], None],
+        prefetch: int = 0,
+        track: bool = False,
     ) -> None:
         """Apply a callback function on entity of the query result.
 
@@ -535,13 +729,17 @@ class AsyncClient:
             The number of entities retrieved in each request
         callback: Callable[Entity]
             The function to be called on each entity of the result
+        prefetch: int
+            The number of pages fetched ahead while the callback is processing entities, by default 0
+        track: bool
+            If set the entities track their changes, to be sent with update_changed(), by default False
 
         Example
         -------
         >>> with AsyncClient() as client:
         >>>     await client.query_handle(type="AgriFarm", lambda e: print(e))
         """
-        async for entity in self.query_generator(type, q, gq, ctx, limit, False):
+        async for entity in self.query_generator(type, q, gq, ctx, limit, False, prefetch, track=track):
             callback(entity)
 
     async def count(self, type: str = None, q: str = None, gq: str = None) -> int:
@@ -573,51 +771,94 @@ class AsyncClient:
         """
         return await self.entities.count(type, q)
 
-    async def delete_where(self, type: str = None, q: str = None, **kwargs):
+    async def delete_where(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        *,
+        ctx: str = None,
+        batchsize: int = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+        callback: Callable[[PurgeProgress], None] = None,
+    ) -> BatchResult:
         """Batch delete entities matching type and/or query string.
 
+        Only the entities ids are retrieved, then deleted by batches, max_inflight requests at once.
+
         Parameters
         ----------
         etype : str
             The entity's type
         query: str
             The query string (NGSI-LD Query Language)
+        gq: str
+            The geoquery string (NGSI-LD Geoquery Language)
+        ctx : str, optional
+            The context, by default None
+        batchsize : int, optional
+            The number of entities per delete request, by default BATCHSIZE
+        max_inflight : int, optional
+            The number of delete requests sent concurrently, by default 1 (sequential).
+            drop() and purge() send PURGE_MAX_INFLIGHT requests at once.
+        retry : RetryPolicy, optional
+            The policy to retry the failed deletions, by default None
+        callback : Callable[[PurgeProgress], None], optional
+            The function called to report the progress, by default None
+
+        Returns
+        -------
+        BatchResult
+            The deleted entities and the errors
 
         Example
         -------
         >>> with AsyncClient() as client:
         >>>     await client.delete_where(type="AgriFarm", query='contactPoint[email]=="wheatfarm@email.com"') # match type and query
         """
-        g = self.query_generator(type, q, batch=True, **kwargs)
-        async for batch in g:
-            await self.batch.delete(batch)
-
-    async def drop(self, *types: str) -> None:
+        purge = Purge(self, batchsize=batchsize, max_inflight=max_inflight, retry=retry, callback=callback)
+        start = time.perf_counter()
+        r = await purge.run(type, q, gq, ctx)
+        elapsed = time.perf_counter() - start
+        rate = r.n_ok / max(elapsed, 1e-9)
+        logger.info(f"Entities deleted : {r.n_ok}/{r.n_tot} in {elapsed:.2f}s ({rate:.0f} entities/s)")
+        return r
+
+    async def drop(self, *types: str, **kwargs) -> None:
         """Batch delete entities matching the given type.
 
         Parameters
         ----------
         type : str
             The entity's type
+        **kwargs
+            Options forwarded to delete_where(), deleting PURGE_MAX_INFLIGHT batches at once unless max_inflight is set
 
         Example
         -------
         >>> with AsyncClient() as client:
         >>>     await client.drop("AgriFarm")
         """
+        kwargs.setdefault("max_inflight", PURGE_MAX_INFLIGHT)
         for t in types:
-            await self.delete_where(type=t)
+            await self.delete_where(type=t, **kwargs)
 
-    async def purge(self) -> None:
+    async def purge(self, **kwargs) -> None:
         """Batch delete all entities.
 
+        Parameters
+        ----------
+        **kwargs
+            Options forwarded to delete_where(), deleting PURGE_MAX_INFLIGHT batches at once unless max_inflight is set
+
         Example
         -------
         >>> with AsyncClient() as client:
         >>>     await client.purge()
         """
         for type in await self.types.list():
-            await self.drop(type)
+            await self.drop(type, **kwargs)
 
     async def flush_all(self) -> None:
         """Batch delete all entities and remove all contexts.
@@ -625,9 +866,9 @@ class AsyncClient:
         Example
         -------
         >>> with AsyncClient() as client:
-        >>>     await client.purge()
+        >>>     await client.flush_all()
         """
-        await self.purge(type)
+        await self.purge()
         await self.contexts.cleanup()
 
     async def create_tenant(self, tenant: str) -> httpx.Response:
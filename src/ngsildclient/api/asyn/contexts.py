@@ -12,7 +12,6 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Optional
 import re
-import json
 import aiofiles
 import logging
 
@@ -20,6 +19,7 @@ if TYPE_CHECKING:
     from .client import AsyncClient
 
 from ngsildclient.model.constants import CORE_CONTEXT
+from ...utils import jsoncodec
 from ..exceptions import rfc7807_error_handle_async
 
 
@@ -35,7 +35,7 @@ class Contexts:
     @rfc7807_error_handle_async
     async def list(self, pattern: str = None) -> Optional[dict]:
         r = await self._session.get(f"{self.url}")
-        contexts = r.json()
+        contexts = jsoncodec.loads(r.content)
         if pattern is not None:
             contexts = [x for x in contexts if re.search(pattern, x, re.IGNORECASE)]
         return contexts
@@ -44,7 +44,7 @@ class Contexts:
     async def get(self, ctx: str) -> dict:
         r = await self._session.get(f"{self.url}/{ctx}")
         self._client.raise_for_status(r)
-        return r.json()
+        return jsoncodec.loads(r.content)
 
     @rfc7807_error_handle_async
     async def _delete(self, ctx: str) -> bool:
@@ -66,7 +66,7 @@ class Contexts:
     async def exists(self, ctx: str) -> bool:
         r = await self._session.get(f"{self.url}/{ctx}")
         if r:
-            payload = r.json()
+            payload = jsoncodec.loads(r.content)
             return "@context" in payload
         return False
 
@@ -88,5 +88,5 @@ class Contexts:
     async def add_file(self, ctxfilename: str):
         async with aiofiles.open(ctxfilename, "r") as fp:
             contents = await fp.read()
-            ctx = json.loads(contents)
+            ctx = jsoncodec.loads(contents)
         await self.add(ctx)
@@ -10,18 +10,20 @@
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Union, List
+from typing import TYPE_CHECKING, AsyncIterator, Union, List, Optional, Tuple
 from httpx import Response
 import logging
 
 if TYPE_CHECKING:
     from .client import AsyncClient
 
+from ...utils import jsoncodec
 from ...utils.urn import Urn
-from ..constants import JSONLD_CONTEXT, ENDPOINT_ENTITIES
+from ..constants import JSONLD_CONTEXT, ENDPOINT_ENTITIES, PAGINATION_LIMIT_MAX, AttrsFormat
 from ...model.entity import Entity
 
 from ..exceptions import rfc7807_error_handle_async, NgsiAlreadyExistsError
+from ..entities import _add_projection
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +40,9 @@ class Entities:
     @rfc7807_error_handle_async
     async def create(self, entity: Entity, skip: bool = False, overwrite: bool = False) -> bool:
         headers = {"Content-Type": "application/ld+json"}
-        r: Response = await self._client.client.post(url=f"{self.url}/", headers=headers, content=entity.to_json())
+        r: Response = await self._client.client.post(
+            url=f"{self.url}/", headers=headers, content=jsoncodec.dumpb(entity)
+        )
         if r.status_code == 409:  # already exists
             if skip:
                 return False
@@ -54,16 +58,22 @@ class Entities:
         eid: Union[str, Entity],
         ctx: str = None,
         asdict: bool = False,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        track: bool = False,
         **kwargs,
-    ) -> Entity:
+    ) -> Union[Entity, dict]:
         eid = eid.id if isinstance(eid, Entity) else Urn.prefix(eid)
         headers = {"Accept": "application/ld+json"}  # overrides session headers
         if ctx is not None:
             headers["Link"] = f'<{ctx}>; rel="{JSONLD_CONTEXT}"; type="application/ld+json"'
         logger.info(f"{headers=}")
-        r: Response = await self._client.client.get(f"{self.url}/{eid}", headers=headers, **kwargs)
+        params = dict(kwargs.pop("params", None) or {})
+        asdict |= _add_projection(params, attrs, format)
+        r: Response = await self._client.client.get(f"{self.url}/{eid}", headers=headers, params=params, **kwargs)
         r.raise_for_status()
-        return r.json() if asdict else Entity.from_dict(r.json())
+        return jsoncodec.loads(r.content) if asdict else Entity.from_broker(jsoncodec.loads(r.content), track)
 
     @rfc7807_error_handle_async
     async def delete(self, eid: Union[str, Entity]) -> bool:
@@ -80,7 +90,7 @@ class Entities:
         eid = eid.id if isinstance(eid, Entity) else Urn.prefix(eid)
         r: Response = await self._client.client.get(f"{self.url}/{eid}")
         if r:
-            payload = r.json()
+            payload = jsoncodec.loads(r.content)
             return "@context" in payload
         return False
 
@@ -100,6 +110,50 @@ class Entities:
         return False
 
     @rfc7807_error_handle_async
+    async def update_changed(self, entity: Entity) -> bool:
+        """Send only the attributes changed since the entity was loaded from the broker or last synced.
+
+        Modified attributes are sent at once with PATCH /entities/{id}/attrs, added ones with POST /entities/{id}/attrs,
+        removed ones are deleted one by one. The entity is then marked as synced.
+
+        Parameters
+        ----------
+        entity : Entity
+            The entity to update
+
+        Returns
+        -------
+        bool
+            True if some attributes have been sent, False if the entity was unchanged
+        """
+        added, modified, removed = entity.changes()
+        if not (added or modified or removed):
+            return False
+        data = entity.root._raw  # read only, not to unshare the attributes
+        client = self._client.client
+        headers = {"Content-Type": "application/ld+json"}
+        for attrs, send in ((modified, client.patch), (added, client.post)):
+            if attrs:
+                fragment = {k: data[k] for k in attrs}
+                if "@context" in data:
+                    fragment["@context"] = data["@context"]
+                r: Response = await send(
+                    f"{self.url}/{entity.id}/attrs", headers=headers, content=jsoncodec.dumpb(fragment)
+                )
+                self._client.raise_for_status(r)
+        for attr in removed:
+            await self.delete_attr(entity, attr)
+        entity.mark_synced()
+        return True
+
+    @rfc7807_error_handle_async
+    async def delete_attr(self, eid: Union[str, Entity], attr: str, datasetid: str = None) -> bool:
+        eid = eid.id if isinstance(eid, Entity) else Urn.prefix(eid)
+        params = {"datasetId": datasetid} if datasetid else {}
+        r: Response = await self._client.client.delete(f"{self.url}/{eid}/attrs/{attr}", params=params)
+        self._client.raise_for_status(r)
+        return bool(r)
+
     async def _query(
         self,
         type: str = None,
@@ -110,11 +164,39 @@ class Entities:
         offset: int = 0,
         **kwargs,
     ) -> List[Entity]:
+        entities, _ = await self._query_page(type, q, gq, ctx, limit, offset, **kwargs)
+        return entities
+
+    @rfc7807_error_handle_async
+    async def _query_page(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        limit: int = 0,
+        offset: int = 0,
+        count: bool = False,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+        track: bool = False,
+        pick: List[str] = None,
+    ) -> Tuple[List[Union[Entity, dict]], Optional[int]]:
+        """Retrieve a page of entities.
+
+        If count is set, the total number of matching entities is requested along with the page.
+        It's returned as the second item, or None if not asked or not provided by the broker.
+        Entities are returned as dicts if asdict is set, or if the format is not the normalized representation.
+        """
         params = {}
         if limit != 0:
             params |= {"limit": limit}
         if offset != 0:
             params |= {"offset": offset}
+        if count:
+            params["count"] = "true"
         if type is None and q is None:
             raise ValueError("Must indicate at least a type or a query string")
         if type:
@@ -123,6 +205,7 @@ class Entities:
             params["q"] = q
         if gq:
             params["geoQ"] = gq
+        asdict |= _add_projection(params, attrs, format, pick)
         headers = {
             "Accept": "application/ld+json",
         }  # overrides session headers
@@ -134,9 +217,37 @@ class Entities:
             params=params,
         )
         r.raise_for_status()
-        entities = r.json()
+        entities = jsoncodec.loads(r.content)
         logger.debug(f"{entities=}")
-        return [Entity.from_dict(entity) for entity in entities]
+        total = r.headers.get("NGSILD-Results-Count") if count else None
+        if asdict:
+            return entities, None if total is None else int(total)
+        return [Entity.from_broker(entity, track) for entity in entities], None if total is None else int(total)
+
+    async def _pages(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        limit: int = PAGINATION_LIMIT_MAX,
+        **kwargs,
+    ) -> AsyncIterator[List[Entity]]:
+        """Retrieve all the pages of entities, without any preliminary count request.
+
+        The count is asked along with the first page. If the broker doesn't provide it,
+        pages are retrieved until a short one is returned.
+        """
+        offset = 0
+        entities, count = await self._query_page(type, q, gq, ctx, limit, offset, count=True, **kwargs)
+        while entities:
+            yield entities
+            offset += limit
+            if count is not None and offset >= count:
+                return
+            if count is None and len(entities) < limit:  # short page
+                return
+            entities, _ = await self._query_page(type, q, gq, ctx, limit, offset, **kwargs)
 
     @rfc7807_error_handle_async
     async def count(self, type: str = None, q: str = None, gq: str = None, ctx: str = None, **kwargs) -> int:
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+import logging
+
+from ..batch import BatchResult
+from ..exceptions import NgsiApiError
+from ..purge import PurgeBase
+
+logger = logging.getLogger(__name__)
+
+
+class Purge(PurgeBase):
+    """Delete all the entities matching a type and/or query string.
+
+    See PurgeBase for the parameters.
+    """
+
+    async def _ids(self, type: str, q: str, gq: str, ctx: str, count: bool = False) -> tuple[List[str], Optional[int]]:
+        ids, total = [], None
+        while len(ids) < self.window:
+            limit = min(self.limit, self.window - len(ids))
+            try:
+                entities, c = await self._client.entities._query_page(
+                    type, q, gq, ctx, limit, self._offset + len(ids), count, **self._projection()
+                )
+            except NgsiApiError as e:
+                self._unpick(e)
+                continue
+            if count:
+                total, count = c, False
+            ids.extend(e["id"] for e in entities)
+            if len(entities) < limit:
+                break
+        return ids, total
+
+    async def run(self, type: str = None, q: str = None, gq: str = None, ctx: str = None) -> BatchResult:
+        self._begin()
+        ids, self._progress.total = await self._ids(type, q, gq, ctx, count=True)
+        while ids:
+            todo = self._todo(ids)
+            if todo:
+                batch = self._client.batch
+                r = await batch._dispatch("delete", batch._delete, todo, self.batchsize, self.max_inflight, self.retry)
+                self._done(todo, r)
+            ids, _ = await self._ids(type, q, gq, ctx)
+        return self._result
@@ -17,6 +17,7 @@ from hashlib import sha1
 import re
 import json
 
+from ...utils import jsoncodec
 from ...model.constants import CORE_CONTEXT
 from ..exceptions import NgsiApiError
 
@@ -61,7 +62,7 @@ class Subscriptions:
         if ctx is not None:
             headers["Link"] = f'<{ctx}>; rel="{CORE_CONTEXT}"; type="application/ld+json"'
         r = await self._session.get(f"{self.url}")
-        subscriptions = r.json()
+        subscriptions = jsoncodec.loads(r.content)
         if pattern is not None:
             subscriptions = [
                 x
@@ -94,7 +95,7 @@ class Subscriptions:
         if ctx is not None:
             headers["Link"] = f'<{ctx}>; rel="{CORE_CONTEXT}"; type="application/ld+json"'
         r = await self._session.get(f"{self.url}")
-        return [x for x in r.json() if Subscriptions._hash(x) == hashref]
+        return [x for x in jsoncodec.loads(r.content) if Subscriptions._hash(x) == hashref]
 
     @rfc7807_error_handle_async
     async def get(self, id: str, ctx: str = CORE_CONTEXT) -> dict:
@@ -106,7 +107,7 @@ class Subscriptions:
             headers["Link"] = f'<{ctx}>; rel="{CORE_CONTEXT}"; type="application/ld+json"'
         r = await self._session.get(f"{self.url}/{id}", headers=headers)
         self._client.raise_for_status(r)
-        return r.json()
+        return jsoncodec.loads(r.content)
 
     @rfc7807_error_handle_async
     async def exists(self, id: str, ctx: str = CORE_CONTEXT) -> bool:
@@ -15,16 +15,19 @@ from datetime import timedelta
 from isodate import duration_isoformat
 from httpx import Response
 
+import asyncio
 import logging
 
 if TYPE_CHECKING:
     from .client import AsyncClient
 
+from ...utils import jsoncodec
 from ..constants import JSONLD_CONTEXT, AggrMethod
 from ...utils.urn import Urn
 from ..helper.temporal import TemporalQuery
 from ...model.entity import Entity
-from ..temporal import _addopt, Pagination, TemporalResult, troes_to_dataframe
+from ..temporal_aggr import TemporalAggregator
+from ..temporal import _addopt, Pagination, TemporalResult, merge_troes, troes_to_dataframe
 from ngsildclient.utils import is_pandas_installed
 
 logger = logging.getLogger(__name__)
@@ -67,7 +70,7 @@ class Temporal:
             _addopt(params, "temporalValues")
         r: Response = await self._session.get(f"{self.url}/{eid}", headers=headers, params=params)
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
 
     #  equivalent to get_all()
     async def get(
@@ -141,7 +144,7 @@ class Temporal:
             params=params,
         )
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
 
     async def query_head(
         self,
@@ -178,6 +181,8 @@ class Temporal:
         tq: TemporalQuery = None,
         pagesize: int = 0,
         as_dataframe: bool = False,
+        slices: int = 1,
+        max_inflight: int = 4,
     ) -> List[dict]:
         """Retrieve Temporal Representation of Entities (TRoE) given id, or type and/or query string.
 
@@ -211,8 +216,12 @@ class Temporal:
         as_dataframe : bool
             Default is false, meaning it returns JSON TRoE.
             If set returns a pandas dataframe. Requires pandas.
-        limit: int
-            The number of entities retrieved in each request
+        slices: int
+            By default 1, the pages are retrieved one after another.
+            If greater, the between temporal query is split into as many sub-windows, queried concurrently.
+            The series of each entity are merged back in time order.
+        max_inflight: int
+            The number of sub-windows queried concurrently, by default 4
 
         Returns
         -------
@@ -229,14 +238,30 @@ class Temporal:
                 verbose = False  # force simplified representation
             else:
                 raise ValueError("Cannot export to dataframe : pandas not installed.")
-        r: TemporalResult = await self._query(eid, type, attrs, q, gq, ctx, verbose, tq, pagesize=pagesize)
+        if slices > 1:
+            if tq is None or tq.get("timerel") != "between":
+                raise ValueError("slices requires a between temporal query")
+            semaphore = asyncio.Semaphore(max(1, max_inflight))
+
+            async def query_window(window: TemporalQuery) -> List[dict]:
+                async with semaphore:
+                    return await self._query_all(eid, type, attrs, q, gq, ctx, verbose, window, pagesize=pagesize)
+
+            # gather() returns the windows in chronological order, whatever the order they complete
+            parts = await asyncio.gather(*[query_window(window) for window in tq.split(slices)])
+            troes = merge_troes(*parts)
+        else:
+            troes = await self._query_all(eid, type, attrs, q, gq, ctx, verbose, tq, pagesize=pagesize)
+        return troes_to_dataframe(troes) if as_dataframe else troes
+
+    async def _query_all(self, *args, pagesize: int = 0) -> List[dict]:
+        # follow the Next-Page anchors, one page after another
+        r: TemporalResult = await self._query(*args, pagesize=pagesize)
         troes: List[dict] = r.result
         while r.pagination.next_url is not None:
-            r: TemporalResult = await self._query(
-                eid, type, attrs, q, gq, ctx, verbose, tq, pagesize=pagesize, pageanchor=r.pagination.next_url
-            )
+            r = await self._query(*args, pagesize=pagesize, pageanchor=r.pagination.next_url)
             troes.extend(r.result)
-        return troes_to_dataframe(troes) if as_dataframe else troes
+        return troes
 
     async def query_generator(
         self,
@@ -259,8 +284,8 @@ class Temporal:
             r: TemporalResult = await self._query(
                 eid, type, attrs, q, gq, ctx, verbose, tq, pagesize=pagesize, pageanchor=r.pagination.next_url
             )
-        for troe in troes:
-            yield troe
+            for troe in r.result:
+                yield troe
 
     async def query_handle(
         self,
@@ -296,7 +321,18 @@ class Temporal:
         count: bool = False,
         methods: Sequence[AggrMethod] = [AggrMethod.AVERAGE],
         period: timedelta = timedelta(days=1),
+        local: bool = False,  # aggregate client-side, for brokers lacking support for aggregatedValues
     ) -> TemporalResult:
+        if local:
+            if lastn > 0:
+                raise ValueError("lastn cannot be combined with local aggregation")
+            origin = tq["timeAt"] if tq is not None and tq.get("timerel") in ("after", "between") else None
+            aggregator = TemporalAggregator(methods, period, origin)
+            async for troe in self.query_generator(
+                type=type, attrs=attrs, q=q, gq=gq, ctx=ctx, tq=tq, pagesize=pagesize
+            ):
+                aggregator.add(troe)
+            return TemporalResult(aggregator.result())
         params = {}
         if type:
             params["type"] = type
@@ -329,4 +365,4 @@ class Temporal:
             params=params,
         )
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
@@ -17,6 +17,7 @@ import logging
 if TYPE_CHECKING:
     from .client import AsyncClient
 
+from ...utils import jsoncodec
 from ..exceptions import rfc7807_error_handle_async
 
 
@@ -31,4 +32,4 @@ class Types:
     @rfc7807_error_handle_async
     async def list(self) -> Optional[dict]:
         r = await self._client.client.get(f"{self.url}")
-        return r.json()["typeList"]
+        return jsoncodec.loads(r.content)["typeList"]
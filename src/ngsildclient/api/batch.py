@@ -11,34 +11,348 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Literal, Sequence
-from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from dataclasses import dataclass, field, asdict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import islice
 
 if TYPE_CHECKING:
     from ngsildclient.model.constants import EntityOrId
 
 import logging
-import json
+import time
+import random
+import threading
 
 if TYPE_CHECKING:
     from .client import Client
 
+from ..utils import jsoncodec
 from .constants import BATCHSIZE
 from ngsildclient.utils.console import Console, MsgLvl
-from .exceptions import NgsiApiError, rfc7807_error_handle
+from .exceptions import NgsiApiError, NgsiContextBrokerError, rfc7807_error_handle, http_status
 from ..model.entity import Entity
-from ngsildclient.model.utils import NgsiEncoder
+from .session import ClientSession
 
 BatchOp = Literal["create", "upsert", "update", "delete"]
 
 logger = logging.getLogger(__name__)
 
 
+def encode_entity(entity: Entity) -> bytes:
+    return jsoncodec.dumpb(entity)
+
+
+def encode_id(entity: EntityOrId) -> bytes:
+    return jsoncodec.dumpb(entity_id(entity))
+
+
+class Chunk(list):
+    """A chunk of entities that keeps track of the serialized form of each entity.
+
+    Entities are encoded once while filling the chunk, so that the payload size is known before sending it.
+    The request body is then assembled from the encoded parts.
+    """
+
+    def __init__(self, entities: Iterable = (), parts: Iterable[bytes] = ()):
+        super().__init__(entities)
+        self.parts: List[bytes] = list(parts)
+
+    @property
+    def body(self) -> bytes:
+        """The JSON array of the encoded parts, assembled in a single copy."""
+        if not self.parts:
+            return b"[]"
+        pieces = [b","] * (2 * len(self.parts) + 1)
+        pieces[0], pieces[-1] = b"[", b"]"
+        pieces[1::2] = self.parts
+        return b"".join(pieces)
+
+    def split(self) -> tuple[Chunk, Chunk]:
+        half = len(self) // 2
+        return Chunk(self[:half], self.parts[:half]), Chunk(self[half:], self.parts[half:])
+
+
+def payload(entities: Sequence, value: Callable[[Any], Any] = jsoncodec.unwrap) -> bytes:
+    """Return the request body of a batch operation.
+
+    Chunks already hold their encoded parts. Otherwise the underlying dictionaries of the entities
+    (or whatever value returns for each item) are encoded at once, straight into the body.
+    """
+    if isinstance(entities, Chunk):
+        return entities.body
+    return jsoncodec.dumpb([value(e) for e in entities])
+
+
+class AdaptiveBatchSize:
+    """Adjust the number of entities per batch request on the fly.
+
+    Chunks are bounded both by a number of entities and by the size of the serialized payload,
+    so that small entities are sent by large batches whereas big entities are sent by smaller ones.
+    The number of entities then follows an AIMD scheme driven by the broker :
+    it grows while responses are faster than the target latency, and shrinks when they're slower.
+    It's halved when the broker answers 413 (Payload Too Large) or 5xx.
+
+    A single instance can be shared across operations to keep the knowledge gained along the way.
+
+    Parameters
+    ----------
+    initial : int, optional
+        the number of entities of the first chunk, by default BATCHSIZE
+    minsize : int, optional
+        the lower bound of the number of entities per chunk, by default 1
+    maxsize : int, optional
+        the upper bound of the number of entities per chunk, by default 1000
+    max_payload : int, optional
+        the maximum size of the serialized payload in bytes, by default 1MB
+    target_latency : float, optional
+        the expected response time in seconds, by default 1.0
+
+    Example
+    -------
+    >>> from ngsildclient import Client
+    >>> from ngsildclient.api.batch import AdaptiveBatchSize
+    >>> with Client() as client:
+    >>>     client.upsert(buildings, batchsize=AdaptiveBatchSize(max_payload=512_000), max_inflight=4)
+    """
+
+    def __init__(
+        self,
+        initial: int = BATCHSIZE,
+        *,
+        minsize: int = 1,
+        maxsize: int = 1000,
+        max_payload: int = 1_000_000,
+        target_latency: float = 1.0,
+    ):
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.max_payload = max_payload
+        self.target_latency = target_latency
+        self.size = self._clamp(initial)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"AdaptiveBatchSize(size={self.size}, max_payload={self.max_payload})"
+
+    def _clamp(self, size: int) -> int:
+        return max(self.minsize, min(self.maxsize, size))
+
+    def feedback(self, n: int, elapsed: float):
+        """Adjust the size given the response time of a successful request of n entities."""
+        with self._lock:
+            if elapsed > self.target_latency:
+                self.size = self._clamp(min(self.size, n) * 3 // 4)
+            elif n >= self.size:  # only grow when the chunk was bounded by the count, not by the payload
+                self.size = self._clamp(self.size + max(1, self.size // 4))
+
+    def shrink(self):
+        """Halve the size, i.e. after the broker has answered 413 or 5xx."""
+        with self._lock:
+            self.size = self._clamp(self.size // 2)
+
+    def chunked(self, entities: Iterable, encode: Callable[[Any], bytes] = encode_entity) -> Iterator[Chunk]:
+        builder = ChunkBuilder(self, encode)
+        for entity in entities:
+            if (chunk := builder.push(entity)) is not None:
+                yield chunk
+        if (chunk := builder.flush()) is not None:
+            yield chunk
+
+
+class ChunkBuilder:
+    """Fill chunks up to the current size of an AdaptiveBatchSize, without exceeding its maximum payload."""
+
+    def __init__(self, sizer: AdaptiveBatchSize, encode: Callable[[Any], bytes] = encode_entity):
+        self.sizer = sizer
+        self.encode = encode
+        self.chunk = Chunk()
+        self.nbytes = 2  # enclosing brackets
+
+    def flush(self) -> Optional[Chunk]:
+        chunk, self.chunk, self.nbytes = self.chunk, Chunk(), 2
+        return chunk or None
+
+    def push(self, entity) -> Optional[Chunk]:
+        """Add an entity. Returns the previous chunk as soon as it is full, else None."""
+        full = None
+        part = self.encode(entity)
+        if self.chunk and (self.nbytes + len(part) + 1 > self.sizer.max_payload or len(self.chunk) >= self.sizer.size):
+            full = self.flush()
+        self.chunk.append(entity)
+        self.chunk.parts.append(part)
+        self.nbytes += len(part) + 1
+        if full is None and len(self.chunk) >= self.sizer.size:
+            full = self.flush()
+        return full
+
+
+def chunked(
+    entities: Iterable, batchsize: Union[int, AdaptiveBatchSize], encode: Callable[[Any], bytes] = encode_entity
+) -> Iterator[Sequence]:
+    """Split entities into chunks of at most batchsize items.
+
+    Sequences are sliced. Any other iterable (i.e. a generator) is consumed lazily,
+    so that only the current chunk is held in memory.
+    If batchsize is an AdaptiveBatchSize, chunks are also bounded by the payload size.
+    """
+    if isinstance(batchsize, AdaptiveBatchSize):
+        yield from batchsize.chunked(entities, encode)
+        return
+    if isinstance(entities, Sequence):
+        for i in range(0, len(entities), batchsize):
+            yield entities[i : i + batchsize]
+        return
+    it = iter(entities)
+    while chunk := list(islice(it, batchsize)):
+        yield chunk
+
+
+RETRYABLE_ERRORS = frozenset(
+    {
+        "https://uri.etsi.org/ngsi-ld/errors/InternalError",
+        "https://uri.etsi.org/ngsi-ld/errors/LdContextNotAvailable",
+    }
+)
+
+
+@dataclass
+class RetryPolicy:
+    """Tell how to retry the entities a batch operation has failed to process.
+
+    Entities reported in the errors of a 207 Multi-Status response are resent if their ProblemDetails type
+    is retryable. Whole requests that fail with one of the retryable HTTP statuses are resent too.
+    Each new attempt is delayed by an exponential backoff, with full jitter to spread the retries of concurrent
+    requests.
+    If a retry request fails once some entities have been processed, the remaining entities are reported
+    in the errors of the result rather than raising, so that the entities already processed are not lost.
+
+    Parameters
+    ----------
+    max_attempts : int, optional
+        the maximum number of attempts for a given entity, first one included, by default 3
+    backoff : float, optional
+        the delay in seconds before the 2nd attempt, doubled at each attempt, by default 0.5
+    max_backoff : float, optional
+        the upper bound of the delay in seconds, by default 30.0
+    jitter : bool, optional
+        draw the delay at random between zero and the backoff, by default True
+    retryable : Set[str], optional
+        the retryable ProblemDetails types, by default InternalError and LdContextNotAvailable
+    statuses : Set[int], optional
+        the retryable HTTP status codes, by default 429, 502, 503 and 504
+
+    Example
+    -------
+    >>> from ngsildclient import Client
+    >>> from ngsildclient.api.batch import RetryPolicy
+    >>> with Client() as client:
+    >>>     r = client.upsert(rooms, retry=RetryPolicy(max_attempts=5))
+    """
+
+    max_attempts: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    jitter: bool = True
+    retryable: Set[str] = field(default_factory=lambda: set(RETRYABLE_ERRORS))
+    statuses: Set[int] = field(default_factory=lambda: {429, 502, 503, 504})
+
+    def delay(self, attempt: int) -> float:
+        """Return the delay in seconds before the next attempt, given the number of attempts already made."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def is_retryable(self, error: dict) -> bool:
+        """Tell if an error item of a 207 Multi-Status response is worth a retry.
+
+        An error item without entityId can't be matched to an entity of the chunk, it is never retried.
+        """
+        if error.get("entityId") is None:
+            return False
+        problemdetails = error.get("error") or {}
+        pd_type = problemdetails.get("type") or ""
+        return pd_type.rstrip() in self.retryable or problemdetails.get("status") in self.statuses
+
+
+def entity_id(entity: EntityOrId) -> str:
+    if isinstance(entity, Entity):
+        return entity.id
+    return entity["id"] if isinstance(entity, Mapping) else entity
+
+
+def subchunk(chunk: Sequence, ids: Set[str]) -> Sequence:
+    """Return the entities of the chunk whose id is given."""
+    keep = [i for i, e in enumerate(chunk) if entity_id(e) in ids]
+    if isinstance(chunk, Chunk):
+        return Chunk([chunk[i] for i in keep], [chunk.parts[i] for i in keep])
+    return [chunk[i] for i in keep]
+
+
+def failed_items(chunk: Sequence, e: BaseException) -> List[dict]:
+    """Turn a failed request into one error item per entity of the chunk, as found in a 207 Multi-Status response."""
+    if isinstance(e, NgsiContextBrokerError):
+        pd = e.problemdetails
+        problemdetails = {**(pd.extension or {}), **{k: v for k, v in asdict(pd).items() if v is not None}}
+        problemdetails.pop("extension", None)
+    else:
+        problemdetails = {"title": type(e).__name__, "status": http_status(e), "detail": str(e)}
+    return [{"entityId": entity_id(x), "error": dict(problemdetails)} for x in chunk]
+
+
+class ChangeSet:
+    """Collect the changes of tracked entities to be sent by a batch update.
+
+    Each entity is sent as a partial entity holding only its added and modified attributes.
+    Removed attributes can't be expressed in a batch update, they are deleted afterwards.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, Tuple[Entity, List[str], bool]] = {}  # id -> (entity, removed attrs, sent)
+
+    def fragment(self, entity: Entity) -> Optional[dict]:
+        """Return the partial entity to be sent, None if there is nothing to send."""
+        added, modified, removed = entity.changes()
+        changed = added + modified
+        if changed or removed:
+            self.pending[entity.id] = (entity, removed, bool(changed))
+        return entity.partial_dict(changed) if changed else None
+
+    def fragments(self, entities: Iterable[Entity]) -> Iterator[dict]:
+        for entity in entities:
+            if (fragment := self.fragment(entity)) is not None:
+                yield fragment
+
+    def updated(self, r: BatchResult) -> Iterator[Tuple[Entity, List[str]]]:
+        """Yield the entities successfully updated and their attributes to be removed."""
+        success = set(r.success)
+        for eid, (entity, removed, sent) in self.pending.items():
+            if eid in success or not sent:
+                yield entity, removed
+
+
 @dataclass
 class BatchResult:
     op: BatchOp = "N/A"
     success: List = field(default_factory=list)
     errors: List = field(default_factory=list)
+    elapsed: List[float] = field(default_factory=list)  # per-chunk request duration (in seconds)
+    retries: int = 0  # number of requests sent again to retry failed entities
 
     @property
     def ok(self) -> bool:
@@ -58,7 +372,9 @@ class BatchResult:
 
     @property
     def ratio(self) -> float:
-        r = self.n_ok / (self.n_ok + self.n_err)
+        if self.n_tot == 0:
+            return 1.0
+        r = self.n_ok / self.n_tot
         return round(r, 2)
 
     @property
@@ -80,109 +396,256 @@ class BatchResult:
     def __iadd__(self, r: BatchResult):
         self.success.extend(r.success)
         self.errors.extend(r.errors)
+        self.elapsed.extend(r.elapsed)
+        self.retries += r.retries
         return self
 
 
-class Batch:
+class Batch(ClientSession):
     """A wrapper for the NGSI-LD API batch endpoint."""
 
     def __init__(self, client: Client, url: str):
         self._client = client
-        self._session = client.session
         self.url = url
         self.console = Console()
 
+    def _send_chunk(
+        self, f: Callable[..., BatchResult], chunk: Sequence, sizer: Optional[AdaptiveBatchSize], *args
+    ) -> BatchResult:
+        start = time.perf_counter()
+        try:
+            r = f(chunk, *args)
+        except Exception as e:
+            if sizer is None:
+                raise
+            status = http_status(e)
+            if status == 413 or (status is not None and status >= 500):
+                sizer.shrink()
+                if status == 413 and len(chunk) > 1:
+                    # nothing has been processed : resend the chunk in two halves
+                    left, right = chunk.split()
+                    r = self._send_chunk(f, left, sizer, *args)
+                    r += self._send_chunk(f, right, sizer, *args)
+                    return r
+            raise
+        elapsed = time.perf_counter() - start
+        r.elapsed.append(elapsed)
+        if sizer is not None:
+            sizer.feedback(len(chunk), elapsed)
+        return r
+
+    def _send(
+        self,
+        f: Callable[..., BatchResult],
+        chunk: Sequence,
+        sizer: Optional[AdaptiveBatchSize],
+        retry: Optional[RetryPolicy],
+        *args,
+    ) -> BatchResult:
+        if retry is None:
+            return self._send_chunk(f, chunk, sizer, *args)
+        result: BatchResult = None
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                r = self._send_chunk(f, chunk, sizer, *args)
+            except Exception as e:
+                if attempt < retry.max_attempts and http_status(e) in retry.statuses:
+                    logger.warning(f"Batch request failed with {http_status(e)}. Attempt {attempt}/{retry.max_attempts}")
+                    time.sleep(retry.delay(attempt))
+                    continue
+                if result is None:
+                    raise
+                # some entities have already been processed : report the remaining ones as failed
+                logger.warning(f"Retry of {len(chunk)} entities failed with {http_status(e)}")
+                result.errors.extend(failed_items(chunk, e))
+                result.retries += attempt - 1
+                return result
+            if result is None:
+                result = BatchResult(r.op)
+            retryable = [e for e in r.errors if retry.is_retryable(e)]
+            r.errors = [e for e in r.errors if not retry.is_retryable(e)]
+            result += r
+            if not retryable or attempt >= retry.max_attempts:
+                result.errors.extend(retryable)
+                result.retries += attempt - 1
+                return result
+            logger.info(f"Retry {len(retryable)} failed entities. Attempt {attempt}/{retry.max_attempts}")
+            chunk = subchunk(chunk, {eid for eid in (e.get("entityId") for e in retryable) if eid is not None})
+            time.sleep(retry.delay(attempt))
+
+    def _dispatch(
+        self,
+        op: BatchOp,
+        f: Callable[..., BatchResult],
+        entities: Iterable,
+        batchsize: Union[int, AdaptiveBatchSize],
+        max_inflight: int,
+        retry: Optional[RetryPolicy],
+        *args,
+    ) -> BatchResult:
+        """Send entities by chunks of batchsize, using a pool of max_inflight worker threads.
+
+        Chunks are filled lazily from the input and submitted as soon as they are full.
+        At most 2 * max_inflight chunks are pending at once, so memory stays bounded whatever the input size.
+        Per-chunk results are merged in input order, whatever the order the responses come back.
+        """
+        r = BatchResult(op)
+        sizer = batchsize if isinstance(batchsize, AdaptiveBatchSize) else None
+        encode = encode_id if op == "delete" else encode_entity
+        if max_inflight <= 1:
+            for chunk in chunked(entities, batchsize, encode):
+                r += self._send(f, chunk, sizer, retry, *args)
+            return r
+        self._client._ensure_poolsize(max_inflight)
+        pending: deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix=f"batch-{op}") as executor:
+            try:
+                for chunk in chunked(entities, batchsize, encode):
+                    if len(pending) >= 2 * max_inflight:
+                        r += pending.popleft().result()
+                    pending.append(executor.submit(self._send, f, chunk, sizer, retry, *args))
+                while pending:
+                    r += pending.popleft().result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+        return r
+
     @rfc7807_error_handle
     def _create(self, entities: Sequence[Entity]) -> BatchResult:
-        r = self._session.post(f"{self.url}/create/", data=json.dumps([e for e in entities], cls=NgsiEncoder))
+        r = self._session.post(f"{self.url}/create/", data=payload(entities))
         self._client.raise_for_status(r)
         if r.status_code == 201:
-            success, errors = r.json(), []
+            success, errors = jsoncodec.loads(r.content), []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Create : Unkown HTTP response code {}", r.status_code)
         return BatchResult("create", success, errors)
 
     @rfc7807_error_handle
-    def create(self, entities: Sequence[Entity], *, batchsize: int = BATCHSIZE) -> BatchResult:
-        r = BatchResult("create")
-        for i in range(0, len(entities), batchsize):
-            r += self._create(entities[i : i + batchsize])
+    def create(
+        self,
+        entities: Iterable[Entity],
+        *,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
+        r = self._dispatch("create", self._create, entities, batchsize, max_inflight, retry)
         self.console.message(f"Entities created : {r.n_ok}/{r.n_tot} [{r.ratio:.2f}]", lvl=r.level)
         return r
 
     @rfc7807_error_handle
     def _upsert(self, entities: Sequence[Entity], opt: Literal["replace", "update"] = "replace") -> BatchResult:
         params = {"options": opt} if opt else {}
-        r = self._session.post(
-            f"{self.url}/upsert/", data=json.dumps([e for e in entities], cls=NgsiEncoder), params=params
-        )
+        r = self._session.post(f"{self.url}/upsert/", data=payload(entities), params=params)
         self._client.raise_for_status(r)
         if r.status_code == 201:
-            success, errors = r.json(), []
+            success, errors = jsoncodec.loads(r.content), []
         elif r.status_code == 204:
-            success, errors = [e.id for e in entities], []
+            success, errors = [entity_id(e) for e in entities], []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Upsert : Unkown HTTP response code {}", r.status_code)
         return BatchResult("upsert", success, errors)
 
     @rfc7807_error_handle
-    def upsert(self, entities: Sequence[Entity], *, update: bool = False, batchsize: int = BATCHSIZE) -> BatchResult:
+    def upsert(
+        self,
+        entities: Iterable[Entity],
+        *,
+        update: bool = False,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
         # default mode (without any option) is "replace", anyway always force the option
         opt = "update" if update else "replace"
-        r = BatchResult("upsert")
-        for i in range(0, len(entities), batchsize):
-            r += self._upsert(entities[i : i + batchsize], opt)
+        r = self._dispatch("upsert", self._upsert, entities, batchsize, max_inflight, retry, opt)
         self.console.message(f"Entities upserted : {r.n_ok}/{r.n_tot} [{r.ratio:.2f}]", lvl=r.level)
         return r
 
     @rfc7807_error_handle
     def _update(self, entities: Sequence[Entity], opt: Literal["noOverwrite"] = None) -> BatchResult:
         params = {"options": opt} if opt else {}
-        r = self._session.post(
-            f"{self.url}/update/", data=json.dumps([e for e in entities], cls=NgsiEncoder), params=params
-        )
+        r = self._session.post(f"{self.url}/update/", data=payload(entities), params=params)
         self._client.raise_for_status(r)
         if r.status_code == 204:
-            success, errors = [e.id for e in entities], []
+            success, errors = [entity_id(e) for e in entities], []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Update : Unkown HTTP response code {}", r.status_code)
         return BatchResult("update", success, errors)
 
     @rfc7807_error_handle
-    def update(self, entities: Sequence[Entity], *, overwrite: bool = True, batchsize: int = BATCHSIZE) -> BatchResult:
+    def update(
+        self,
+        entities: Iterable[Entity],
+        *,
+        overwrite: bool = True,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
         opt = "noOverwrite" if not overwrite else None
-        r = BatchResult("update")
-        for i in range(0, len(entities), batchsize):
-            r += self._update(entities[i : i + batchsize], opt)
+        r = self._dispatch("update", self._update, entities, batchsize, max_inflight, retry, opt)
+        self.console.message(f"Entities updated : {r.n_ok}/{r.n_tot} [{r.ratio:.2f}]", lvl=r.level)
+        return r
+
+    @rfc7807_error_handle
+    def update_changed(
+        self,
+        entities: Iterable[Entity],
+        *,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
+        """Send only the attributes changed since the entities were loaded from the broker or last synced.
+
+        Unchanged entities are skipped. Partial entities are sent to the batch update endpoint,
+        then removed attributes are deleted and the entities successfully updated are marked as synced.
+        """
+        changes = ChangeSet()
+        r = self._dispatch("update", self._update, changes.fragments(entities), batchsize, max_inflight, retry)
+        for entity, removed in changes.updated(r):
+            for attr in removed:
+                self._client.entities.delete_attr(entity, attr)
+            entity.mark_synced()
         self.console.message(f"Entities updated : {r.n_ok}/{r.n_tot} [{r.ratio:.2f}]", lvl=r.level)
         return r
 
     @rfc7807_error_handle
     def _delete(self, entities: Sequence[EntityOrId]) -> BatchResult:
-        r = self._session.post(f"{self.url}/delete/", json=[e.id if isinstance(e, Entity) else e for e in entities])
+        r = self._session.post(f"{self.url}/delete/", data=payload(entities, entity_id))
         self._client.raise_for_status(r)
         if r.status_code == 204:
-            success, errors = [e.id for e in entities], []
+            success, errors = [entity_id(e) for e in entities], []
         elif r.status_code == 207:
-            content = r.json()
+            content = jsoncodec.loads(r.content)
             success, errors = content["success"], content["errors"]
         else:
             raise NgsiApiError("Batch Delete : Unkown HTTP response code {}", r.status_code)
         return BatchResult("delete", success, errors)
 
     @rfc7807_error_handle
-    def delete(self, entities: Sequence[EntityOrId], *, batchsize: int = BATCHSIZE) -> BatchResult:
-        r = BatchResult("delete")
-        for i in range(0, len(entities), batchsize):
-            r += self._delete(entities[i : i + batchsize])
+    def delete(
+        self,
+        entities: Iterable[EntityOrId],
+        *,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> BatchResult:
+        r = self._dispatch("delete", self._delete, entities, batchsize, max_inflight, retry)
         self.console.message(f"Entities deleted : {r.n_ok}/{r.n_tot} [{r.ratio:.2f}]", lvl=r.level)
         return r
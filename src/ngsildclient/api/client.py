@@ -17,19 +17,25 @@ if TYPE_CHECKING:
     from ngsildclient.model.constants import EntityOrId
 
 import logging
+import threading
+import time
+import weakref
 import requests
 from requests.auth import AuthBase
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from math import ceil
 import networkx as nx
 
 from ngsildclient import __version__ as __version__
-from ..utils import is_interactive
+from ..utils import is_interactive, jsoncodec
+from ..utils.prefetch import prefetch as read_ahead
 from ..utils.urn import Urn
 from ngsildclient import Entity
 from .constants import *
 from .entities import Entities
-from .batch import Batch, BatchResult
+from .batch import Batch, BatchResult, AdaptiveBatchSize, RetryPolicy
+from .purge import PURGE_MAX_INFLIGHT, Purge, PurgeProgress
 from .types import Types
 from .contexts import Contexts
 from .subscriptions import Subscriptions
@@ -153,6 +159,7 @@ class Client:
         self.proxy = proxy
         self.url_temporal = f"{self.scheme}://{hostname}:{port_temporal}"
 
+        self._lock = threading.Lock()
         self.session = requests.Session()
         if custom_auth:
             self.session.auth = custom_auth
@@ -196,6 +203,48 @@ class Client:
         else:
             self.console.print(self._fail_message())
 
+    @property
+    def session(self) -> requests.Session:
+        """The HTTP session of the calling thread.
+
+        A requests Session is not guaranteed to be thread-safe : worker threads get their own session,
+        configured as the client's one and sharing its adapters, hence its connection pool.
+        Setting the session replaces the client's one, worker threads then derive theirs from the new one.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.auth = self._session.auth
+            session.headers = self._session.headers.copy()
+            session.proxies = self._session.proxies
+            session.verify, session.cert = self._session.verify, self._session.cert
+            for prefix, adapter in self._session.adapters.items():
+                session.mount(prefix, adapter)
+            with self._lock:
+                self._sessions.add(session)
+        return session
+
+    @session.setter
+    def session(self, session: requests.Session):
+        self._session = session
+        self._local = threading.local()
+        self._local.session = session
+        self._sessions = weakref.WeakSet()  # the sessions of the worker threads still alive
+        self._poolsize = DEFAULT_POOLSIZE
+
+    def _ensure_poolsize(self, size: int):
+        # make sure each worker thread gets its own pooled connection to the broker
+        with self._lock:
+            if size <= self._poolsize:
+                return
+            adapter = self._session.get_adapter(self.url)
+            if isinstance(adapter, HTTPAdapter) and adapter._pool_maxsize < size:
+                # resized in place, so that a custom adapter (retries, TLS) is kept
+                pool = adapter.poolmanager
+                adapter.init_poolmanager(adapter._pool_connections, size, block=adapter._pool_block)
+                pool.clear()
+            self._poolsize = size
+
     def raise_for_status(self, r: Response):
         """Raises an exception depending on the API response.
 
@@ -289,11 +338,21 @@ class Client:
     def close(self):
         """Terminates the client.
 
-        Closes the underlying Requests.Session.
+        Closes the underlying Requests.Session, and the ones of the worker threads.
         """
-        self.session.close()
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            session.close()
+        self._session.close()
 
-    def create(self, *entities) -> Union[bool, BatchResult]:
+    def create(
+        self,
+        *entities,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Create one or many entities.
 
         Facade method backed by Batch.create() or Entities.create()
@@ -302,7 +361,15 @@ class Client:
         ----------
         entities :
             Entities to be created by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         Returns
         -------
@@ -315,15 +382,19 @@ class Client:
                 return self.entities.create(entity)
             else:
                 entities = entities[0]
-        return self.batch.create(entities)
+        return self.batch.create(entities, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
 
     def get(
         self,
         entity: EntityOrId,
         ctx: str = None,
         asdict: bool = False,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        track: bool = False,
         **kwargs,
-    ) -> Entity:
+    ) -> Union[Entity, dict]:
         """Retrieve an entity given its id.
 
         Facade method for Entities.retrieve().
@@ -337,15 +408,27 @@ class Client:
             The context
         asdict : bool, optional
             If set (instead of returning an Entity) returns the raw API response (a Python dict that represents the JSON response), by default False
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entity, by default normalized. The entity is returned as a dict for any other format.
+        track: bool
+            If set the entity tracks its changes, to be sent with update_changed(), by default False
 
         Returns
         -------
         Entity
             The retrieved entity
         """
-        return self.entities.get(entity, ctx, asdict, **kwargs)
+        return self.entities.get(entity, ctx, asdict, attrs=attrs, format=format, track=track, **kwargs)
 
-    def delete(self, *entities) -> Union[bool, BatchResult]:
+    def delete(
+        self,
+        *entities,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Delete one or many entities.
 
         Facade method backed by Batch.delete() or Entities.delete()
@@ -354,7 +437,15 @@ class Client:
         ----------
         entities :
             Entities to be deleted by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         Returns
         -------
@@ -367,7 +458,7 @@ class Client:
                 return self.entities.delete(entity)
             else:
                 entities = entities[0]
-        return self.batch.delete(entities)
+        return self.batch.delete(entities, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
 
     def delete_from_file(self, filename: str) -> Union[bool, BatchResult]:
         """Delete in the broker all entities present in the JSON file.
@@ -398,7 +489,14 @@ class Client:
         """
         return self.entities.exists(entity)
 
-    def upsert(self, *entities, update: bool = False) -> Union[bool, BatchResult]:
+    def upsert(
+        self,
+        *entities,
+        update: bool = False,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Upsert one or many entities.
 
         Facade method backed by Batch.upsert() or Entities.upsert()
@@ -407,7 +505,15 @@ class Client:
         ----------
         entities :
             Entities to be upserted by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         update: bool
             For batch mode only.
@@ -425,7 +531,7 @@ class Client:
                 return self.entities.upsert(entity)
             else:
                 entities = entities[0]
-        return self.batch.upsert(entities, update=update)
+        return self.batch.upsert(entities, update=update, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
 
     def bulk_import(self, filename: str) -> Union[bool, dict]:
         """Upsert all entities from a JSON file.
@@ -438,7 +544,14 @@ class Client:
         entities = Entity.load(filename)
         return self.upsert(entities)
 
-    def update(self, *entities, overwrite=True) -> Union[bool, BatchResult]:
+    def update(
+        self,
+        *entities,
+        overwrite=True,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
         """Upsert one or many entities.
 
         Facade method backed by Batch.update() or Entities.update()
@@ -447,7 +560,15 @@ class Client:
         ----------
         entities :
             Entities to be upserted by the Context Broker
-            Either a single Entity, or a list of entities, or comma-separated entities
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
 
         overwrite: bool
             For batch mode only.
@@ -465,9 +586,60 @@ class Client:
                 return self.entities.update(entity)
             else:
                 entities = entities[0]
-        return self.batch.update(entities, overwrite=overwrite)
+        return self.batch.update(
+            entities, overwrite=overwrite, batchsize=batchsize, max_inflight=max_inflight, retry=retry
+        )
+
+    def update_changed(
+        self,
+        *entities,
+        batchsize: Union[int, AdaptiveBatchSize] = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+    ) -> Union[bool, BatchResult]:
+        """Update one or many entities, sending only the attributes changed since they were loaded or last synced.
+
+        Facade method backed by Batch.update_changed() or Entities.update_changed()
+        Entities retrieved with track=True track their changes. Untracked entities are sent as a whole.
 
-    def query_head(self, type: str = None, q: str = None, gq: str = None, ctx: str = None, n: int = 5) -> List[Entity]:
+        Parameters
+        ----------
+        entities :
+            Entities to be updated by the Context Broker
+            Either a single Entity, or a list of entities, or comma-separated entities,
+            or an iterable (i.e. a generator) that is consumed lazily chunk by chunk
+        batchsize: int or AdaptiveBatchSize
+            For batch mode only. The maximum number of entities sent per request,
+            or an AdaptiveBatchSize to tune it on the fly given the payload size and the broker latency.
+        max_inflight: int
+            For batch mode only. The number of requests sent concurrently, by default 1 (sequential).
+        retry: RetryPolicy
+            For batch mode only. The policy to retry the entities that failed, by default None (no retry).
+
+        Returns
+        -------
+        Union[bool, BatchResult]
+            For a single entity, True if some attributes have been sent. The batch result otherwise.
+        """
+        if len(entities) == 1:
+            if isinstance(entities[0], Entity):
+                return self.entities.update_changed(entities[0])
+            else:
+                entities = entities[0]
+        return self.batch.update_changed(entities, batchsize=batchsize, max_inflight=max_inflight, retry=retry)
+
+    def query_head(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        n: int = 5,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+    ) -> List[Entity]:
         """Retrieve entities given its type and/or query string.
 
         Retrieve up to PAGINATION_LIMIT_MAX entities.
@@ -486,6 +658,14 @@ class Client:
             The context
         n: int
             The first n entities to be retrieved
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entities, by default normalized.
+            Entities are returned as Python dicts for any other format.
+        asdict: bool
+            If set returns Python dicts instead of entities, by default False.
+            Skipping the Entity construction speeds up large or projected reads.
         Returns
         -------
         list[Entity]
@@ -499,7 +679,7 @@ class Client:
         >>> with Client() as client:
         >>>     client.query(type="AgriFarm", q='contactPoint[email]=="wheatfarm@email.com"') # match type and query
         """
-        return self.entities._query(type, q, gq, ctx, limit=n)
+        return self.entities._query(type, q, gq, ctx, limit=n, attrs=attrs, format=format, asdict=asdict)
 
     def query(
         self,
@@ -509,11 +689,18 @@ class Client:
         ctx: str = None,
         limit: int = PAGINATION_LIMIT_MAX,
         max: int = 1_000_000,
+        max_inflight: int = 1,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+        track: bool = False,
     ) -> List[Entity]:
         """Retrieve entities given its type and/or query string.
 
         Retrieve all entities by sending as many requests as needed, using pagination.
         Assume data hold in memory. Should not be an issue except for very large datasets.
+        Since the number of entities is known up front, pages can be fetched concurrently.
 
         Parameters
         ----------
@@ -527,6 +714,20 @@ class Client:
             The context
         limit: int
             The number of entities retrieved in each request
+        max: int
+            The maximum number of entities allowed
+        max_inflight: int
+            The number of pages fetched concurrently, by default 1 (sequential)
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entities, by default normalized.
+            Entities are returned as Python dicts for any other format.
+        asdict: bool
+            If set returns Python dicts instead of entities, by default False.
+            Skipping the Entity construction speeds up large or projected reads.
+        track: bool
+            If set the entities track their changes, to be sent with update_changed(), by default False
 
         Returns
         -------
@@ -542,12 +743,25 @@ class Client:
         >>>     client.query(type="AgriFarm", q='contactPoint[email]=="wheatfarm@email.com"') # match type and query
         """
 
-        entities: list[Entity] = []
-        count = self.entities.count(type, q, gq, ctx=ctx)
+        # the count comes along with the first page
+        projection = dict(attrs=attrs, format=format, asdict=asdict, track=track)
+        entities, count = self.entities._query_page(type, q, gq, ctx, limit, count=True, **projection)
+        if count is None:
+            count = self.entities.count(type, q, gq, ctx=ctx)
         if count > max:
             raise NgsiClientTooManyResultsError(f"{count} results exceed maximum {max}")
-        for page in range(ceil(count / limit)):
-            entities.extend(self.entities._query(type, q, gq, ctx, limit, page * limit))
+        offsets = range(limit, count, limit)
+        if max_inflight <= 1:
+            for offset in offsets:
+                entities.extend(self.entities._query(type, q, gq, ctx, limit, offset, **projection))
+            return entities
+        self._ensure_poolsize(max_inflight)
+        with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="query") as executor:
+            # map() yields the pages in offset order, whatever the order the responses come back
+            for page in executor.map(
+                lambda offset: self.entities._query(type, q, gq, ctx, limit, offset, **projection), offsets
+            ):
+                entities.extend(page)
         return entities
 
     def query_generator(
@@ -558,10 +772,17 @@ class Client:
         ctx: str = None,
         limit: int = PAGINATION_LIMIT_MAX,
         batch: bool = False,
+        prefetch: int = 0,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+        track: bool = False,
     ) -> Generator[Entity, None, None]:
         """Retrieve (as a generator) entities given its type and/or query string.
 
         By returning a generator it allows to process entities on the fly without any risk of exhausting memory.
+        With prefetch, the next pages are fetched in a background thread while the current one is processed.
 
         Parameters
         ----------
@@ -575,6 +796,20 @@ class Client:
             The context
         limit: int
             The number of entities retrieved in each request
+        batch: bool
+            Yield pages (lists of entities) instead of entities, by default False
+        prefetch: int
+            The number of pages fetched ahead, by default 0 (no read-ahead)
+        attrs: list[str]
+            The attributes to be retrieved, by default all of them
+        format: AttrsFormat
+            The representation of the entities, by default normalized.
+            Entities are returned as Python dicts for any other format.
+        asdict: bool
+            If set returns Python dicts instead of entities, by default False.
+            Skipping the Entity construction speeds up large or projected reads.
+        track: bool
+            If set the entities track their changes, to be sent with update_changed(), by default False
 
         Returns
         -------
@@ -587,12 +822,14 @@ class Client:
         >>>     for entity in client.query_handle(type="AgriFarm"):
                     print(entity)
         """
-        count = self.entities.count(type, q)
-        for page in range(ceil(count / limit)):
+        pages = self.entities._pages(type, q, gq, ctx, limit, attrs=attrs, format=format, asdict=asdict, track=track)
+        if prefetch > 0:
+            pages = read_ahead(pages, prefetch)
+        for entities in pages:
             if batch:
-                yield self.entities._query(type, q, gq, ctx, limit, page * limit)
+                yield entities
             else:
-                yield from self.entities._query(type, q, gq, ctx, limit, page * limit)
+                yield from entities
 
     def query_handle(
         self,
@@ -603,6 +840,8 @@ class Client:
         limit: int = PAGINATION_LIMIT_MAX,
         *,
         callback: Callable[[Entity], None],
+        prefetch: int = 0,
+        track: bool = False,
     ) -> None:
         """Apply a callback function on entity of the query result.
 
@@ -620,13 +859,17 @@ class Client:
             The number of entities retrieved in each request
         callback: Callable[Entity]
             The function to be called on each entity of the result
+        prefetch: int
+            The number of pages fetched ahead while the callback is processing entities, by default 0
+        track: bool
+            If set the entities track their changes, to be sent with update_changed(), by default False
 
         Example
         -------
         >>> with Client() as client:
         >>>     client.query_handle(type="AgriFarm", lambda e: print(e))
         """
-        for entity in self.query_generator(type, q, gq, ctx, limit, False):
+        for entity in self.query_generator(type, q, gq, ctx, limit, False, prefetch, track=track):
             callback(entity)
 
     def count(self, type: str = None, q: str = None, gq: str = None) -> int:
@@ -658,9 +901,22 @@ class Client:
         """
         return self.entities.count(type, q, gq)
 
-    def delete_where(self, type: str = None, q: str = None, gq: str = None):
+    def delete_where(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        *,
+        ctx: str = None,
+        batchsize: int = BATCHSIZE,
+        max_inflight: int = 1,
+        retry: RetryPolicy = None,
+        callback: Callable[[PurgeProgress], None] = None,
+    ) -> BatchResult:
         """Batch delete entities matching type and/or query string.
 
+        Only the entities ids are retrieved, then deleted by batches, max_inflight requests at once.
+
         Parameters
         ----------
         etype : str
@@ -669,42 +925,73 @@ class Client:
             The query string (NGSI-LD Query Language)
         gq: str
             The geoquery string (NGSI-LD Geoquery Language)
+        ctx : str, optional
+            The context, by default None
+        batchsize : int, optional
+            The number of entities per delete request, by default BATCHSIZE
+        max_inflight : int, optional
+            The number of delete requests sent concurrently, by default 1 (sequential).
+            drop() and purge() send PURGE_MAX_INFLIGHT requests at once.
+        retry : RetryPolicy, optional
+            The policy to retry the failed deletions, by default None
+        callback : Callable[[PurgeProgress], None], optional
+            The function called to report the progress, by default None
+
+        Returns
+        -------
+        BatchResult
+            The deleted entities and the errors
 
         Example
         -------
         >>> with Client() as client:
         >>>     client.delete_where(type="AgriFarm", query='contactPoint[email]=="wheatfarm@email.com"') # match type and query
         """
-        g = self.query_generator(type, q, gq, batch=True)
-        for batch in g:
-            self.batch.delete(batch)
+        purge = Purge(self, batchsize=batchsize, max_inflight=max_inflight, retry=retry, callback=callback)
+        start = time.perf_counter()
+        r = purge.run(type, q, gq, ctx)
+        elapsed = time.perf_counter() - start
+        rate = r.n_ok / max(elapsed, 1e-9)
+        self.console.message(
+            f"Entities deleted : {r.n_ok}/{r.n_tot} [{r.ratio:.2f}] in {elapsed:.2f}s ({rate:.0f} entities/s)",
+            lvl=r.level,
+        )
+        return r
 
-    def drop(self, *types: str) -> None:
+    def drop(self, *types: str, **kwargs) -> None:
         """Batch delete entities matching the given type.
 
         Parameters
         ----------
         type : str
             The entity's type
+        **kwargs
+            Options forwarded to delete_where(), deleting PURGE_MAX_INFLIGHT batches at once unless max_inflight is set
 
         Example
         -------
         >>> with Client() as client:
         >>>     client.drop("AgriFarm")
         """
+        kwargs.setdefault("max_inflight", PURGE_MAX_INFLIGHT)
         for t in types:
-            self.delete_where(type=t)
+            self.delete_where(type=t, **kwargs)
 
-    def purge(self) -> None:
+    def purge(self, **kwargs) -> None:
         """Batch delete all entities.
 
+        Parameters
+        ----------
+        **kwargs
+            Options forwarded to delete_where(), deleting PURGE_MAX_INFLIGHT batches at once unless max_inflight is set
+
         Example
         -------
         >>> with Client() as client:
         >>>     client.purge()
         """
         for type in self.types.list():
-            self.drop(type)
+            self.drop(type, **kwargs)
 
     def flush_all(self) -> None:
         """Batch delete all entities and remove all contexts.
@@ -712,9 +999,9 @@ class Client:
         Example
         -------
         >>> with Client() as client:
-        >>>     client.purge()
+        >>>     client.flush_all()
         """
-        self.purge(type)
+        self.purge()
         self.contexts.cleanup()
 
     def create_tenant(self, tenant: str) -> Response:
@@ -767,7 +1054,7 @@ class Client:
         try:
             r = self.session.get(url, headers=headers)
             r.raise_for_status()
-            return Vendor.ORIONLD, r.json()["orionld version"]
+            return Vendor.ORIONLD, jsoncodec.loads(r.content)["orionld version"]
         except Exception:
             return None
 
@@ -794,7 +1081,7 @@ class Client:
         try:
             r = self.session.get(f"{url}/info", headers=headers)
             r.raise_for_status()
-            build = r.json()["build"]
+            build = jsoncodec.loads(r.content)["build"]
             version = build["version"]
             group = build["group"]
             if group == "eu.neclab.ngsildbroker":
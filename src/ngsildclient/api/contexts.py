@@ -12,31 +12,31 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Optional
 import re
-import json
 import logging
 
 if TYPE_CHECKING:
     from .client import Client
 
 from ngsildclient.model.constants import CORE_CONTEXT
+from ..utils import jsoncodec
 from .exceptions import rfc7807_error_handle
+from .session import ClientSession
 
 
 logger = logging.getLogger(__name__)
 
 
-class Contexts:
+class Contexts(ClientSession):
     """A wrapper for the NGSI-LD API context endpoint."""
 
     def __init__(self, client: Client, url: str):
         self._client = client
-        self._session = client.session
         self.url = url
 
     @rfc7807_error_handle
     def list(self, pattern: str = None) -> Optional[dict]:
         r = self._session.get(f"{self.url}")
-        contexts = r.json()
+        contexts = jsoncodec.loads(r.content)
         if pattern is not None:
             contexts = [x for x in contexts if re.search(pattern, x, re.IGNORECASE)]
         return contexts
@@ -45,7 +45,7 @@ class Contexts:
     def get(self, ctx: str) -> dict:
         r = self._session.get(f"{self.url}/{ctx}")
         self._client.raise_for_status(r)
-        return r.json()
+        return jsoncodec.loads(r.content)
 
     @rfc7807_error_handle
     def _delete(self, ctx: str) -> bool:
@@ -67,7 +67,7 @@ class Contexts:
     def exists(self, ctx: str) -> bool:
         r = self._session.get(f"{self.url}/{ctx}")
         if r:
-            payload = r.json()
+            payload = jsoncodec.loads(r.content)
             return "@context" in payload
         return False
 
@@ -87,6 +87,6 @@ class Contexts:
 
     @rfc7807_error_handle
     def add_file(self, ctxfilename: str):
-        with open(ctxfilename, "r") as fp:
-            ctx = json.load(fp)
+        with open(ctxfilename, "rb") as fp:
+            ctx = jsoncodec.loads(fp.read())
         self.add(ctx)
@@ -11,7 +11,7 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Sequence
+from typing import TYPE_CHECKING, Iterator, List, Optional, Sequence, Tuple, Union
 
 import logging
 
@@ -21,21 +21,41 @@ if TYPE_CHECKING:
     from .client import Client
     from ..model.constants import EntityOrId
 
+from ..utils import jsoncodec
+from ..utils import _addopt
 from ..utils.urn import Urn
-from .constants import ENDPOINT_ENTITIES, JSONLD_CONTEXT
+from .constants import ENDPOINT_ENTITIES, JSONLD_CONTEXT, PAGINATION_LIMIT_MAX, AttrsFormat
 from .exceptions import NgsiAlreadyExistsError, rfc7807_error_handle
 from ..model.entity import Entity
+from .session import ClientSession
 
 
 logger = logging.getLogger(__name__)
 
 
-class Entities:
+def _add_projection(
+    params: dict, attrs: List[str] = None, format: AttrsFormat = AttrsFormat.NORMALIZED, pick: List[str] = None
+) -> bool:
+    """Add the attributes projection and the representation format to the request parameters.
+
+    pick is the NGSI-LD 1.8 projection on the entity members, i.e. ["id"] to retrieve the ids only.
+    Returns True if the response is to be kept as dicts, since only the normalized representation maps to entities.
+    """
+    if attrs:
+        params["attrs"] = ",".join(attrs)
+    if pick:
+        params["pick"] = ",".join(pick)
+    format = AttrsFormat(format)
+    if format != AttrsFormat.NORMALIZED:
+        _addopt(params, format.value)
+    return format != AttrsFormat.NORMALIZED
+
+
+class Entities(ClientSession):
     """A wrapper for the NGSI-LD API entities endpoint."""
 
     def __init__(self, client: Client, url: str, url_alt_post_query: str):
         self._client = client
-        self._session = client.session
         self.url = url
         self.url_alt_post_query = url_alt_post_query
 
@@ -47,7 +67,7 @@ class Entities:
     def create(self, entity: Entity, skip: bool = False, overwrite: bool = False) -> bool:
         r = self._session.post(
             f"{self.url}/",
-            data=entity.to_json(),
+            data=jsoncodec.dumpb(entity),
         )
         if r.status_code == 409:  # already exists
             if skip:
@@ -64,8 +84,12 @@ class Entities:
         entity: EntityOrId,
         ctx: str = None,
         asdict: bool = False,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        track: bool = False,
         **kwargs,
-    ) -> Entity:
+    ) -> Union[Entity, dict]:
         eid = entity.id if isinstance(entity, Entity) else Urn.prefix(entity)
         headers = {
             "Accept": "application/ld+json",
@@ -73,9 +97,11 @@ class Entities:
         }  # overrides session headers
         if ctx is not None:
             headers["Link"] = f'<{ctx}>; rel="{JSONLD_CONTEXT}"; type="application/ld+json"'
-        r = self._session.get(f"{self.url}/{eid}", headers=headers, **kwargs)
+        params = dict(kwargs.pop("params", None) or {})
+        asdict |= _add_projection(params, attrs, format)
+        r = self._session.get(f"{self.url}/{eid}", headers=headers, params=params, **kwargs)
         self._client.raise_for_status(r)
-        return r.json() if asdict else Entity.from_dict(r.json())
+        return jsoncodec.loads(r.content) if asdict else Entity.from_broker(jsoncodec.loads(r.content), track)
 
     @rfc7807_error_handle
     def delete(self, entity: EntityOrId) -> bool:
@@ -92,7 +118,7 @@ class Entities:
         eid = entity.id if isinstance(entity, Entity) else Urn.prefix(entity)
         r = self._session.get(f"{self.url}/{eid}")
         if r:
-            payload = r.json()
+            payload = jsoncodec.loads(r.content)
             return "@context" in payload
         return False
 
@@ -112,14 +138,89 @@ class Entities:
         return False
 
     @rfc7807_error_handle
+    def update_changed(self, entity: Entity) -> bool:
+        """Send only the attributes changed since the entity was loaded from the broker or last synced.
+
+        Modified attributes are sent at once with PATCH /entities/{id}/attrs, added ones with POST /entities/{id}/attrs,
+        removed ones are deleted one by one. The entity is then marked as synced.
+
+        Parameters
+        ----------
+        entity : Entity
+            The entity to update
+
+        Returns
+        -------
+        bool
+            True if some attributes have been sent, False if the entity was unchanged
+        """
+        added, modified, removed = entity.changes()
+        if not (added or modified or removed):
+            return False
+        data = entity.root._raw  # read only, not to unshare the attributes
+        for attrs, send in ((modified, self._session.patch), (added, self._session.post)):
+            if attrs:
+                fragment = {k: data[k] for k in attrs}
+                if "@context" in data:
+                    fragment["@context"] = data["@context"]
+                r = send(f"{self.url}/{entity.id}/attrs", data=jsoncodec.dumpb(fragment))
+                self._client.raise_for_status(r)
+        for attr in removed:
+            self.delete_attr(entity, attr)
+        entity.mark_synced()
+        return True
+
+    @rfc7807_error_handle
+    def delete_attr(self, entity: EntityOrId, attr: str, datasetid: str = None) -> bool:
+        eid = entity.id if isinstance(entity, Entity) else Urn.prefix(entity)
+        params = {"datasetId": datasetid} if datasetid else {}
+        r = self._session.delete(f"{self.url}/{eid}/attrs/{attr}", params=params)
+        self._client.raise_for_status(r)
+        return bool(r)
+
     def _query(
-        self, type: str = None, q: str = None, gq: str = None, ctx: str = None, limit: int = 0, offset: int = 0
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        limit: int = 0,
+        offset: int = 0,
+        **kwargs,
     ) -> Sequence[Entity]:
+        entities, _ = self._query_page(type, q, gq, ctx, limit, offset, **kwargs)
+        return entities
+
+    @rfc7807_error_handle
+    def _query_page(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        limit: int = 0,
+        offset: int = 0,
+        count: bool = False,
+        *,
+        attrs: List[str] = None,
+        format: AttrsFormat = AttrsFormat.NORMALIZED,
+        asdict: bool = False,
+        track: bool = False,
+        pick: List[str] = None,
+    ) -> Tuple[List[Union[Entity, dict]], Optional[int]]:
+        """Retrieve a page of entities.
+
+        If count is set, the total number of matching entities is requested along with the page.
+        It's returned as the second item, or None if not asked or not provided by the broker.
+        Entities are returned as dicts if asdict is set, or if the format is not the normalized representation.
+        """
         params = {}
         if limit != 0:
             params |= {"limit": limit}
         if offset != 0:
             params |= {"offset": offset}
+        if count:
+            params["count"] = "true"
         if type is None and q is None:
             raise ValueError("Must indicate at least a type or a query string")
         if type:
@@ -128,6 +229,7 @@ class Entities:
             params["q"] = q
         if gq:
             params["geoQ"] = gq
+        asdict |= _add_projection(params, attrs, format, pick)
         headers = {
             "Accept": "application/ld+json",
             "Content-Type": None,
@@ -140,9 +242,37 @@ class Entities:
             params=params,
         )
         self._client.raise_for_status(r)
-        entities = r.json()
+        entities = jsoncodec.loads(r.content)
         logger.debug(f"{entities=}")
-        return [Entity.from_dict(entity) for entity in entities]
+        total = r.headers.get("NGSILD-Results-Count") if count else None
+        if asdict:
+            return entities, None if total is None else int(total)
+        return [Entity.from_broker(entity, track) for entity in entities], None if total is None else int(total)
+
+    def _pages(
+        self,
+        type: str = None,
+        q: str = None,
+        gq: str = None,
+        ctx: str = None,
+        limit: int = PAGINATION_LIMIT_MAX,
+        **kwargs,
+    ) -> Iterator[List[Entity]]:
+        """Retrieve all the pages of entities, without any preliminary count request.
+
+        The count is asked along with the first page. If the broker doesn't provide it,
+        pages are retrieved until a short one is returned.
+        """
+        offset = 0
+        entities, count = self._query_page(type, q, gq, ctx, limit, offset, count=True, **kwargs)
+        while entities:
+            yield entities
+            offset += limit
+            if count is not None and offset >= count:
+                return
+            if count is None and len(entities) < limit:  # short page
+                return
+            entities, _ = self._query_page(type, q, gq, ctx, limit, offset, **kwargs)
 
     @rfc7807_error_handle
     def _query_alt(self, query: dict, ctx: str = None, limit: int = 0, offset: int = 0) -> Sequence[Entity]:
@@ -158,9 +288,9 @@ class Entities:
             headers["Link"] = f'<{ctx}>; rel="{JSONLD_CONTEXT}"; type="application/ld+json"'
         r = self._session.post(self.url_alt_post_query, headers=headers, params=params, json=query)
         self._client.raise_for_status(r)
-        entities = r.json()
+        entities = jsoncodec.loads(r.content)
         logger.debug(f"{entities=}")
-        return [Entity.from_dict(entity) for entity in entities]
+        return [Entity.from_broker(entity) for entity in entities]
 
     @rfc7807_error_handle
     def count(self, type: str = None, q: str = None, gq: str = None, ctx: str = None) -> int:
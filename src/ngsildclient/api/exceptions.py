@@ -19,10 +19,12 @@ import logging
 import httpx
 
 from dataclasses import dataclass
+from typing import Optional
 
 from requests.exceptions import HTTPError, ContentDecodingError, RequestException
 from requests import Response
 from ..exceptions import NgsiError
+from ..utils import jsoncodec
 
 logger = logging.getLogger(__name__)
 
@@ -121,6 +123,24 @@ ERRORTYPES = {
 }
 
 
+def http_status(e: BaseException) -> Optional[int]:
+    """Return the HTTP status code that caused the exception if any.
+
+    The exception chain is walked since the status may be carried either by a ProblemDetails,
+    a NgsiHttpError or the underlying requests/httpx response.
+    """
+    while e is not None:
+        if isinstance(e, NgsiContextBrokerError):
+            return e.problemdetails.status
+        if isinstance(e, NgsiHttpError):
+            return e.statuscode
+        r = getattr(e, "response", None)
+        if r is not None:
+            return r.status_code
+        e = e.__cause__ or e.__context__
+    return None
+
+
 def rfc7807_error_handle(func):
     """A decorator function to handle enriched Exceptions that accept a ProblemDetails instance.
 
@@ -137,9 +157,9 @@ def rfc7807_error_handle(func):
         except HTTPError as e:
             r: Response = e.response
             try:
-                problemdetails = r.json()
+                problemdetails = jsoncodec.loads(r.content)
                 logger.info(f"{problemdetails=}")
-            except ContentDecodingError:
+            except (ContentDecodingError, ValueError):
                 raise NgsiHttpError(r.status_code) from e
             try:
                 pd_type = problemdetails.pop("type").rstrip()
@@ -179,9 +199,9 @@ def rfc7807_error_handle_async(func):
         except httpx.HTTPStatusError as e:
             r: httpx.Response = e.response
             try:
-                problemdetails = r.json()
+                problemdetails = jsoncodec.loads(r.content)
                 logger.info(f"{problemdetails=}")
-            except httpx.DecodingError:
+            except (httpx.DecodingError, ValueError):
                 raise NgsiHttpError(r.status_code) from e
             try:
                 pd_type = problemdetails.pop("type").rstrip()
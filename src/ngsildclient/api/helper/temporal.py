@@ -23,11 +23,17 @@ References
     ETSI GS CIM 009 V1.4.2, pp. 41-42, 2021-04.
 """
 
-from typing import Union, Optional
+from typing import List, Union, Optional
 from datetime import datetime, timedelta
+from dateutil.tz import UTC
 
 from ngsildclient.api.constants import TimeProperty
-from ngsildclient.utils.iso8601 import from_datetime
+from ngsildclient.utils.iso8601 import from_datetime, to_datetime
+
+
+def _instant(value: str) -> datetime:
+    dt = to_datetime(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=UTC)
 
 
 class TemporalQuery(dict):
@@ -64,3 +70,41 @@ class TemporalQuery(dict):
         if timeprop is not None:
             self["timeproperty"] = timeprop.value
         return self
+
+    def split(self, n: int) -> List["TemporalQuery"]:
+        """Split a "between" temporal query into n contiguous sub-windows of equal duration.
+
+        NGSI-LD "between" windows include their start and exclude their end,
+        so that the sub-windows don't overlap and each sample falls into exactly one of them.
+        Boundaries are rounded to the second : a window too short to be split n ways is split into fewer sub-windows.
+
+        Parameters
+        ----------
+        n : int
+            The number of sub-windows
+
+        Returns
+        -------
+        List[TemporalQuery]
+            The sub-windows, in chronological order
+        """
+        if self.get("timerel") != "between":
+            raise ValueError("Only a between temporal query can be split")
+        start, end = _instant(self["timeAt"]), _instant(self["endTimeAt"])
+        step = (end - start) / max(n, 1)
+        boundaries, last = [self["timeAt"]], start
+        for i in range(1, n):
+            boundary = from_datetime(start + step * i)
+            instant = _instant(boundary)
+            if last < instant < end:  # truncated to the second : may fall before the previous boundary
+                boundaries.append(boundary)
+                last = instant
+        boundaries.append(self["endTimeAt"])
+        timeprop = self.get("timeproperty")
+        slices = []
+        for t0, t1 in zip(boundaries, boundaries[1:]):
+            tq = TemporalQuery().between(t0, t1)
+            if timeprop is not None:
+                tq["timeproperty"] = timeprop
+            slices.append(tq)
+        return slices
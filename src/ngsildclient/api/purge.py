@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""A module to delete large sets of entities.
+
+Only the ids of the entities are retrieved (projected with pick=id, in the keyValues format without building any Entity),
+then sent to the batch delete endpoint. Brokers rejecting the pick parameter (before NGSI-LD 1.8) are sent the query
+without it.
+Entities are always taken from the head of the result set, since deleting while paging by offset would shift
+the offsets and skip entities. Entities that failed to be deleted are filtered out, and skipped by offset
+as soon as they fill a whole window.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, List, Optional, Set, Union
+from dataclasses import dataclass
+
+import logging
+import time
+
+if TYPE_CHECKING:
+    from .client import Client
+    from .asyn.client import AsyncClient
+
+from .constants import BATCHSIZE, PAGINATION_LIMIT_MAX, AttrsFormat
+from .batch import BatchResult, RetryPolicy
+from .exceptions import NgsiApiError
+
+logger = logging.getLogger(__name__)
+
+PURGE_MAX_INFLIGHT = 4  # the delete requests sent concurrently by drop() and purge()
+
+
+@dataclass
+class PurgeProgress:
+    deleted: int = 0
+    failed: int = 0
+    total: Optional[int] = None  # matching entities when the purge started, if provided by the broker
+    elapsed: float = 0.0  # in seconds
+
+    @property
+    def rate(self) -> float:
+        """The number of entities deleted per second."""
+        return self.deleted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        total = "?" if self.total is None else self.total
+        return f"Entities deleted : {self.deleted}/{total} | failed : {self.failed} | {self.rate:.0f} entities/s"
+
+
+class PurgeBase:
+    """The windowing and progress logic shared by the sync and async purge engines.
+
+    Each round retrieves a window of ids, then deletes them by batches of batchsize, max_inflight requests at once.
+
+    Parameters
+    ----------
+    client : Union[Client, AsyncClient]
+        The client
+    batchsize : int, optional
+        The number of entities per delete request, by default BATCHSIZE
+    max_inflight : int, optional
+        The number of delete requests sent concurrently, by default PURGE_MAX_INFLIGHT. Set 1 to delete sequentially.
+    limit : int, optional
+        The number of ids retrieved per request, by default PAGINATION_LIMIT_MAX
+    retry : RetryPolicy, optional
+        The policy to retry the failed deletions, by default None
+    callback : Callable[[PurgeProgress], None], optional
+        The function called after each round to report the progress, by default None
+    """
+
+    def __init__(
+        self,
+        client: Union[Client, AsyncClient],
+        *,
+        batchsize: int = BATCHSIZE,
+        max_inflight: int = PURGE_MAX_INFLIGHT,
+        limit: int = PAGINATION_LIMIT_MAX,
+        retry: RetryPolicy = None,
+        callback: Callable[[PurgeProgress], None] = None,
+    ):
+        self._client = client
+        self.batchsize = batchsize
+        self.max_inflight = max_inflight
+        self.limit = limit
+        self.retry = retry
+        self.callback = callback
+        self._pick = True  # until the broker rejects the pick parameter
+
+    @property
+    def window(self) -> int:
+        """The number of ids deleted per round."""
+        return self.batchsize * max(self.max_inflight, 1)
+
+    def _projection(self) -> dict:
+        return dict(format=AttrsFormat.KEYVALUES, pick=["id"] if self._pick else None)
+
+    def _unpick(self, e: NgsiApiError):
+        """Query without the pick parameter from now on. Reraise the error if it was not the culprit."""
+        if not self._pick:
+            raise e
+        logger.info(f"pick not supported by the broker, retrieving whole entities : {e}")
+        self._pick = False
+
+    def _begin(self):
+        self._result = BatchResult("delete")
+        self._progress = PurgeProgress()
+        self._failed: Set[str] = set()
+        self._start = time.perf_counter()
+        self._offset = 0  # all the entities before offset have failed to be deleted
+
+    def _todo(self, ids: List[str]) -> List[str]:
+        """Return the ids still to be deleted. Skip the window if they have all failed."""
+        todo = [eid for eid in ids if eid not in self._failed]
+        if not todo:
+            self._offset += len(ids)
+        return todo
+
+    def _done(self, todo: List[str], r: BatchResult):
+        """Account for the deletion of a window, and report the progress."""
+        self._result += r
+        if r.n_ok == 0:  # not to loop on entities failing without being reported
+            self._failed.update(todo)
+        else:
+            self._failed.update(eid for eid in (e.get("entityId") for e in r.errors) if eid is not None)
+        progress = self._progress
+        progress.deleted, progress.failed = self._result.n_ok, len(self._failed)
+        progress.elapsed = time.perf_counter() - self._start
+        logger.info(progress)
+        if self.callback:
+            self.callback(progress)
+
+
+class Purge(PurgeBase):
+    """Delete all the entities matching a type and/or query string.
+
+    See PurgeBase for the parameters.
+    """
+
+    def _ids(self, type: str, q: str, gq: str, ctx: str, count: bool = False) -> tuple[List[str], Optional[int]]:
+        ids, total = [], None
+        while len(ids) < self.window:
+            limit = min(self.limit, self.window - len(ids))
+            try:
+                entities, c = self._client.entities._query_page(
+                    type, q, gq, ctx, limit, self._offset + len(ids), count, **self._projection()
+                )
+            except NgsiApiError as e:
+                self._unpick(e)
+                continue
+            if count:
+                total, count = c, False
+            ids.extend(e["id"] for e in entities)
+            if len(entities) < limit:
+                break
+        return ids, total
+
+    def run(self, type: str = None, q: str = None, gq: str = None, ctx: str = None) -> BatchResult:
+        self._begin()
+        ids, self._progress.total = self._ids(type, q, gq, ctx, count=True)
+        while ids:
+            todo = self._todo(ids)
+            if todo:
+                batch = self._client.batch
+                r = batch._dispatch("delete", batch._delete, todo, self.batchsize, self.max_inflight, self.retry)
+                self._done(todo, r)
+            ids, _ = self._ids(type, q, gq, ctx)
+        return self._result
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+    from .client import Client
+
+
+class ClientSession:
+    """Mixin for the API endpoints : requests are sent through the HTTP session of the calling thread."""
+
+    _client: Client
+
+    @property
+    def _session(self) -> requests.Session:
+        return self._client.session
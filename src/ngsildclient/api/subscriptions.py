@@ -17,20 +17,21 @@ from hashlib import sha1
 import re
 import json
 
+from ..utils import jsoncodec
 from ..model.constants import CORE_CONTEXT
 from .exceptions import NgsiApiError
 
 if TYPE_CHECKING:
     from .client import Client
 from .exceptions import NgsiResourceNotFoundError, rfc7807_error_handle
+from .session import ClientSession
 
 
-class Subscriptions:
+class Subscriptions(ClientSession):
     """A wrapper for the NGSI-LD API subscriptions endpoint."""
 
     def __init__(self, client: Client, url: str):
         self._client = client
-        self._session = client.session
         self.url = url
 
     @rfc7807_error_handle
@@ -62,7 +63,7 @@ class Subscriptions:
         if ctx is not None:
             headers["Link"] = f'<{ctx}>; rel="{CORE_CONTEXT}"; type="application/ld+json"'
         r = self._session.get(f"{self.url}")
-        subscriptions = r.json()
+        subscriptions = jsoncodec.loads(r.content)
         if pattern is not None:
             subscriptions = [
                 x
@@ -95,7 +96,7 @@ class Subscriptions:
         if ctx is not None:
             headers["Link"] = f'<{ctx}>; rel="{CORE_CONTEXT}"; type="application/ld+json"'
         r = self._session.get(f"{self.url}")
-        return [x for x in r.json() if Subscriptions._hash(x) == hashref]
+        return [x for x in jsoncodec.loads(r.content) if Subscriptions._hash(x) == hashref]
 
     @rfc7807_error_handle
     def get(self, id: str, ctx: str = CORE_CONTEXT) -> dict:
@@ -107,7 +108,7 @@ class Subscriptions:
             headers["Link"] = f'<{ctx}>; rel="{CORE_CONTEXT}"; type="application/ld+json"'
         r = self._session.get(f"{self.url}/{id}", headers=headers)
         self._client.raise_for_status(r)
-        return r.json()
+        return jsoncodec.loads(r.content)
 
     @rfc7807_error_handle
     def exists(self, id: str, ctx: str = CORE_CONTEXT) -> bool:
@@ -10,12 +10,11 @@
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Union, List, Optional, Generator, Callable
+from typing import TYPE_CHECKING, Dict, Iterable, Literal, Mapping, Union, List, Optional, Generator, Callable
 from dataclasses import dataclass
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from isodate import duration_isoformat
-from functools import reduce
-from operator import iconcat
 
 
 import logging
@@ -23,50 +22,182 @@ import logging
 if TYPE_CHECKING:
     from .client import Client
 
+from ..utils import jsoncodec
 from .constants import JSONLD_CONTEXT, AggrMethod
 from ..utils.urn import Urn
 from .helper.temporal import TemporalQuery
 from ..model.entity import Entity
+from ..model.constants import IDENTITY_KEYS, UTC
 from ngsildclient.utils import iso8601, is_pandas_installed, _addopt
 from .temporal_alt import TemporalAlt
+from .temporal_aggr import aggregate_troes
+from .temporal_cache import TemporalCache, Interval, isoformat, merge_intervals, timestamp
+from .session import ClientSession
 
 logger = logging.getLogger(__name__)
 
 
-def _troes_to_dfdict(troes: dict):
-    # the result dictionary is independant of the number of attributes !
-    d = {}
+def _instants(timestamps: Iterable[str]) -> Dict[str, datetime]:
+    """Map each distinct ISO8601 timestamp to the instant it denotes, naive ones taken as UTC.
+
+    The same instant may be written in many ways : Z or +00:00, with or without fractional seconds.
+    """
+    instants = {}
+    for t in set(timestamps):
+        dt = iso8601.to_datetime(t)
+        instants[t] = dt if dt.tzinfo is not None else dt.replace(tzinfo=UTC)
+    return instants
+
+
+def _troes_to_columns(troes: Union[dict, List[dict]], layout: Literal["wide", "long"] = "wide") -> Dict[str, list]:
+    """Decode simplified TRoEs column by column. Timestamps are left as ISO8601 strings.
+
+    The first column holds the entity ids (without their prefix and type) and is named after the entity type.
+
+    Parameters
+    ----------
+    troes : Union[dict, List[dict]]
+        The simplified temporal representation of the entities
+    layout : Literal["wide", "long"], optional
+        "wide" (default) : one row per entity and timestamp, one column per attribute.
+        When the attributes of an entity are not observed at the same times, timestamps are outer-joined
+        on the instant they denote (whatever their precision or UTC offset), sorted in time order,
+        and missing samples are None.
+        "long" : one row per sample, with the attribute name in an "attribute" column and its value in a "value" column.
+
+    Returns
+    -------
+    Dict[str, list]
+        The columns
+    """
     if not isinstance(troes, List):
         troes = [troes]
-    troe: dict = troes[0]
-    nentities = len(troes)
-    attrs = [str(k) for k in troe.keys() if k not in ("id", "type", "@context")]
-    attr0 = attrs[0]
-    datetimes = [x[1] for x in troe[attr0]["values"]]
-    nmeasures: int = len(datetimes)
-    for attr in attrs[1:]:
-        if [x[1] for x in troe[attr]["values"]] != datetimes:
-            raise ValueError("Cannot pack result : attributes have distinct observedAt values.")
-    etype = troe["type"]
-    d[etype] = reduce(iconcat, [[troe["id"].rsplit(":")[-1]] * nmeasures for troe in troes], [])
-    d["observed"] = [iso8601.parse(x)[2] for x in datetimes] * nentities
-    for attr in attrs:
-        d[attr] = []
-        for troe in troes:
-            for value in troe[attr]["values"]:
-                d[attr].append(value[0])
+    if not troes:
+        return {}
+    ids: list = []
+    observed: list = []
+    attributes: list = []
+    values: list = []
+    columns: Dict[str, list] = {}
+    for troe in troes:
+        eid = troe["id"].rsplit(":")[-1]
+        series = {}  # attribute => (values, timestamps)
+        for attr, temporal in troe.items():
+            if attr in IDENTITY_KEYS or not isinstance(temporal, Mapping):
+                continue
+            samples = temporal.get("values", ())
+            series[attr] = tuple(zip(*samples)) if samples else ((), ())
+        if layout == "long":
+            for attr, (vals, timestamps) in series.items():
+                ids.extend([eid] * len(vals))
+                attributes.extend([attr] * len(vals))
+                observed.extend(timestamps)
+                values.extend(vals)
+            continue
+        start = len(ids)
+        timelines = [timestamps for _, timestamps in series.values()]
+        if all(timestamps == timelines[0] for timestamps in timelines[1:]):  # aligned attributes
+            timeline = timelines[0] if timelines else ()
+            for attr, (vals, _) in series.items():
+                columns.setdefault(attr, [None] * start).extend(vals)
+        else:
+            instants = _instants(set().union(*timelines))
+            first = {}  # instant => the first timestamp seen for it
+            for timestamps in timelines:
+                for t in timestamps:
+                    first.setdefault(instants[t], t)
+            ordered = sorted(first)
+            timeline = [first[dt] for dt in ordered]
+            index = {dt: i for i, dt in enumerate(ordered)}
+            for attr, (vals, timestamps) in series.items():
+                col = [None] * len(timeline)
+                for v, t in zip(vals, timestamps):
+                    col[index[instants[t]]] = v
+                columns.setdefault(attr, [None] * start).extend(col)
+        ids.extend([eid] * len(timeline))
+        observed.extend(timeline)
+        for col in columns.values():  # attributes missing for this entity
+            if len(col) < len(ids):
+                col.extend([None] * (len(ids) - len(col)))
+    etype = troes[0]["type"]
+    if layout == "long":
+        return {etype: ids, "observed": observed, "attribute": attributes, "value": values}
+    return {etype: ids, "observed": observed, **columns}
+
+
+def _troes_to_dfdict(troes: dict):
+    d = _troes_to_columns(troes)
+    if not d:
+        return d
+    datetimes = {}  # each distinct timestamp is parsed once
+    for t in d["observed"]:
+        if t not in datetimes:
+            datetimes[t] = iso8601.parse(t)[2]
+    d["observed"] = [datetimes[t] for t in d["observed"]]
     return d
 
 
-def troes_to_dataframe(troes: dict):
-    d = _troes_to_dfdict(troes)
+def troes_to_dataframe(troes: dict, layout: Literal["wide", "long"] = "wide"):
+    """Convert simplified TRoEs to a pandas dataframe.
+
+    Timestamps are parsed in bulk to datetime64 (UTC), entity ids and attribute names are categorical.
+    See _troes_to_columns() for the layouts.
+    """
     try:
         import pandas
     except ImportError:
         raise ValueError("Cannot export to dataframe : pandas not installed.")
+    d = _troes_to_columns(troes, layout)
+    if not d:
+        return pandas.DataFrame()
+    etype = next(iter(d))
+    d[etype] = pandas.Categorical(d[etype])
+    # parsed here, pandas >= 2 infers a single format from the first timestamp and fails on the others
+    instants = _instants(d["observed"])
+    d["observed"] = pandas.to_datetime([instants[t] for t in d["observed"]], utc=True)
+    if layout == "long":
+        d["attribute"] = pandas.Categorical(d["attribute"])
     return pandas.DataFrame(d)
 
 
+def merge_troes(*parts: List[dict]) -> List[dict]:
+    """Merge the TRoEs retrieved for successive time windows into one TRoE per entity.
+
+    Samples are concatenated in the order of the parts, that is in time order when the parts are chronological.
+    Both simplified and normalized temporal representations are supported.
+    Entities are returned in the order of their first appearance.
+
+    Parameters
+    ----------
+    parts : List[dict]
+        The TRoEs of each time window, in chronological order
+
+    Returns
+    -------
+    List[dict]
+        The merged TRoEs
+    """
+    merged: Dict[str, dict] = {}
+    for troes in parts:
+        for troe in troes:
+            acc = merged.get(troe["id"])
+            if acc is None:
+                merged[troe["id"]] = {k: (v.copy() if isinstance(v, (dict, list)) else v) for k, v in troe.items()}
+                continue
+            for attr, temporal in troe.items():
+                if attr in IDENTITY_KEYS:
+                    continue
+                prev = acc.get(attr)
+                if prev is None:
+                    acc[attr] = temporal.copy()
+                elif isinstance(temporal, Mapping) and "values" in temporal:  # simplified
+                    prev["values"] = prev.get("values", []) + temporal["values"]
+                else:  # normalized : a list of attribute instances
+                    prev = prev if isinstance(prev, list) else [prev]
+                    acc[attr] = prev + (temporal if isinstance(temporal, list) else [temporal])
+    return list(merged.values())
+
+
 @dataclass
 class Pagination:
     count: int = 0
@@ -89,12 +220,11 @@ class TemporalResult:
     pagination: Optional[Pagination] = None
 
 
-class Temporal:
+class Temporal(ClientSession):
     """A wrapper for the NGSI-LD API temporal endpoint."""
 
     def __init__(self, client: Client, url: str, url_alt_temporal_query: str):
         self._client = client
-        self._session = client.session
         self.url = url
         self.url_alt_temporal_query = url_alt_temporal_query
         self._alt = TemporalAlt(self._client, url_alt_temporal_query)
@@ -113,6 +243,7 @@ class Temporal:
         pagesize: int = 0,  # default broker pageSize
         pageanchor: str = None,
         count: bool = True,
+        tq: TemporalQuery = None,
     ) -> TemporalResult:
         eid = eid.id if isinstance(eid, Entity) else Urn.prefix(eid)
         params = {}
@@ -133,11 +264,13 @@ class Temporal:
             params["pageSize"] = pagesize
         if pageanchor is not None:
             params["pageAnchor"] = pageanchor
+        if tq is not None:
+            params |= tq
         if not verbose:
             _addopt(params, "temporalValues")
         r = self._session.get(f"{self.url}/{eid}", headers=headers, params=params)
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
 
     #  equivalent to get_all()
     def get(
@@ -148,6 +281,8 @@ class Temporal:
         verbose: bool = False,
         pagesize: int = 0,
         as_dataframe: bool = False,
+        tq: TemporalQuery = None,
+        cache: TemporalCache = None,
     ) -> List[dict]:
         """Retrieve the Temporal Representation of (an) Entity (TRoE) given its id.
 
@@ -166,6 +301,11 @@ class Temporal:
         as_dataframe : bool
             Default is false, meaning it returns JSON TRoE.
             If set returns a pandas dataframe. Requires pandas.
+        tq: TemporalQuery
+            The temporal query as a py:class:: TemporalQuery instance, by default the whole history
+        cache : TemporalCache
+            If set, time ranges already retrieved are read from the cache, only the gaps are retrieved from the broker.
+            Requires the attrs, and an after or between temporal query. The result is a simplified TRoE.
 
         Returns
         -------
@@ -178,13 +318,85 @@ class Temporal:
                 verbose = False  # force simplified representation
             else:
                 raise ValueError("Cannot export to dataframe : pandas not installed.")
-        r: TemporalResult = self._get(eid, attrs, ctx, verbose, pagesize=pagesize)
+        if cache is not None:
+            if verbose:
+                raise ValueError("verbose cannot be combined with cache : cached values are simplified TRoEs")
+            troes = [self._get_cached(eid, attrs, ctx, tq, pagesize, cache)]
+            return troes_to_dataframe(troes) if as_dataframe else troes
+        r: TemporalResult = self._get(eid, attrs, ctx, verbose, pagesize=pagesize, tq=tq)
         troes: List[dict] = r.result
         while r.pagination.next_url is not None:
-            r: TemporalResult = self._get(eid, attrs, ctx, verbose, pagesize=pagesize, pageanchor=r.pagination.next_url)
+            r: TemporalResult = self._get(
+                eid, attrs, ctx, verbose, pagesize=pagesize, pageanchor=r.pagination.next_url, tq=tq
+            )
             troes.extend(r.result)
         return troes_to_dataframe(troes) if as_dataframe else troes
 
+    def _get_all(self, eid: str, attrs: List[str], ctx: str, tq: TemporalQuery, pagesize: int) -> dict:
+        # the simplified TRoE of an entity, its samples possibly spread over many pages
+        pages = []
+        pageanchor = None
+        while True:
+            r: TemporalResult = self._get(eid, attrs, ctx, pagesize=pagesize, pageanchor=pageanchor, tq=tq)
+            pages.append(r.result if isinstance(r.result, list) else [r.result])
+            pageanchor = r.pagination.next_url
+            if pageanchor is None:
+                break
+        troes = merge_troes(*pages)
+        return troes[0] if troes else {}
+
+    def _get_cached(
+        self,
+        eid: Union[str, Entity],
+        attrs: List[str],
+        ctx: str,
+        tq: TemporalQuery,
+        pagesize: int,
+        cache: TemporalCache,
+    ) -> dict:
+        eid = eid.id if isinstance(eid, Entity) else Urn.prefix(eid)
+        if not attrs:
+            raise ValueError("Caching temporal values requires the attrs")
+        if tq is None or tq.get("timerel") not in ("after", "between"):
+            raise ValueError("Caching temporal values requires an after or between temporal query")
+        start = timestamp(tq["timeAt"])
+        end = timestamp(tq["endTimeAt"]) if tq["timerel"] == "between" else datetime.now(timezone.utc).timestamp()
+        horizon = min(end, cache.horizon())
+        gaps: Dict[str, List[Interval]] = {attr: cache.gaps(eid, attr, start, end) for attr in attrs}
+        fresh: Dict[str, list] = {attr: [] for attr in attrs}  # samples too recent to be cached
+        metas: Dict[str, dict] = {attr: cache.meta(eid, attr) for attr in attrs}
+        etype = next((m["entityType"] for m in metas.values() if m is not None), None)
+        for g0, g1 in merge_intervals([gap for attrgaps in gaps.values() for gap in attrgaps]):
+            window = TemporalQuery().between(isoformat(g0), isoformat(g1))
+            if "timeproperty" in tq:
+                window["timeproperty"] = tq["timeproperty"]
+            missing = [attr for attr in attrs if any(g0 <= a0 and a1 <= g1 for a0, a1 in gaps[attr])]
+            troe = self._get_all(eid, missing, ctx, window, pagesize)
+            etype = troe.get("type", etype)
+            for attr in missing:
+                temporal = troe.get(attr)
+                samples = []
+                if isinstance(temporal, Mapping):
+                    key = "objects" if "objects" in temporal else "values"
+                    metas[attr] = {"entityType": etype, "type": temporal.get("type"), "key": key}
+                    samples = temporal.get(key, [])
+                timestamps = [timestamp(s[1]) for s in samples]
+                fresh[attr].extend(s for s, ts in zip(samples, timestamps) if ts >= horizon)
+                for a0, a1 in gaps[attr]:
+                    if g0 <= a0 and a1 <= g1 and a0 < horizon:
+                        a1 = min(a1, horizon)
+                        kept = [s for s, ts in zip(samples, timestamps) if a0 <= ts < a1]
+                        cache.store(eid, attr, a0, a1, kept, metas[attr])
+        troe = {"id": eid, "type": etype}
+        for attr in attrs:
+            meta = metas[attr]
+            if meta is None:  # no sample ever retrieved
+                continue
+            samples = cache.read(eid, attr, start, horizon) + fresh[attr]
+            if samples:
+                troe[attr] = {"type": meta["type"], meta["key"]: samples}
+        return troe
+
     def _query(
         self,
         eid: Union[str, Entity] = None,
@@ -236,7 +448,7 @@ class Temporal:
             params=params,
         )
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
 
     def query_head(
         self,
@@ -274,6 +486,9 @@ class Temporal:
         lastn: int = 0,
         pagesize: int = 0,
         as_dataframe: bool = False,
+        slices: int = 1,
+        max_inflight: int = 4,
+        cache: TemporalCache = None,
     ) -> List[dict]:
         """Retrieve Temporal Representation of Entities (TRoE) given id, or type and/or query string.
 
@@ -307,8 +522,16 @@ class Temporal:
         as_dataframe : bool
             Default is false, meaning it returns JSON TRoE.
             If set returns a pandas dataframe. Requires pandas.
-        limit: int
-            The number of entities retrieved in each request
+        slices: int
+            By default 1, the pages are retrieved one after another.
+            If greater, the between temporal query is split into as many sub-windows, queried concurrently.
+            The series of each entity are merged back in time order.
+        max_inflight: int
+            The number of sub-windows queried concurrently, by default 4
+        cache : TemporalCache
+            If set, time ranges already retrieved are read from the cache, only the gaps are retrieved from the broker.
+            Requires the eid, the attrs, and an after or between temporal query. The result is a simplified TRoE.
+            Cannot be combined with type, q, gq, lastn, slices nor verbose.
 
         Returns
         -------
@@ -319,30 +542,51 @@ class Temporal:
         -------
         >>> with Client() as client:
         >>>     troe = client.temporal.query(type="RoomObserved")
+
+        >>> with Client() as client:
+        >>>     tq = TemporalQuery().between("2022-01-01T00:00:00Z", "2023-01-01T00:00:00Z")
+        >>>     troe = client.temporal.query(type="RoomObserved", tq=tq, slices=12)
         """
         if as_dataframe:
             if is_pandas_installed():
                 verbose = False  # force simplified representation
             else:
                 raise ValueError("Cannot export to dataframe : pandas not installed.")
-        r: TemporalResult = self._query(eid, type, attrs, q, gq, ctx, verbose, tq, lastn=lastn, pagesize=pagesize)
+        if cache is not None:
+            if not eid:
+                raise ValueError("Caching temporal values requires the eid")
+            unsupported = dict(type=type, q=q, gq=gq, lastn=lastn, slices=slices > 1)
+            if any(unsupported.values()):
+                options = ", ".join(k for k, v in unsupported.items() if v)
+                raise ValueError(f"{options} cannot be combined with cache")
+            return self.get(eid, attrs, ctx, verbose, pagesize=pagesize, as_dataframe=as_dataframe, tq=tq, cache=cache)
+        if slices > 1:
+            if lastn > 0:
+                raise ValueError("lastn cannot be combined with slices")
+            if tq is None or tq.get("timerel") != "between":
+                raise ValueError("slices requires a between temporal query")
+            windows = tq.split(slices)
+            workers = max(1, min(max_inflight, len(windows)))
+            self._client._ensure_poolsize(workers)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="temporal") as executor:
+                # map() yields the windows in chronological order, whatever the order they complete
+                parts = executor.map(
+                    lambda window: self._query_all(eid, type, attrs, q, gq, ctx, verbose, window, pagesize=pagesize),
+                    windows,
+                )
+                troes = merge_troes(*parts)
+        else:
+            troes = self._query_all(eid, type, attrs, q, gq, ctx, verbose, tq, lastn=lastn, pagesize=pagesize)
+        return troes_to_dataframe(troes) if as_dataframe else troes
+
+    def _query_all(self, *args, lastn: int = 0, pagesize: int = 0) -> List[dict]:
+        # follow the Next-Page anchors, one page after another
+        r: TemporalResult = self._query(*args, lastn=lastn, pagesize=pagesize)
         troes: List[dict] = r.result
         while r.pagination.next_url is not None:
-            r: TemporalResult = self._query(
-                eid,
-                type,
-                attrs,
-                q,
-                gq,
-                ctx,
-                verbose,
-                tq,
-                lastn=lastn,
-                pagesize=pagesize,
-                pageanchor=r.pagination.next_url,
-            )
+            r = self._query(*args, lastn=lastn, pagesize=pagesize, pageanchor=r.pagination.next_url)
             troes.extend(r.result)
-        return troes_to_dataframe(troes) if as_dataframe else troes
+        return troes
 
     def query_generator(
         self,
@@ -399,7 +643,14 @@ class Temporal:
         count: bool = False,
         methods: List[AggrMethod] = [AggrMethod.AVERAGE],
         period: timedelta = timedelta(days=1),
+        local: bool = False,  # aggregate client-side, for brokers lacking support for aggregatedValues
     ) -> TemporalResult:
+        if local:
+            if lastn > 0:
+                raise ValueError("lastn cannot be combined with local aggregation")
+            origin = tq["timeAt"] if tq is not None and tq.get("timerel") in ("after", "between") else None
+            troes = self.query_generator(type=type, attrs=attrs, q=q, gq=gq, ctx=ctx, tq=tq, pagesize=pagesize)
+            return TemporalResult(aggregate_troes(troes, methods, period, origin))
         params = {}
         if type:
             params["type"] = type
@@ -435,4 +686,4 @@ class Temporal:
             params=params,
         )
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Client-side temporal aggregation, for brokers lacking support for aggregatedValues.
+
+Samples are consumed in a single streaming pass : only one accumulator per entity, attribute and period is kept,
+so memory is bounded by the size of the result, not by the number of samples.
+The result has the shape of the NGSI-LD aggregated temporal representation :
+each method holds a list of [value, startAt, endAt] triples.
+"""
+
+from __future__ import annotations
+
+import math
+
+from datetime import datetime, timedelta
+from numbers import Number
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+from ngsildclient.utils import iso8601
+from ngsildclient.model.constants import IDENTITY_KEYS
+from .constants import AggrMethod
+from .temporal_cache import isoformat, timestamp
+
+
+NUMERIC_METHODS = (AggrMethod.SUM, AggrMethod.AVERAGE, AggrMethod.STANDARD_DEVIATION, AggrMethod.SUM_SQUARES)
+
+
+def _hashable(v: Any) -> Any:
+    return v if isinstance(v, (str, Number, type(None))) else repr(v)
+
+
+class Accumulator:
+    """The running aggregates of the samples of one period.
+
+    The standard deviation is the population one, computed with the Welford algorithm.
+    Sum, average, standard deviation and sum of squares only take numbers into account.
+    """
+
+    __slots__ = ("count", "distinct", "n", "total", "sumsq", "mean", "m2", "min", "max")
+
+    def __init__(self, distinct: bool = False):
+        self.count = 0
+        self.distinct: Optional[set] = set() if distinct else None
+        self.n = 0  # the numeric samples
+        self.total = 0
+        self.sumsq = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, v: Any):
+        self.count += 1
+        if self.distinct is not None:
+            self.distinct.add(_hashable(v))
+        if isinstance(v, Number) and not isinstance(v, bool):
+            self.n += 1
+            self.total += v
+            self.sumsq += v * v
+            delta = v - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (v - self.mean)
+        try:
+            if self.min is None or v < self.min:
+                self.min = v
+            if self.max is None or v > self.max:
+                self.max = v
+        except TypeError:  # not comparable
+            pass
+
+    def value(self, method: AggrMethod) -> Any:
+        """Return the aggregated value, None if it can't be computed."""
+        if method == AggrMethod.TOTAL_COUNT:
+            return self.count
+        if method == AggrMethod.DISTINCT_COUNT:
+            return len(self.distinct)
+        if method == AggrMethod.MINIMUM:
+            return self.min
+        if method == AggrMethod.MAXIMUM:
+            return self.max
+        if method not in NUMERIC_METHODS:
+            raise ValueError(f"Unsupported aggregation method : {method}")
+        if self.n == 0:
+            return None
+        if method == AggrMethod.SUM:
+            return self.total
+        if method == AggrMethod.AVERAGE:
+            return self.total / self.n
+        if method == AggrMethod.STANDARD_DEVIATION:
+            return math.sqrt(self.m2 / self.n)
+        if method == AggrMethod.SUM_SQUARES:
+            return self.sumsq
+
+
+class TemporalAggregator:
+    """Aggregate simplified TRoEs over periods of time, one TRoE at a time.
+
+    Parameters
+    ----------
+    methods : Sequence[AggrMethod], optional
+        The aggregation methods, by default the average
+    period : timedelta, optional
+        The duration of the periods, by default 1 day
+    origin : Union[datetime, str], optional
+        The start of the first period, i.e. the start of the temporal query.
+        By default periods are aligned on the Unix epoch, that is on midnight UTC for daily periods.
+    """
+
+    def __init__(
+        self,
+        methods: Sequence[AggrMethod] = (AggrMethod.AVERAGE,),
+        period: timedelta = timedelta(days=1),
+        origin: Union[datetime, str] = None,
+    ):
+        if isinstance(origin, datetime):
+            origin = iso8601.from_datetime(origin)  # naive taken as UTC
+        self.methods = methods
+        self.period: float = period.total_seconds()
+        self.origin: float = timestamp(origin) if origin is not None else 0.0
+        self._distinct = AggrMethod.DISTINCT_COUNT in methods
+        self._entities: Dict[str, dict] = {}  # id => type and attributes (attribute type, period index => accumulator)
+
+    def add(self, troe: dict):
+        """Aggregate the samples of a TRoE, that can be discarded afterwards."""
+        entity = self._entities.setdefault(troe["id"], {"type": troe.get("type"), "attrs": {}})
+        t0, p = self.origin, self.period
+        for attr, temporal in troe.items():
+            if attr in IDENTITY_KEYS or not isinstance(temporal, Mapping):
+                continue
+            samples = temporal.get("values", temporal.get("objects", ()))
+            _, periods = entity["attrs"].setdefault(attr, (temporal.get("type", "Property"), {}))
+            for sample in samples:
+                k = math.floor((timestamp(sample[1]) - t0) / p)
+                acc = periods.get(k)
+                if acc is None:
+                    acc = periods[k] = Accumulator(self._distinct)
+                acc.add(sample[0])
+
+    def result(self) -> List[dict]:
+        """Return the aggregated temporal representation of the entities, periods sorted in time order."""
+        t0, p = self.origin, self.period
+        res = []
+        for eid, entity in self._entities.items():
+            troe = {"id": eid, "type": entity["type"]}
+            for attr, (attrtype, periods) in entity["attrs"].items():
+                aggr = {"type": attrtype}
+                bounds = {k: (isoformat(t0 + k * p), isoformat(t0 + (k + 1) * p)) for k in periods}
+                for method in self.methods:
+                    triples = []
+                    for k in sorted(periods):
+                        value = periods[k].value(method)
+                        if value is not None:
+                            triples.append([value, *bounds[k]])
+                    aggr[method.value] = triples
+                troe[attr] = aggr
+            res.append(troe)
+        return res
+
+
+def aggregate_troes(
+    troes: Iterable[dict],
+    methods: Sequence[AggrMethod] = (AggrMethod.AVERAGE,),
+    period: timedelta = timedelta(days=1),
+    origin: Union[datetime, str] = None,
+) -> List[dict]:
+    """Aggregate simplified TRoEs over periods of time.
+
+    Parameters
+    ----------
+    troes : Iterable[dict]
+        The simplified TRoEs, i.e. the output of Temporal.query_generator(). Consumed once.
+    methods : Sequence[AggrMethod], optional
+        The aggregation methods, by default the average
+    period : timedelta, optional
+        The duration of the periods, by default 1 day
+    origin : Union[datetime, str], optional
+        The start of the first period, by default aligned on the Unix epoch
+
+    Returns
+    -------
+    List[dict]
+        The aggregated temporal representation of the entities, periods sorted in time order
+
+    Example
+    -------
+    >>> with Client() as client:
+    >>>     troes = client.temporal.query_generator(type="RoomObserved", tq=tq)
+    >>>     aggr = aggregate_troes(troes, [AggrMethod.MINIMUM, AggrMethod.MAXIMUM], timedelta(hours=1))
+    """
+    aggregator = TemporalAggregator(methods, period, origin)
+    for troe in troes:
+        aggregator.add(troe)
+    return aggregator.result()
@@ -14,26 +14,26 @@ from typing import TYPE_CHECKING, Union, List, Generator, Callable
 from pathlib import Path
 
 import logging
-import json
 
 if TYPE_CHECKING:
     from .client import Client
     from .temporal import TemporalResult, Pagination, troes_to_dataframe
 
+from ..utils import jsoncodec
 from .constants import JSONLD_CONTEXT
 from ..model.entity import Entity
 from ngsildclient.utils import is_pandas_installed
 from ngsildclient.model.exceptions import NgsiJsonError
+from .session import ClientSession
 
 logger = logging.getLogger(__name__)
 
 
-class TemporalAlt:
+class TemporalAlt(ClientSession):
     """A wrapper for the NGSI-LD API temporal alternative endpoint."""
 
     def __init__(self, client: Client, url_alt_temporal_query: str):
         self._client = client
-        self._session = client.session
         self.url_alt_temporal_query = url_alt_temporal_query
 
     def _query(
@@ -61,7 +61,7 @@ class TemporalAlt:
             headers["Link"] = f'<{ctx}>; rel="{JSONLD_CONTEXT}"; type="application/ld+json"'
         r = self._session.post(self.url_alt_temporal_query, headers=headers, params=params, json=query)
         self._client.raise_for_status(r)
-        return TemporalResult(r.json(), Pagination.from_headers(r.headers))
+        return TemporalResult(jsoncodec.loads(r.content), Pagination.from_headers(r.headers))
 
     def query_head(
         self,
@@ -72,8 +72,7 @@ class TemporalAlt:
         as_dataframe: bool = False,
     ) -> List[dict]:
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         if as_dataframe:
             if is_pandas_installed():
                 verbose = False  # force simplified representation
@@ -92,8 +91,7 @@ class TemporalAlt:
         as_dataframe: bool = False,
     ) -> List[dict]:
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         if as_dataframe:
             if is_pandas_installed():
                 verbose = False  # force simplified representation
@@ -116,8 +114,7 @@ class TemporalAlt:
         pagesize: int = 0,
     ) -> Generator[List[dict], None, None]:
         if isinstance(query, Path):
-            with open(query) as f:
-                query = json.load(f)
+            query = jsoncodec.loads(query.read_bytes())
         r: TemporalResult = self._query(query, ctx, pagesize=pagesize)
         troes = r.result
         yield from troes
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""An on-disk cache of temporal values, keyed by (entity id, attribute).
+
+The samples of each attribute are stored in time-sorted chunks, one file per time window retrieved from the broker.
+An index, holding the window of each chunk, tells the time ranges already covered :
+only the gaps have to be retrieved from the broker.
+Windows are half-open like NGSI-LD "between" windows : the start is included, the end excluded.
+Recent samples may still be arriving : only the time ranges older than a settling delay are cached.
+
+A window adjacent to a small chunk is merged into it, so that polling doesn't pile up tiny chunks.
+Several processes can share a cache : index updates are serialized by a file lock (POSIX only,
+on other platforms the cache must have a single writer).
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import logging
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
+from uuid import uuid4
+
+from ngsildclient.utils import iso8601, jsoncodec
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[float, float]  # POSIX timestamps
+
+CHUNK_MAX_SAMPLES = 10_000  # a window is merged into an adjacent chunk until it reaches this size
+
+
+def timestamp(value: str) -> float:
+    return iso8601.to_datetime(value).timestamp()
+
+
+def isoformat(ts: float) -> str:
+    return iso8601.from_datetime(datetime.fromtimestamp(ts, timezone.utc))
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """Sort and coalesce overlapping or adjacent intervals."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(start: float, end: float, covered: List[Interval]) -> List[Interval]:
+    """Return the parts of the window not covered by the given sorted, disjoint intervals."""
+    gaps = []
+    for c0, c1 in covered:
+        if c1 <= start:
+            continue
+        if c0 >= end:
+            break
+        if c0 > start:
+            gaps.append((start, c0))
+        start = max(start, c1)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+@contextmanager
+def _locked(path: Path):
+    with open(path / ".lock", "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+class TemporalCache:
+    """An on-disk cache of temporal values.
+
+    Parameters
+    ----------
+    directory : Union[str, Path]
+        The cache directory, created if needed
+    settle : timedelta, optional
+        Samples more recent than this delay are not cached, since late samples may still be arriving.
+        By default 10 minutes.
+
+    Example
+    -------
+    >>> cache = TemporalCache("~/.cache/ngsild")
+    >>> with Client() as client:
+    >>>     tq = TemporalQuery().between("2022-01-01T00:00:00Z", "2023-01-01T00:00:00Z")
+    >>>     troe = client.temporal.get("RoomObserved:Room1", attrs=["temperature"], tq=tq, cache=cache)
+    """
+
+    def __init__(self, directory: Union[str, Path], settle: timedelta = timedelta(minutes=10)):
+        self.directory = Path(directory).expanduser()
+        self.settle = settle
+        self._indexes: Dict[Tuple[str, str], Tuple[Optional[int], dict]] = {}  # (eid, attr) => (mtime, index)
+
+    def horizon(self) -> float:
+        """Return the date (as a POSIX timestamp) before which time ranges can be cached."""
+        return (datetime.now(timezone.utc) - self.settle).timestamp()
+
+    def _path(self, eid: str, attr: str) -> Path:
+        return self.directory / quote(eid, safe="") / quote(attr, safe="")
+
+    def _index(self, eid: str, attr: str) -> dict:
+        # reloaded when written by another process (or another cache on the same directory)
+        path = self._path(eid, attr) / "index.json"
+        mtime = path.stat().st_mtime_ns if path.exists() else None
+        cached = self._indexes.get((eid, attr))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        index = jsoncodec.loads(path.read_bytes()) if mtime is not None else {"meta": None, "chunks": []}
+        self._indexes[(eid, attr)] = (mtime, index)
+        return index
+
+    def _write_index(self, eid: str, attr: str, index: dict):
+        path = self._path(eid, attr)
+        tmp = path / f"index.json.{uuid4().hex}.tmp"
+        tmp.write_text(jsoncodec.dumps(index))
+        os.replace(tmp, path / "index.json")  # the index only lists chunks fully written
+        self._indexes[(eid, attr)] = ((path / "index.json").stat().st_mtime_ns, index)
+
+    def _write_chunk(self, eid: str, attr: str, ts: List[float], values: List[list]) -> str:
+        filename = f"{uuid4().hex}.json"
+        (self._path(eid, attr) / filename).write_text(jsoncodec.dumps({"ts": ts, "values": values}))
+        return filename
+
+    def _read_chunk(self, eid: str, attr: str, filename: str) -> dict:
+        return jsoncodec.loads((self._path(eid, attr) / filename).read_bytes())
+
+    def meta(self, eid: str, attr: str) -> Optional[dict]:
+        """Return what is needed to rebuild the temporal attribute : the entity type, the attribute type and key."""
+        return self._index(eid, attr)["meta"]
+
+    def covered(self, eid: str, attr: str) -> List[Interval]:
+        """Return the time ranges covered by the cache."""
+        return merge_intervals([(start, end) for start, end, _ in self._index(eid, attr)["chunks"]])
+
+    def gaps(self, eid: str, attr: str, start: float, end: float) -> List[Interval]:
+        """Return the time ranges of the window missing in the cache."""
+        return subtract(start, end, self.covered(eid, attr))
+
+    def store(self, eid: str, attr: str, start: float, end: float, samples: List[list], meta: Optional[dict] = None):
+        """Store the samples retrieved for a time range missing in the cache.
+
+        Parameters
+        ----------
+        eid : str
+            The entity id
+        attr : str
+            The attribute name
+        start : float
+            The start of the time range (included), as a POSIX timestamp
+        end : float
+            The end of the time range (excluded), as a POSIX timestamp
+        samples : List[list]
+            The samples as [value, date] pairs
+        meta : dict, optional
+            The entity type, the attribute type and key, if known
+        """
+        ts = [timestamp(s[1]) for s in samples]
+        order = sorted(range(len(samples)), key=ts.__getitem__)
+        ts, samples = [ts[i] for i in order], [samples[i] for i in order]
+        path = self._path(eid, attr)
+        path.mkdir(parents=True, exist_ok=True)
+        obsolete = []
+        with _locked(path):
+            self._indexes.pop((eid, attr), None)  # reload, another writer may have stored it meanwhile
+            index = self._index(eid, attr)
+            chunks: List[list] = index["chunks"]
+            for g0, g1 in subtract(start, end, self.covered(eid, attr)):
+                i0, i1 = bisect_left(ts, g0), bisect_left(ts, g1)
+                gts, gvalues = ts[i0:i1], samples[i0:i1]
+                for chunk in [c for c in chunks if c[1] == g0 or c[0] == g1]:  # adjacent chunks
+                    data = self._read_chunk(eid, attr, chunk[2])
+                    if len(data["ts"]) + len(gts) > CHUNK_MAX_SAMPLES:
+                        continue
+                    if chunk[1] == g0:
+                        g0, gts, gvalues = chunk[0], data["ts"] + gts, data["values"] + gvalues
+                    else:
+                        g1, gts, gvalues = chunk[1], gts + data["ts"], gvalues + data["values"]
+                    chunks.remove(chunk)
+                    obsolete.append(chunk[2])
+                chunks.append([g0, g1, self._write_chunk(eid, attr, gts, gvalues)])
+            if meta is not None:
+                index["meta"] = meta
+            chunks.sort()
+            self._write_index(eid, attr, index)
+        for filename in obsolete:  # merged, no longer listed
+            (path / filename).unlink(missing_ok=True)
+
+    def read(self, eid: str, attr: str, start: float, end: float) -> List[list]:
+        """Return the cached samples of the window, in time order.
+
+        Raises
+        ------
+        FileNotFoundError
+            A chunk file is missing (i.e. removed by hand). It's dropped from the index,
+            so that its time range is retrieved from the broker next time.
+        """
+        try:
+            return self._read(eid, attr, start, end)
+        except FileNotFoundError:  # merged by another writer since the index was loaded
+            self._indexes.pop((eid, attr), None)
+        try:
+            return self._read(eid, attr, start, end)
+        except FileNotFoundError:
+            self._drop_missing(eid, attr)
+            raise
+
+    def _read(self, eid: str, attr: str, start: float, end: float) -> List[list]:
+        samples = []
+        for c0, c1, filename in self._index(eid, attr)["chunks"]:
+            if c1 <= start or c0 >= end:
+                continue
+            chunk = self._read_chunk(eid, attr, filename)
+            ts = chunk["ts"]
+            samples.extend(chunk["values"][bisect_left(ts, start) : bisect_left(ts, end)])
+        return samples
+
+    def _drop_missing(self, eid: str, attr: str):
+        """Remove from the index the chunks whose file is missing."""
+        path = self._path(eid, attr)
+        with _locked(path):
+            self._indexes.pop((eid, attr), None)
+            index = self._index(eid, attr)
+            chunks = [c for c in index["chunks"] if (path / c[2]).exists()]
+            if len(chunks) < len(index["chunks"]):
+                logger.warning(f"Missing chunks of {eid} {attr} dropped from the cache index")
+                self._write_index(eid, attr, {**index, "chunks": chunks})
+
+    def clear(self):
+        """Remove all the cached values."""
+        self._indexes.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
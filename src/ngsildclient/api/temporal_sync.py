@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Incremental retrieval of temporal data.
+
+A high-water mark, the date of the latest sample retrieved, is kept in a local state file.
+Each run only asks the broker for the newer samples (timerel=after), and yields the deltas.
+"""
+
+from __future__ import annotations
+
+import os
+import logging
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Generator, List, Mapping, Optional, Set, Tuple, Union
+
+from ngsildclient.utils import iso8601, jsoncodec
+from ngsildclient.model.constants import IDENTITY_KEYS
+from .constants import TimeProperty
+from .helper.temporal import TemporalQuery
+
+if TYPE_CHECKING:
+    from .client import Client
+
+logger = logging.getLogger(__name__)
+
+
+class TemporalSync:
+    """An incremental reader of the Temporal Representation of Entities (TRoE).
+
+    Watermarks are kept per entity (by default) or per type.
+    Per entity, the broker is queried after the oldest watermark still within max_lag of the newest one,
+    and each entity is trimmed to its own newer samples : a late sensor doesn't make the others miss samples.
+    Lagging entities (i.e. dead or decommissioned sensors) are queried on their own, by id,
+    so that they don't drag the others' history along.
+    Entities appearing after the first run are retrieved from the oldest watermark within the lag.
+    Per type, a single watermark is kept : the date of the latest sample of any entity.
+
+    The state file is updated atomically, once all the deltas have been consumed.
+
+    Parameters
+    ----------
+    client : Client
+        The client
+    statefile : Union[str, Path]
+        The local file holding the watermarks, created at the first run
+    type : str
+        The entity type
+    attrs : List[str], optional
+        The attributes, by default all of them
+    q : str, optional
+        The query string (NGSI-LD Query Language)
+    ctx : str, optional
+        The context
+    start : Union[datetime, timedelta, str], optional
+        Where to start from at the first run, by default 30 days ago
+    per_entity : bool, optional
+        Keep a watermark per entity, by default True
+    max_lag : timedelta, optional
+        Per entity, the lag behind the newest watermark beyond which an entity is queried on its own,
+        by default 1 day
+    timeprop : TimeProperty, optional
+        The time property the samples are dated with, by default observedAt
+
+    Example
+    -------
+    >>> with Client() as client:
+    >>>     sync = TemporalSync(client, "rooms.state.json", type="RoomObserved")
+    >>>     for troe in sync.deltas():
+    >>>         process(troe)
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        statefile: Union[str, Path],
+        *,
+        type: str,
+        attrs: List[str] = None,
+        q: str = None,
+        ctx: str = None,
+        start: Union[datetime, timedelta, str] = timedelta(days=30),
+        per_entity: bool = True,
+        max_lag: timedelta = timedelta(days=1),
+        timeprop: TimeProperty = TimeProperty.OBSERVED_AT,
+    ):
+        self._client = client
+        self.statefile = Path(statefile)
+        self.type = type
+        self.attrs = attrs
+        self.q = q
+        self.ctx = ctx
+        self.start: str = TemporalQuery().after(start)["timeAt"]
+        self.per_entity = per_entity
+        self.max_lag = max_lag
+        self.timeprop = timeprop
+        self.watermarks: Dict[str, str] = self._load()  # entity id (or type) => date of the latest sample
+
+    def _load(self) -> Dict[str, str]:
+        if not self.statefile.exists():
+            return {}
+        state = jsoncodec.loads(self.statefile.read_bytes())
+        if state.get("type") != self.type or state.get("perEntity") != self.per_entity:
+            raise ValueError(f"State file {self.statefile} doesn't match type {self.type}")
+        return state["watermarks"]
+
+    def save(self):
+        """Write the watermarks to the state file, atomically."""
+        state = {"type": self.type, "perEntity": self.per_entity, "watermarks": self.watermarks}
+        tmp = self.statefile.with_name(f"{self.statefile.name}.tmp")
+        tmp.write_text(jsoncodec.dumps(state, indent=2))
+        os.replace(tmp, self.statefile)  # readers never see a partially written file
+
+    def watermark(self, eid: str = None) -> str:
+        """Return the date of the latest sample retrieved for an entity (or for the type), the start date if none."""
+        return self.watermarks.get(eid if self.per_entity else self.type, self.start)
+
+    def _split(self) -> Tuple[str, List[str]]:
+        """Return the date to query the entities after, and the lagging entities to be queried on their own."""
+        if not self.per_entity:
+            return self.watermark(), []
+        if not self.watermarks:
+            return self.start, []
+        marks = {eid: iso8601.to_datetime(mark) for eid, mark in self.watermarks.items()}
+        threshold = max(marks.values()) - self.max_lag
+        lagging = [eid for eid, mark in marks.items() if mark < threshold]
+        after = min((eid for eid, mark in marks.items() if mark >= threshold), key=marks.get)
+        return self.watermarks[after], lagging
+
+    def _trim(self, troe: dict, mark: datetime) -> Optional[dict]:
+        """Keep the samples newer than the mark. Return None if there's none. Set the new watermark."""
+        delta = {}
+        latest: Optional[str] = None
+        latest_dt = mark
+        for attr, temporal in troe.items():
+            if attr in IDENTITY_KEYS or not isinstance(temporal, Mapping):
+                delta[attr] = temporal
+                continue
+            samples = []
+            member = "objects" if "objects" in temporal else "values"
+            for sample in temporal.get(member, ()):
+                dt = iso8601.to_datetime(sample[1])
+                if dt > mark:
+                    samples.append(sample)
+                    if dt > latest_dt:
+                        latest, latest_dt = sample[1], dt
+            if samples:
+                delta[attr] = {**temporal, member: samples}
+        if latest is None:
+            return None
+        key = troe["id"] if self.per_entity else self.type
+        if key not in self.watermarks or latest_dt > iso8601.to_datetime(self.watermarks[key]):
+            self.watermarks[key] = latest
+        return delta
+
+    def deltas(self, *, pagesize: int = 0) -> Generator[dict, None, None]:
+        """Retrieve the samples newer than the watermarks, as simplified TRoEs.
+
+        Entities without new samples are skipped.
+        The state file is saved once the generator is exhausted :
+        if interrupted, the next run retrieves the same deltas again.
+
+        Parameters
+        ----------
+        pagesize : int, optional
+            By default the broker pagesize default
+
+        Yields
+        ------
+        dict
+            The TRoE of an entity, holding only its new samples
+        """
+        after, lagging = self._split()
+        marks: Dict[str, datetime] = {}  # the watermarks in effect for this run
+        for eid in lagging:
+            logger.info(f"sync {eid} after {self.watermarks[eid]}")
+            tq = TemporalQuery().after(self.watermarks[eid], self.timeprop)
+            yield from self._deltas(marks, eid=eid, tq=tq, pagesize=pagesize)
+        logger.info(f"sync {self.type} after {after}")
+        tq = TemporalQuery().after(after, self.timeprop)
+        yield from self._deltas(marks, tq=tq, pagesize=pagesize, skip=set(lagging))
+        self.save()
+
+    def _deltas(
+        self, marks: Dict[str, datetime], *, eid: str = None, tq: TemporalQuery, pagesize: int, skip: Set[str] = ()
+    ) -> Generator[dict, None, None]:
+        for troe in self._client.temporal.query_generator(
+            eid=eid, type=self.type, attrs=self.attrs, q=self.q, ctx=self.ctx, tq=tq, pagesize=pagesize
+        ):
+            if troe["id"] in skip:  # already retrieved on its own
+                continue
+            key = troe["id"] if self.per_entity else self.type
+            if key not in marks:
+                marks[key] = iso8601.to_datetime(self.watermark(key if self.per_entity else None))
+            delta = self._trim(troe, marks[key])
+            if delta is not None:
+                yield delta
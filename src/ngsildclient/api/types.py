@@ -17,19 +17,20 @@ import logging
 if TYPE_CHECKING:
     from .client import Client
 
+from ..utils import jsoncodec
 from .exceptions import rfc7807_error_handle
+from .session import ClientSession
 
 
 logger = logging.getLogger(__name__)
 
 
-class Types:
+class Types(ClientSession):
     def __init__(self, client: Client, url: str):
         self._client = client
-        self._session = client.session
         self.url = url
 
     @rfc7807_error_handle
     def list(self) -> Optional[dict]:
         r = self._session.get(f"{self.url}")
-        return r.json()["typeList"]
+        return jsoncodec.loads(r.content)["typeList"]
@@ -25,6 +25,8 @@ import ngsildclient.model.ngsidict as ngsidict
 
 
 class AttrGeoValue(ngsidict.NgsiDict):
+    __slots__ = ()
+
     @property
     def value(self):
         if self["type"] != "GeoProperty":
@@ -22,6 +22,8 @@ from ..exceptions import *
 
 
 class AttrPropValue(ngsildclient.model.ngsidict.NgsiDict):
+    __slots__ = ()
+
     @property
     def type(self):
         return "Property"
@@ -20,6 +20,8 @@ from ..exceptions import *
 
 
 class AttrRelValue(ngsildclient.model.ngsidict.NgsiDict):
+    __slots__ = ()
+
     @property
     def type(self):
         return "Relationship"
@@ -20,6 +20,8 @@ from ngsildclient.utils import iso8601
 
 
 class AttrTemporalValue(ngsidict.NgsiDict):
+    __slots__ = ()
+
     @property
     def value(self) -> Union[datetime, date, time]:
         if self["type"] != "Property":
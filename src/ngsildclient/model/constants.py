@@ -34,7 +34,7 @@ from geojson import (
     LineString,
     Polygon,
 )
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 
 if TYPE_CHECKING:
     import ngsildclient.model.entity as entity
@@ -68,9 +68,35 @@ META_ATTR_UNITCODE = "unitCode"
 META_ATTR_OBSERVED_AT = "observedAt"
 META_ATTR_DATASET_ID = "datasetId"
 
+IDENTITY_KEYS = ("id", "type", "@context")
+"""The entity members that are not attributes.
+"""
+
+SYSTEM_ATTRS = ("createdAt", "modifiedAt", "deletedAt")
+"""The temporal members set by the broker, on the entity and its attributes.
+"""
+
+ATTR_VALUE_KEYS = ("value", "object", "languageMap", "vocab", "json")
+"""The members holding the value of an attribute.
+"""
+
 UTC = tz.UTC
 
 
+def slotted(cls):
+    """Rebuild a dataclass with __slots__, as dataclass(slots=True) does from Python 3.10 onwards.
+
+    Field defaults are already bound to the generated __init__, so they can be removed from the class namespace.
+    """
+    names = tuple(f.name for f in fields(cls))
+    ns = {k: v for k, v in cls.__dict__.items() if k not in names and k not in ("__dict__", "__weakref__")}
+    ns["__slots__"] = names
+    slottedcls = type(cls)(cls.__name__, cls.__bases__, ns)
+    slottedcls.__qualname__ = cls.__qualname__
+    return slottedcls
+
+
+@slotted
 @dataclass
 class AttrValue:
     value: Any
@@ -80,6 +106,7 @@ class AttrValue:
     userdata: dict = field(default_factory=dict)
 
 
+@slotted
 @dataclass
 class MultAttrValue(Iterable[AttrValue]):
     datasetid: str = None
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Structural differences between two versions of a NGSI-LD entity.
+
+The patch granularity is the attribute, the unit of a NGSI-LD update.
+Instances of multi-attributes are matched by datasetId, so that only the instances that differ are patched.
+Changes are also reported down to the nested properties, i.e. "NO2.accuracy.value".
+An instance of a multi-attribute is noted with its datasetId between brackets,
+i.e. "temperature[urn:ngsi-ld:Dataset:Fahrenheit].value",
+the default instance (without datasetId) being noted "temperature[]".
+"""
+
+from __future__ import annotations
+
+from copy import deepcopy
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, NamedTuple, Optional
+
+from ngsildclient.utils.jsoncodec import unwrap
+from ngsildclient.model.constants import ATTR_VALUE_KEYS, IDENTITY_KEYS, META_ATTR_DATASET_ID, SYSTEM_ATTRS
+
+
+class Change(NamedTuple):
+    op: Literal["add", "remove", "replace"]
+    path: str
+    old: Any = None
+    new: Any = None
+
+    def __str__(self):
+        if self.op == "add":
+            return f"+ {self.path} = {self.new}"
+        if self.op == "remove":
+            return f"- {self.path}"
+        return f"~ {self.path} : {self.old} -> {self.new}"
+
+
+@dataclass
+class EntityDiff:
+    """The differences to turn an entity into its new version.
+
+    An EntityDiff is falsy when both versions are identical.
+    """
+
+    id: str
+    type: str
+    ctx: Optional[List[str]] = None
+    added: Dict[str, Any] = field(default_factory=dict)  # name -> new attribute
+    removed: Dict[str, Any] = field(default_factory=dict)  # name -> old attribute
+    changed: Dict[str, Any] = field(default_factory=dict)  # name -> new attribute, or new instances if multi-attribute
+    removed_instances: Dict[str, List[Optional[str]]] = field(default_factory=dict)  # name -> datasetIds
+    changes: List[Change] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def __str__(self):
+        return "\n".join(str(c) for c in self.changes)
+
+    def patch(self) -> dict:
+        """Return the partial entity holding the added and changed attributes, i.e. for a batch update.
+
+        Removed attributes and instances can't be expressed this way, they have to be deleted on their own.
+        """
+        d = {"id": self.id, "type": self.type}
+        if self.ctx is not None:
+            d["@context"] = self.ctx
+        d.update(self.added)
+        d.update((k, v) for k, v in self.changed.items() if v != [])
+        return d
+
+    def apply(self, entity):
+        """Apply the differences to an Entity, NgsiDict or dict, in place.
+
+        Returns
+        -------
+        The entity itself
+        """
+        for name in self.removed:
+            del entity[name]
+        for name, attr in self.added.items():
+            entity[name] = deepcopy(attr)
+        for name, attr in self.changed.items():
+            if not isinstance(attr, list):
+                entity[name] = deepcopy(attr)
+                continue
+            instances = _instances(unwrap(entity).get(name)) or {}
+            for instance in attr:
+                instances[instance.get(META_ATTR_DATASET_ID)] = deepcopy(instance)
+            for datasetid in self.removed_instances.get(name, ()):
+                instances.pop(datasetid, None)
+            values = list(instances.values())
+            entity[name] = values[0] if len(values) == 1 else values
+        return entity
+
+
+def _instances(attr: Any) -> Optional[Dict[Optional[str], Mapping]]:
+    """Return the instances of an attribute keyed by datasetId, None if it is not a NGSI-LD attribute."""
+    items = attr if isinstance(attr, list) else [attr]
+    if not all(isinstance(x, Mapping) and "type" in x for x in items):
+        return None
+    return {x.get(META_ATTR_DATASET_ID): x for x in items}
+
+
+def _walk(old: Any, new: Any, path: str, changes: List[Change]):
+    if not (isinstance(old, Mapping) and isinstance(new, Mapping)):
+        changes.append(Change("replace", path, old, new))
+        return
+    for k, v in old.items():
+        if k not in new:
+            changes.append(Change("remove", f"{path}.{k}", v))
+    for k, v in new.items():
+        if k not in old:
+            changes.append(Change("add", f"{path}.{k}", None, v))
+        elif old[k] != v:
+            _walk(old[k], v, f"{path}.{k}", changes)
+
+
+def _diff_multi(d: EntityDiff, name: str, old: Dict[Optional[str], Mapping], new: Dict[Optional[str], Mapping]):
+    patched = []
+    for datasetid, instance in new.items():
+        path = f"{name}[{datasetid or ''}]"
+        if datasetid not in old:
+            d.changes.append(Change("add", path, None, instance))
+            patched.append(instance)
+        elif old[datasetid] != instance:
+            _walk(old[datasetid], instance, path, d.changes)
+            patched.append(instance)
+    removed = [datasetid for datasetid in old if datasetid not in new]
+    for datasetid in removed:
+        d.changes.append(Change("remove", f"{name}[{datasetid or ''}]", old[datasetid]))
+    if patched or removed:  # otherwise instances have only been reordered
+        d.changed[name] = patched
+    if removed:
+        d.removed_instances[name] = removed
+
+
+def _strip(attr: Any) -> Any:
+    """Return the attribute without the system attributes of its instances and sub-attributes.
+
+    Values are never looked into. The attribute itself is returned when there is nothing to strip.
+    """
+    if isinstance(attr, list):
+        stripped = [_strip(x) for x in attr]
+        return attr if all(x is y for x, y in zip(stripped, attr)) else stripped
+    if not (isinstance(attr, Mapping) and "type" in attr):
+        return attr
+    stripped = {k: v if k in ATTR_VALUE_KEYS else _strip(v) for k, v in attr.items() if k not in SYSTEM_ATTRS}
+    if len(stripped) == len(attr) and all(stripped[k] is v for k, v in attr.items()):
+        return attr
+    return stripped
+
+
+def diff(old, new, sysattrs: bool = False) -> EntityDiff:
+    """Compute the differences to turn an entity into its new version.
+
+    Parameters
+    ----------
+    old : Entity, NgsiDict or dict
+        The reference version, i.e. the one stored in the broker
+    new : Entity, NgsiDict or dict
+        The new version, i.e. the local one
+    sysattrs : bool, optional
+        Compare the system attributes (createdAt, modifiedAt), set by the broker, too. By default False.
+
+    Returns
+    -------
+    EntityDiff
+        The differences, falsy if none
+    """
+    old, new = unwrap(old), unwrap(new)
+    skipped = IDENTITY_KEYS if sysattrs else IDENTITY_KEYS + SYSTEM_ATTRS
+    strip = (lambda attr: attr) if sysattrs else _strip
+    d = EntityDiff(new["id"], new["type"], new.get("@context"))
+    for name, attr in old.items():
+        if name not in new and name not in skipped:
+            attr = strip(attr)
+            d.removed[name] = attr
+            d.changes.append(Change("remove", name, attr))
+    for name, attr in new.items():
+        if name in skipped:
+            continue
+        if name not in old:
+            attr = strip(attr)
+            d.added[name] = attr
+            d.changes.append(Change("add", name, None, attr))
+            continue
+        prev = old[name]
+        if prev is attr:
+            continue
+        prev, attr = strip(prev), strip(attr)
+        if prev == attr:
+            continue
+        if isinstance(prev, list) or isinstance(attr, list):
+            old_instances, new_instances = _instances(prev), _instances(attr)
+            if old_instances is not None and new_instances is not None:
+                _diff_multi(d, name, old_instances, new_instances)
+                continue
+        d.changed[name] = attr
+        _walk(prev, attr, name, d.changes)
+    return d
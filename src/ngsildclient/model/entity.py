@@ -11,7 +11,6 @@
 
 from __future__ import annotations
 
-import json
 import requests
 import httpx
 import aiofiles
@@ -33,10 +32,19 @@ from typing import (
 from multipledispatch import dispatch
 
 from ngsildclient.model.ngsidict import NgsiDict
-from ngsildclient.utils import iso8601, url
+from ngsildclient.model.diff import EntityDiff, diff
+from ngsildclient.utils import iso8601, url, jsoncodec
 from ngsildclient.utils.urn import Urn
 from ngsildclient.model.exceptions import NgsiMissingIdError, NgsiMissingTypeError, NgsiMissingContextError
-from ngsildclient.model.constants import CORE_CONTEXT, LD_PREFIX, Rel, NgsiDate, NgsiGeometry
+from ngsildclient.model.constants import (
+    CORE_CONTEXT,
+    IDENTITY_KEYS,
+    LD_PREFIX,
+    SYSTEM_ATTRS,
+    Rel,
+    NgsiDate,
+    NgsiGeometry,
+)
 from ngsildclient.settings import globalsettings
 
 logger = logging.getLogger(__name__)
@@ -184,6 +192,8 @@ class Entity:
     >>> e.rm("NO2.accuracy")
     """
 
+    __slots__ = ("root", "_lastprop", "_anchored", "_lastwasmulti", "_synced")
+
     @staticmethod
     def _build_fully_qualified_id(type: str, id: str) -> Urn:
         if globalsettings.autoprefix:
@@ -203,6 +213,7 @@ class Entity:
         self._lastprop = self.root = NgsiDict(payload)
         self._anchored: bool = False
         self._lastwasmulti: bool = False
+        self._synced: Optional[dict] = None  # the attributes as last synced with the broker
 
     @dispatch(str, str)
     def __init__(self, type: str, id: str, *, ctx: List[str] = None):  # noqa F811
@@ -236,6 +247,44 @@ class Entity:
         """
         return cls(payload)
 
+    @classmethod
+    def from_broker(cls, payload: dict, track: bool = False) -> Entity:
+        """Create a NGSI-LD entity from a dictionary returned by the Context Broker.
+
+        A fast path for trusted payloads : no dispatch on the arguments, no check on the 'id' and 'type'.
+        The dictionary is wrapped as is, not copied.
+        It is intended to decode large query results.
+
+        Parameters
+        ----------
+        payload : dict
+            The given dictionary.
+        track : bool, optional
+            Track the changes from there on, as mark_synced() does, by default False.
+            Tracked attributes are copied on first access, which slows down reads.
+
+        Returns
+        -------
+        Entity
+            The result Entity instance
+        """
+        if not payload.get("@context"):
+            payload["@context"] = [CORE_CONTEXT]
+        e = cls._wrap(payload)
+        if track:
+            e._synced = payload.copy()
+            e.root._shared = set(payload)
+        return e
+
+    @classmethod
+    def _wrap(cls, payload: dict) -> Entity:
+        """Wrap a trusted dictionary as is, without any check nor change tracking."""
+        e = cls.__new__(cls)
+        e._lastprop = e.root = NgsiDict._wrap(payload)
+        e._anchored = e._lastwasmulti = False
+        e._synced = None
+        return e
+
     @classmethod
     def from_json(cls, content: str):
         """Create a NGSI-LD entity from JSON content.
@@ -253,7 +302,7 @@ class Entity:
         Entity
             The result Entity instance
         """
-        payload: dict = json.loads(content)
+        payload: dict = jsoncodec.loads(content)
         return cls(payload)
 
     @classmethod
@@ -278,14 +327,141 @@ class Entity:
         """
         return deepcopy(self)
 
+    def _cow(self) -> Entity:
+        """Return a copy-on-write copy of the entity.
+
+        Attributes are shared with the source entity and copied on first access by either side.
+        """
+        lastkey = None
+        if self._lastprop is not self.root and not self._lastwasmulti:
+            last = self._lastprop.data if isinstance(self._lastprop, NgsiDict) else self._lastprop
+            lastkey = next((k for k, v in self.root._raw.items() if v is last), None)
+            if lastkey is None:  # the last property is nested
+                return deepcopy(self)
+        e = Entity.__new__(Entity)
+        e.root = self.root._cow()
+        e._anchored, e._lastwasmulti = self._anchored, self._lastwasmulti
+        e._synced = None
+        if lastkey is None:
+            e._lastprop = e.root
+        else:  # each copy takes its own last property, so the source keeps its own too
+            self.root._shared.discard(lastkey)
+            e.root._unshare(lastkey)
+            e._lastprop = NgsiDict._wrap(e.root._raw[lastkey])
+        return e
+
     def __mul__(self, n: int):
-        res = []
-        for _ in range(n):
-            res.append(Entity.duplicate(self))
-        return res
+        """Return n copies of the entity.
+
+        Copies are copy-on-write : they share their attributes with the source entity
+        until an attribute is accessed (then deep-copied) or replaced.
+        Attributes the source entity has already handed out, i.e. e["temperature"], are deep-copied right away.
+        Exposing the underlying dictionary, i.e. with to_dict(), deep-copies all the attributes still shared.
+        """
+        return [self._cow() for _ in range(n)]
 
     __rmul__ = __mul__
 
+    def __deepcopy__(self, memo: dict):
+        e = Entity.__new__(Entity)
+        memo[id(self)] = e
+        e.root = deepcopy(self.root, memo)
+        e._lastprop = deepcopy(self._lastprop, memo)
+        e._anchored, e._lastwasmulti = self._anchored, self._lastwasmulti
+        e._synced = None  # a duplicate is a new entity, not tracked
+        return e
+
+    def mark_synced(self) -> Entity:
+        """Take the current attributes as the ones stored in the broker.
+
+        Changes are tracked from there on, and sent by update_changed().
+        The snapshot is a shallow copy : attributes are shared with the entity,
+        and copied on first access or when the underlying dictionary is exposed (copy-on-write).
+        Property chaining restarts from the root, so that the next calls don't alter the snapshot.
+
+        Returns
+        -------
+        Entity
+            The entity itself
+        """
+        data = self.root._raw
+        self._synced = dict(data)
+        shared = self.root._shared
+        self.root._shared = set(data) if shared is None else shared.union(data)
+        self._lastprop, self._anchored, self._lastwasmulti = self.root, False, False
+        return self
+
+    @property
+    def tracked(self) -> bool:
+        """True if the entity has been loaded from the broker with track=True or synced since, False otherwise."""
+        return self._synced is not None
+
+    def changes(self) -> Tuple[List[str], List[str], List[str]]:
+        """Return the attributes changed since the entity was loaded from the broker or last synced.
+
+        An untracked entity has all its attributes added.
+
+        Returns
+        -------
+        Tuple[List[str], List[str], List[str]]
+            The names of the attributes added, modified and removed
+        """
+        data, synced = self.root._raw, self._synced
+        if synced is None:
+            return [k for k in data if k not in IDENTITY_KEYS], [], []
+        added, modified = [], []
+        for k, v in data.items():
+            if k in IDENTITY_KEYS:
+                continue
+            if k not in synced:
+                added.append(k)
+            elif v is not synced[k] and v != synced[k]:  # attributes not accessed are still shared
+                modified.append(k)
+        removed = [k for k in synced if k not in data and k not in IDENTITY_KEYS]
+        return added, modified, removed
+
+    @property
+    def dirty(self) -> bool:
+        """True if the entity has changed since it was loaded from the broker or last synced."""
+        return any(self.changes())
+
+    def diff(self, other: Entity, sysattrs: bool = False) -> EntityDiff:
+        """Compute the differences to turn this entity into the other one.
+
+        Parameters
+        ----------
+        other : Entity
+            The new version of the entity
+        sysattrs : bool, optional
+            Compare the system attributes (createdAt, modifiedAt) too, by default False
+
+        Returns
+        -------
+        EntityDiff
+            The differences, falsy if none
+
+        Example
+        -------
+        >>> d = client.get(local.id).diff(local)
+        >>> if d:
+        >>>     client.batch.update([d.patch()])
+        """
+        return diff(self, other, sysattrs)
+
+    def partial_dict(self, attrs: Sequence[str]) -> dict:
+        """Return a partial entity holding the given attributes only, i.e. for a batch update."""
+        data = self.root._raw
+        d = {"id": data["id"], "type": data["type"]}
+        if "@context" in data:
+            d["@context"] = data["@context"]
+        d.update((k, data[k]) for k in attrs)
+        return d
+
+    def changed_dict(self) -> dict:
+        """Return a partial entity holding the attributes added and modified since the last sync."""
+        added, modified, _ = self.changes()
+        return self.partial_dict(added + modified)
+
     def dupattr(self, attrname: str) -> NgsiDict:
         """Duplicates the attribute
 
@@ -529,7 +705,7 @@ class Entity:
 
     def rmsysattrs(self):
         try:
-            for key in ("createdAt", "modifiedAt"):
+            for key in SYSTEM_ATTRS:
                 self.root.__delitem__(key)
         except KeyError:
             pass
@@ -589,10 +765,10 @@ class Entity:
         """
         if url.isurl(filename):
             resp = requests.get(filename)
-            payload = resp.json()
+            payload = jsoncodec.loads(resp.content)
         else:
             with open(filename, "r") as fp:
-                payload = json.load(fp)
+                payload = jsoncodec.loads(fp.read())
         if isinstance(payload, List):
             return [cls.from_dict(x) for x in payload]
         return cls.from_dict(payload)
@@ -626,11 +802,11 @@ class Entity:
         """
         if url.isurl(filename):
             resp = httpx.get(filename)
-            payload = resp.json()
+            payload = jsoncodec.loads(resp.content)
         else:
             async with aiofiles.open(filename, "r") as fp:
                 contents = await fp.read()
-                payload = json.loads(contents)
+                payload = jsoncodec.loads(contents)
         if isinstance(payload, List):
             return [cls.from_dict(x) for x in payload]
         return cls.from_dict(payload)
@@ -655,7 +831,7 @@ class Entity:
         >>> rooms = Entity.load_batch("/tmp/rooms_all.jsonld")
         """
         with open(filename, "r") as fp:
-            payload = json.load(fp)
+            payload = jsoncodec.loads(fp.read())
         if not isinstance(payload, List):
             raise ValueError("The JSON payload MUST be an array")
         return [cls.from_dict(x) for x in payload]
@@ -681,7 +857,7 @@ class Entity:
         """
         async with aiofiles.open(filename, "r") as fp:
             contents = await fp.read()
-            payload = json.loads(contents)
+            payload = jsoncodec.loads(contents)
         if not isinstance(payload, List):
             raise ValueError("The JSON payload MUST be an array")
         return [cls.from_dict(x) for x in payload]
@@ -697,13 +873,7 @@ class Entity:
             identation size (number of spaces), by default 2
         """
         with open(filename, "w") as fp:
-            json.dump(
-                self.root,
-                fp,
-                ensure_ascii=False,
-                indent=indent,
-                default=lambda x: x.data if isinstance(x, NgsiDict) else str,
-            )
+            fp.write(jsoncodec.dumps(self.root, indent=indent))
 
     async def save_async(self, filename: str, *, indent: int = 2):
         """Save the entity to a file.
@@ -716,12 +886,7 @@ class Entity:
             identation size (number of spaces), by default 2
         """
         async with aiofiles.open(filename, "w") as fp:
-            payload = json.dumps(
-                self.root,
-                ensure_ascii=False,
-                indent=indent,
-                default=lambda x: x.data if isinstance(x, NgsiDict) else str,
-            )
+            payload = jsoncodec.dumps(self.root, indent=indent)
             await fp.write(payload)
 
     @classmethod
@@ -743,15 +908,9 @@ class Entity:
         >>> rooms = [Entity("Room", "Room1"), Entity("Room", "Room2")]
         >>> Entity.save_batch(rooms, "/tmp/rooms_all.jsonld")
         """
-        payload = [x.root for x in entities]
+        payload = [x.to_dict() for x in entities]
         with open(filename, "w") as fp:
-            json.dump(
-                payload,
-                fp,
-                ensure_ascii=False,
-                indent=indent,
-                default=lambda x: x.data if isinstance(x, NgsiDict) else str,
-            )
+            fp.write(jsoncodec.dumps(payload, indent=indent))
 
     @classmethod
     async def save_batch_async(cls, entities: List[Entity], filename: str, *, indent: int = 2):
@@ -772,12 +931,7 @@ class Entity:
         >>> rooms = [Entity("Room", "Room1"), Entity("Room", "Room2")]
         >>> await Entity.save_batch_async(rooms, "/tmp/rooms_all.jsonld")
         """
-        payload = [x.root for x in entities]
+        payload = [x.to_dict() for x in entities]
         async with aiofiles.open(filename, "w") as fp:
-            payload = json.dumps(
-                payload,
-                ensure_ascii=False,
-                indent=indent,
-                default=lambda x: x.data if isinstance(x, NgsiDict) else str,
-            )
+            payload = jsoncodec.dumps(payload, indent=indent)
             await fp.write(payload)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Build NGSI-LD entities in bulk from columns of values.
+
+The input is a pandas DataFrame, a dictionary of NumPy arrays or a dictionary of lists.
+Attributes are built one column at a time : temporal columns are formatted in a single pass
+(vectorized for pandas and NumPy datetimes), identifiers are prefixed with plain string operations,
+and no Entity, AttrValue or NgsiDict is instantiated.
+The result is a list of plain dictionaries ready to be sent to the batch endpoints.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partialmethod
+from typing import Any, Dict, List, Literal, Mapping, Optional
+
+from ngsildclient.utils import iso8601
+from ngsildclient.utils.urn import Urn
+from ngsildclient.model.utils import id_prefixer
+from ngsildclient.model.constants import (
+    CORE_CONTEXT,
+    META_ATTR_DATASET_ID,
+    META_ATTR_OBSERVED_AT,
+    META_ATTR_UNITCODE,
+    TemporalType,
+)
+
+Columns = Mapping[str, Any]
+
+
+def _missing(v: Any) -> bool:
+    return v is None or v != v  # NaN, NaT
+
+
+def tolist(column: Any) -> list:
+    """Return the column as a list of Python values (NumPy scalars are converted to native types)."""
+    if isinstance(column, list):
+        return column
+    if hasattr(column, "tolist"):  # pandas Series, NumPy array
+        return column.tolist()
+    return list(column)
+
+
+def temporal_column(column: Any) -> List[Optional[tuple[str, str]]]:
+    """Format a column of dates as a list of (NGSI-LD temporal type, ISO8601 string).
+
+    pandas and NumPy datetimes are formatted at once. Datetimes are expected in UTC if naive.
+    Strings already matching the usual "YYYY-MM-DDTHH:MM:SSZ" format are taken as is.
+    Missing values are returned as None.
+    """
+    dtype = getattr(column, "dtype", None)
+    if dtype is not None and dtype.kind == "M":  # datetime64
+        if hasattr(column, "dt"):  # pandas Series
+            dt = column.dt.tz_convert("UTC") if column.dt.tz is not None else column
+            values = dt.dt.strftime("%Y-%m-%dT%H:%M:%SZ").tolist()
+        else:  # NumPy array
+            import numpy
+
+            values = [None if s == "NaT" else f"{s}Z" for s in numpy.datetime_as_string(column, unit="s").tolist()]
+        return [None if _missing(s) else (TemporalType.DATETIME.value, s) for s in values]
+    res = []
+    for v in tolist(column):
+        if _missing(v):
+            res.append(None)
+        elif isinstance(v, datetime):
+            res.append((TemporalType.DATETIME.value, iso8601.from_datetime(v)))
+        elif isinstance(v, str) and iso8601.ISO8601_PATTERN.fullmatch(v):
+            res.append((TemporalType.DATETIME.value, v))
+        else:
+            s, temporaltype, _ = iso8601.parse(v)
+            res.append((temporaltype.value, s))
+    return res
+
+
+def _observedat_column(temporals: List[Optional[tuple[str, str]]]) -> List[Optional[str]]:
+    res = []
+    for t in temporals:
+        if t is not None and t[0] != TemporalType.DATETIME.value:
+            raise ValueError(f"observedAt must be a DateTime : {t[1]}")
+        res.append(None if t is None else t[1])
+    return res
+
+
+def _prefix_column(values: list) -> List[Optional[str]]:
+    return [None if _missing(v) else v if v.startswith("urn:ngsi-ld:") else f"urn:ngsi-ld:{v}" for v in values]
+
+
+@dataclass
+class ColumnSpec:
+    """The mapping of one NGSI-LD attribute to its columns."""
+
+    name: str
+    kind: Literal["Property", "TemporalProperty", "GeoProperty", "Relationship"]
+    columns: tuple[str, ...]
+    unitcode: str = None
+    datasetid: str = None
+    observedat: str = None  # the name of the column holding the observation dates
+    precision: int = 6  # GeoProperty only
+
+
+class ColumnarEntityBuilder:
+    """A helper class to build many entities of the same type from tabular data.
+
+    Each attribute is mapped to one column (two columns for a location : latitude and longitude).
+    Rows where a value is missing (None, NaN or NaT) simply lack the attribute.
+
+    Parameters
+    ----------
+    type : str
+        The entity type
+    id : str
+        The name of the column holding the entity ids, prefixed as they would be by Entity(type, id)
+    ctx : List[str], optional
+        The context, by default the NGSI-LD Core Context
+
+    Example
+    -------
+    >>> from ngsildclient import *
+    >>> df = pd.DataFrame({"name": ["falcon", "dog"], "num_legs": [2, 4], "seen": ["2022-01-12T12:54:38Z"] * 2})
+    >>> builder = ColumnarEntityBuilder("SpecimenObserved", "name").obs("seen").prop("legs", "num_legs")
+    >>> client.upsert(builder.build(df))
+    """
+
+    def __init__(self, type: str, id: str, *, ctx: List[str] = None):
+        self.type = type
+        self.id = id
+        self.ctx = ctx or [CORE_CONTEXT]
+        self.specs: List[ColumnSpec] = []
+
+    def prop(
+        self, name: str, column: str, *, unitcode: str = None, datasetid: str = None, observedat: str = None
+    ) -> ColumnarEntityBuilder:
+        self.specs.append(ColumnSpec(name, "Property", (column,), unitcode, Urn.prefix(datasetid), observedat))
+        return self
+
+    def tprop(self, name: str, column: str) -> ColumnarEntityBuilder:
+        self.specs.append(ColumnSpec(name, "TemporalProperty", (column,)))
+        return self
+
+    obs = partialmethod(tprop, "dateObserved")
+
+    def gprop(
+        self, name: str, lat: str, lon: str, *, datasetid: str = None, observedat: str = None, precision: int = 6
+    ) -> ColumnarEntityBuilder:
+        spec = ColumnSpec(name, "GeoProperty", (lat, lon), None, Urn.prefix(datasetid), observedat, precision)
+        self.specs.append(spec)
+        return self
+
+    def loc(self, lat: str, lon: str, *, precision: int = 6) -> ColumnarEntityBuilder:
+        return self.gprop("location", lat, lon, precision=precision)
+
+    def rel(self, name: str, column: str, *, datasetid: str = None, observedat: str = None) -> ColumnarEntityBuilder:
+        self.specs.append(ColumnSpec(name, "Relationship", (column,), None, Urn.prefix(datasetid), observedat))
+        return self
+
+    def _values(self, spec: ColumnSpec, data: Columns, temporals: Dict[str, list]) -> List[Optional[dict]]:
+        def temporal(column: str) -> list:  # a column of dates is formatted once, even if used by many attributes
+            if column not in temporals:
+                temporals[column] = temporal_column(data[column])
+            return temporals[column]
+
+        if spec.kind == "TemporalProperty":
+            return [
+                None if t is None else {"type": "Property", "value": {"@type": t[0], "@value": t[1]}}
+                for t in temporal(spec.columns[0])
+            ]
+        if spec.kind == "GeoProperty":
+            lats, lons = tolist(data[spec.columns[0]]), tolist(data[spec.columns[1]])
+            n = spec.precision
+            attrs = [
+                None
+                if _missing(lat) or _missing(lon)
+                else {"type": "GeoProperty", "value": {"type": "Point", "coordinates": [round(lon, n), round(lat, n)]}}
+                for lat, lon in zip(lats, lons)
+            ]
+        elif spec.kind == "Relationship":
+            attrs = [
+                None if v is None else {"type": "Relationship", "object": v}
+                for v in _prefix_column(tolist(data[spec.columns[0]]))
+            ]
+        else:
+            attrs = [None if _missing(v) else {"type": "Property", "value": v} for v in tolist(data[spec.columns[0]])]
+        metadata = {}
+        if spec.unitcode is not None:
+            metadata[META_ATTR_UNITCODE] = spec.unitcode
+        if spec.datasetid is not None:
+            metadata[META_ATTR_DATASET_ID] = spec.datasetid
+        if metadata:
+            for attr in attrs:
+                if attr is not None:
+                    attr.update(metadata)
+        if spec.observedat is not None:
+            for attr, observedat in zip(attrs, _observedat_column(temporal(spec.observedat))):
+                if attr is not None and observedat is not None:
+                    attr[META_ATTR_OBSERVED_AT] = observedat
+        return attrs
+
+    def build(self, data: Columns) -> List[dict]:
+        """Build the entities from the given columns.
+
+        Parameters
+        ----------
+        data : Columns
+            A pandas DataFrame, a dictionary of NumPy arrays or a dictionary of lists
+
+        Returns
+        -------
+        List[dict]
+            The entities as plain dictionaries, i.e. to be sent with Client.create() or Client.upsert()
+        """
+        entities: List[Dict[str, Any]] = [
+            {"id": eid, "type": self.type, "@context": self.ctx.copy()}
+            for eid in map(id_prefixer(self.type), tolist(data[self.id]))
+        ]
+        temporals: Dict[str, list] = {}
+        for spec in self.specs:
+            for entity, attr in zip(entities, self._values(spec, data, temporals)):
+                if attr is not None:
+                    entity[spec.name] = attr
+        return entities
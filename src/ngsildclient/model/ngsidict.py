@@ -26,13 +26,12 @@ from copy import deepcopy
 from datetime import datetime
 from scalpl import Cut
 
-from ..utils import iso8601, url
+from ..utils import iso8601, url, jsoncodec
 from .constants import *
 from .exceptions import *
 from ngsildclient.settings import globalsettings
 from ngsildclient.model.utils import tuple_to_point
 
-import json
 
 """This module contains the definition of the NgsiDict class.
 """
@@ -50,45 +49,202 @@ class NgsiDict(Cut, MutableMapping):
     model.Entity
     """
 
+    __slots__ = ("name", "_views", "_shared", "_exposed")
+
+    _raw = Cut.data  # the underlying dictionary as is, possibly sharing values with copy-on-write copies
+
     def __init__(self, data: dict = None, name: str = None):
         super().__init__(data)
         self.name = name
+        self._views = None
+        self._shared = None
+        self._exposed = None
+
+    @classmethod
+    def _wrap(cls, data: dict, name: str = None) -> NgsiDict:
+        """Wrap a dictionary without going through the constructors chain."""
+        d = cls.__new__(cls)
+        d.data, d.sep, d.name, d._views, d._shared, d._exposed = data, ".", name, None, None, None
+        return d
+
+    @property
+    def data(self) -> dict:
+        """The underlying dictionary.
+
+        Values still shared with copy-on-write copies are deep-copied first, so that it can be safely modified.
+        """
+        if self._shared:
+            self._unshare_all()
+        return self._raw
+
+    @data.setter
+    def data(self, data: dict):
+        self._raw = data
+
+    def _cow(self) -> NgsiDict:
+        """Return a copy-on-write copy.
+
+        Both dictionaries share their values until one of them accesses a mutable value (dict or list),
+        which is then deep-copied on its side only.
+        Exposing the underlying dictionary (data, to_dict(), items(), values()) deep-copies all the shared values.
+        Values already handed out by __getitem__ may still be modified through the caller's reference,
+        so they are never shared : the copy takes its own deep copy of them.
+        """
+        raw = self._raw
+        exposed = self._exposed.intersection(raw) if self._exposed else ()
+        d = self._wrap(dict(raw), self.name)
+        for key in exposed:
+            d._raw[key] = deepcopy(raw[key])
+        d._shared = set(raw).difference(exposed)
+        self._shared = set(raw).difference(exposed)
+        return d
+
+    def _topkey(self, path: str) -> str:
+        return path.split(self.sep, 1)[0].split("[", 1)[0] if isinstance(path, str) else path
+
+    def _cut(self) -> Cut:
+        """Return a Cut on the underlying dictionary, to operate on a path without unsharing the other values."""
+        return Cut(self._raw, self.sep)
+
+    def _release(self, path: str):
+        """Prepare a write at path : a shared value replaced as a whole is no longer shared, otherwise copy it."""
+        if path in self._shared:
+            self._shared.discard(path)
+        else:
+            self._unshare(path)
+
+    def _unshare(self, path: str) -> bool:
+        """Take a private copy of the top-level value found at path if it is shared."""
+        key = self._topkey(path)
+        if key not in self._shared:
+            return False
+        self._shared.discard(key)
+        raw = self._raw
+        raw[key] = deepcopy(raw[key])
+        return True
+
+    def _unshare_all(self):
+        """Take a private copy of all the shared values."""
+        raw, shared = self._raw, self._shared
+        self._shared = None
+        for key in shared:
+            if key in raw and isinstance(raw[key], (Mapping, list)):
+                raw[key] = deepcopy(raw[key])
 
     def is_root(self) -> bool:
         return self.get("@context") is not None
 
-    def __getitem__(self, path: str):
-        item = super().__getitem__(path)
-        if isinstance(item, Mapping) and not isinstance(item, NgsiDict):
-            from ngsildclient.model.attr.factory import AttrFactory
+    def _view(self, path: str, item: Mapping):
+        """Return the typed attribute view of the mapping item.
+
+        Views are created once and cached by path.
+        A cached view is valid as long as it still wraps the very same dictionary.
+        """
+        if self._views is None:
+            self._views = {}
+        else:
+            cached = self._views.get(path)
+            if cached is not None and cached[0] is item:
+                return cached[1]
+        from ngsildclient.model.attr.factory import AttrFactory
+
+        view = AttrFactory.create(item)
+        self._views[path] = (item, view)
+        return view
+
+    def _invalidate(self, path: str):
+        """Drop the cached views of the attribute written at path, its parents and its children."""
+        if self._views and isinstance(path, str):
+            prefix = path + self.sep
+            stale = [k for k in self._views if k == path or k.startswith(prefix) or path.startswith(k + self.sep)]
+            for k in stale:
+                del self._views[k]
 
-            return AttrFactory.create(item)
+    def __getitem__(self, path: str):
+        if type(path) is str and self.sep not in path and "[" not in path:
+            item = self._raw[path]  # plain key : skip the path parsing
+        else:
+            item = self._cut()[path]
+        if isinstance(item, (Mapping, list)):
+            if self._shared and self._unshare(path):
+                return self[path]
+            if self._exposed is None:
+                self._exposed = set()
+            self._exposed.add(self._topkey(path))
+        if type(item) is dict or (isinstance(item, Mapping) and not isinstance(item, NgsiDict)):
+            return self._view(path, item)
         return item
 
     def get(self, path: str, default=None):
         try:
-            item = super().__getitem__(path)
+            return self[path]
         except (KeyError, IndexError):
             return default
-        if isinstance(item, Mapping) and not isinstance(item, NgsiDict):
-            from ngsildclient.model.attr.factory import AttrFactory
 
-            return AttrFactory.create(item)
-        return item
+    def __setitem__(self, path: str, value):
+        if isinstance(value, NgsiDict):  # store plain JSON structures, natively handled by the JSON codecs
+            value = value.data
+        elif type(value) is list and value and isinstance(value[0], NgsiDict):  # multi-attribute
+            value = [v.data if isinstance(v, NgsiDict) else v for v in value]
+        self._invalidate(path)
+        if self._shared:
+            self._release(path)
+        if self._exposed:
+            self._exposed.discard(path)  # a top-level value replaced as a whole is no longer handed out
+        self._cut()[path] = value
+
+    def __delitem__(self, path: str):
+        self._invalidate(path)
+        if self._shared:
+            self._release(path)
+        if self._exposed:
+            self._exposed.discard(path)
+        del self._cut()[path]
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._cut()
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __bool__(self) -> bool:
+        return bool(self._raw)
+
+    def __eq__(self, other) -> bool:
+        return self._raw == (other._raw if isinstance(other, NgsiDict) else other)
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def keys(self):
+        return self._raw.keys()
+
+    def __deepcopy__(self, memo: dict):
+        d = self._wrap(None, self.name)
+        memo[id(self)] = d
+        d.data = deepcopy(self._raw, memo)
+        return d
 
     def __repr__(self):
-        return self.data.__repr__()
+        return self._raw.__repr__()
+
+    def __str__(self):
+        return str(self._raw)
 
     def __ior__(self, prop: Mapping):
         prop = prop.data if isinstance(prop, NgsiDict) else prop
-        self.data |= prop
+        if self._shared:
+            self._shared.difference_update(prop)
+        if self._exposed:
+            self._exposed.difference_update(prop)
+        self._raw |= prop
         return self
 
     def __mul__(self, n: int):
-        res = []
-        for _ in range(n):
-            res.append(NgsiDict.duplicate(self))
-        return res
+        return [self._cow() for _ in range(n)]
 
     __rmul__ = __mul__
 
@@ -120,13 +276,13 @@ class NgsiDict(Cut, MutableMapping):
 
     @classmethod
     def _from_json(cls, payload: str):
-        d = json.loads(payload)
+        d = jsoncodec.loads(payload)
         return cls(d)
 
     @classmethod
     def _load(cls, filename: str):
         with open(filename, "r") as fp:
-            d = json.load(fp)
+            d = jsoncodec.loads(fp.read())
             return cls(d)
 
     def to_dict(self) -> dict:
@@ -136,10 +292,9 @@ class NgsiDict(Cut, MutableMapping):
         """Returns the dict in json format"""
         if pattern:
             pattern = pattern.lower()
-        d = {k: v for k, v in self.items() if pattern in k.lower()} if pattern else self
-        return json.dumps(
-            d, ensure_ascii=False, indent=indent, default=lambda x: x.data if isinstance(x, NgsiDict) else str
-        )
+        raw = self._raw  # read only
+        d = {k: v for k, v in raw.items() if pattern in k.lower()} if pattern else raw
+        return jsoncodec.dumps(d, indent=indent)
 
     def pprint(self, *args, **kwargs) -> None:
         """Returns the dict pretty-json-formatted"""
@@ -147,13 +302,7 @@ class NgsiDict(Cut, MutableMapping):
 
     def _save(self, filename: str, indent=2):
         with open(filename, "w") as fp:
-            json.dump(
-                self,
-                fp,
-                ensure_ascii=False,
-                indent=indent,
-                default=lambda x: x.data if isinstance(x, NgsiDict) else str,
-            )
+            fp.write(jsoncodec.dumps(self._raw, indent=indent))
 
     @classmethod
     def mkprop(
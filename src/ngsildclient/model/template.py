@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Precompiled entity templates, to build many entities of the same shape.
+
+The layout of the entity is built and validated once, with the usual Entity methods.
+It is then compiled into a tree of builder functions : constant parts are copied from prebuilt dictionaries,
+and slots are filled with the given values, converted with a minimal per-slot conversion.
+No AttrValue, NgsiDict or date parsing is involved when instantiating the template.
+"""
+
+from __future__ import annotations
+
+import re
+
+from datetime import datetime
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from ngsildclient.utils import iso8601
+from ngsildclient.model.entity import Entity
+from ngsildclient.model.utils import id_prefixer
+
+Builder = Callable[[dict], Any]
+
+INDEX_PATTERN = re.compile(r"^(?P<name>[^\[]+)\[(?P<index>\d+)\]$")
+
+ID_SLOT = "@id"  # not a valid keyword argument, so it can't clash with the slots
+
+
+def _temporal(v: Any) -> str:
+    if isinstance(v, str):  # trusted
+        return v
+    if isinstance(v, datetime):
+        return iso8601.from_datetime(v)
+    return iso8601.parse(v)[0]
+
+
+def _object(v: Any) -> Union[str, List[str]]:
+    if isinstance(v, Entity):
+        return v.id
+    if isinstance(v, str):
+        return v if v.startswith("urn:ngsi-ld:") else f"urn:ngsi-ld:{v}"
+    return [_object(x) for x in v]
+
+
+def _geometry(v: Any) -> dict:
+    if isinstance(v, tuple) and len(v) == 2:
+        lat, lon = v
+        return {"type": "Point", "coordinates": [lon, lat]}
+    return v
+
+
+def _split(path: str) -> Tuple[Union[str, int], ...]:
+    keys = []
+    for key in path.split("."):
+        m = INDEX_PATTERN.match(key)
+        if m:
+            keys.extend((m["name"], int(m["index"])))
+        else:
+            keys.append(key)
+    return tuple(keys)
+
+
+def _resolve(node: Any, keys: Tuple[Union[str, int], ...]) -> Tuple[Tuple[Union[str, int], ...], Callable]:
+    """Return the full path of the value targeted by the slot, and its conversion function.
+
+    A path to an attribute targets its value : the value of a Property, the @value of a TemporalProperty,
+    the object of a Relationship or the geometry of a GeoProperty.
+    """
+    for key in keys:
+        node = node[key]
+    last = keys[-1]
+    if last == "observedAt" or last == "@value":
+        return keys, _temporal
+    if last == "object":
+        return keys, _object
+    if isinstance(node, Mapping) and "type" in node:
+        if node["type"] == "Relationship":
+            return keys + ("object",), _object
+        if node["type"] == "GeoProperty":
+            return keys + ("value",), _geometry
+        value = node.get("value")
+        if isinstance(value, Mapping) and "@type" in value:
+            return keys + ("value", "@value"), _temporal
+        return keys + ("value",), None
+    if isinstance(node, Mapping) and "coordinates" in node:
+        return keys, _geometry
+    return keys, None
+
+
+def _slot(name: str, convert: Callable = None) -> Builder:
+    if convert is None:
+        return lambda values: values[name]
+    return lambda values: convert(values[name])
+
+
+def _compile(node: Any, slots: Dict[Tuple[Union[str, int], ...], Builder], path: tuple = ()) -> Builder:
+    """Compile a node into a function that builds a fresh copy of it, with its slots filled.
+
+    Containers are copied from a prebuilt base holding the immutable leaves, keeping the order of the keys.
+    Only slots and nested containers are then built.
+    """
+    if path in slots:
+        return slots[path]
+    if not isinstance(node, (Mapping, list)):
+        return lambda _: node  # immutable leaf, shared by all instances
+    base = dict(node) if isinstance(node, Mapping) else list(node)
+    keys = node.keys() if isinstance(node, Mapping) else range(len(node))
+    children = [
+        (k, _compile(node[k], slots, path + (k,)))
+        for k in keys
+        if path + (k,) in slots or isinstance(node[k], (Mapping, list))
+    ]
+
+    def build(values: dict):
+        c = base.copy()
+        for k, f in children:
+            c[k] = f(values)
+        return c
+
+    return build
+
+
+class EntityTemplate:
+    """A compiled template to build many entities of the same shape.
+
+    Parameters
+    ----------
+    entity : Entity
+        A sample entity, built the usual way, with any nested, anchored or multi-attribute structure
+    slots : str
+        The variable parts, as slot name => path in the entity, i.e. no2="NO2", accuracy="NO2.accuracy".
+        A path to an attribute targets its value (a date string or datetime for a TemporalProperty,
+        an id for a Relationship, a (lat, lon) tuple or GeoJSON geometry for a GeoProperty).
+        Paths may target any other member, i.e. "NO2.observedAt", and multi-attribute instances, i.e. "speed[1]".
+
+    Example
+    -------
+    >>> from ngsildclient import *
+    >>> sample = Entity("AirQualityObserved", "RZ:Obsv0").obs()
+    >>> sample.prop("NO2", 22, unitcode="GP", observedat=iso8601.utcnow())
+    >>> template = EntityTemplate(sample, date="dateObserved", no2="NO2", observed="NO2.observedAt")
+    >>> now = iso8601.utcnow()
+    >>> e = template.new("RZ:Obsv4567", date=now, no2=23, observed=now)
+    """
+
+    def __init__(self, entity: Entity, **slots: str):
+        self.type: str = entity.type
+        self.slots = tuple(slots)
+        data = entity.to_dict()
+        compiled: Dict[Tuple[Union[str, int], ...], Builder] = {}
+        for name, path in slots.items():
+            try:
+                keys, convert = _resolve(data, _split(path))
+            except (KeyError, IndexError, TypeError):
+                raise ValueError(f"Invalid path {path!r} for slot {name!r}") from None
+            compiled[keys] = _slot(name, convert)
+        fqid = id_prefixer(self.type)
+        compiled[("id",)] = lambda values: fqid(values[ID_SLOT])
+        self._build: Builder = _compile(data, compiled)
+
+    def build(self, id: str, **values: Any) -> dict:
+        """Build a new entity as a plain dictionary, i.e. to be sent to the batch endpoints.
+
+        Parameters
+        ----------
+        id : str
+            The entity id, prefixed as it would be by Entity(type, id)
+        values : Any
+            The values of all the slots
+
+        Returns
+        -------
+        dict
+            The entity as a dictionary
+        """
+        values[ID_SLOT] = id
+        try:
+            return self._build(values)
+        except KeyError as e:
+            raise ValueError(f"Missing value for slot {e}") from None
+
+    def new(self, id: str, **values: Any) -> Entity:
+        """Build a new entity.
+
+        Parameters
+        ----------
+        id : str
+            The entity id, prefixed as it would be by Entity(type, id)
+        values : Any
+            The values of all the slots
+
+        Returns
+        -------
+        Entity
+            The new entity
+        """
+        values[ID_SLOT] = id
+        try:
+            return Entity._wrap(self._build(values))
+        except KeyError as e:
+            raise ValueError(f"Missing value for slot {e}") from None
@@ -12,24 +12,16 @@
 from __future__ import annotations
 
 import ngsildclient.model.entity as entity
-import ngsildclient.model.ngsidict as ngsidict
 from ngsildclient.utils import iso8601
 from ngsildclient.model.constants import TemporalType
 from ngsildclient.model.exceptions import NgsiDateFormatError
+from ngsildclient.settings import globalsettings
 
-from json import JSONEncoder
-from typing import Literal, Tuple
+from typing import Any, Callable, Literal, Tuple
 from collections.abc import Mapping
 from geojson import Point
 
 
-class NgsiEncoder(JSONEncoder):
-    def default(self, o):
-        if isinstance(o, (ngsidict.NgsiDict, entity.Entity)):
-            return o.to_dict()
-        return str
-
-
 def guess_ngsild_type(attr: Mapping) -> Literal["Property", "GeoProperty", "TemporalProperty", "Relationship"]:
     if not isinstance(attr, Mapping):  # not a NGSI-LD attribute
         raise ValueError("NGSI-LD attribute MUST be a JSON object")
@@ -69,6 +61,23 @@ def process_observedat(observedat):
     return date_str
 
 
+def id_prefixer(type: str) -> Callable[[Any], str]:
+    """Return a function that builds the fully qualified ids of the given entity type, as Entity(type, id) does.
+
+    The common case (a bare id) is handled by a string concatenation.
+    """
+    typeprefix = f"{type}:" if globalsettings.autoprefix else ""
+    prefix = f"urn:ngsi-ld:{typeprefix}"
+
+    def fqid(id: Any) -> str:
+        id = str(id)
+        if id.startswith("urn:") or (typeprefix and id.startswith(typeprefix)):
+            return entity.Entity._build_fully_qualified_id(type, id)
+        return prefix + id
+
+    return fqid
+
+
 def tuple_to_point(*coord, **kwargs) -> Point:
     if len(coord) == 1 and isinstance(coord, Tuple):
         return Point(coord[0])
@@ -30,6 +30,10 @@ class Settings:
     autoescape: bool = True  # for future use
     f_print: Callable = print_json if is_interactive() else print
     follower: LinkFollower = None
+    jsonlib: str = "json"
+    """The JSON backend : "json", "orjson", "msgspec" or "auto" to use the fastest one installed.
+    See utils.jsoncodec.
+    """
 
 
 globalsettings: Settings = Settings()
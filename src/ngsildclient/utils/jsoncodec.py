@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""The JSON codec used by all the serialization paths (entities, files, HTTP bodies and responses).
+
+The backend is selected through globalsettings.jsonlib :
+- "json" (default) : the standard library
+- "orjson" : https://github.com/ijl/orjson
+- "msgspec" : https://github.com/jcrist/msgspec
+- "auto" : the fastest one installed, falling back to the standard library
+
+JSON structures are encoded the same by all the backends.
+Other objects are encoded by the fallback hook (i.e. datetimes as str(dt)) with the standard library and orjson,
+whereas msgspec natively encodes some of them (i.e. datetimes as ISO 8601).
+
+Entities and NgsiDicts are unwrapped to their underlying dictionary before encoding,
+so that most payloads are plain JSON structures that the backends encode natively.
+The fallback hook is only called for leftover objects nested inside the structures.
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import json
+
+from collections.abc import Mapping
+from typing import Any, Dict, Union
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def unwrap(obj: Any) -> Any:
+    """Return the underlying dictionary of an Entity or a NgsiDict, the object itself otherwise.
+
+    The dictionary is returned as is, to be read only.
+    """
+    if type(obj) in (dict, list):
+        return obj
+    from ngsildclient.model.entity import Entity
+    from ngsildclient.model.ngsidict import NgsiDict
+
+    if isinstance(obj, Entity):
+        return obj.root._raw
+    if isinstance(obj, NgsiDict):
+        return obj._raw
+    return obj
+
+
+def _default(obj: Any) -> Any:
+    data = unwrap(obj)
+    if data is not obj:
+        return data
+    if isinstance(obj, Mapping):  # i.e. GeoJSON objects
+        return dict(obj)
+    return str(obj)
+
+
+class JsonCodec:
+    """The standard library codec, base class of the other backends."""
+
+    name = "json"
+
+    def dumps(self, obj: Any, *, indent: int = None) -> str:
+        return json.dumps(unwrap(obj), ensure_ascii=False, indent=indent, default=_default)
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Compact UTF-8 encoding, i.e. for HTTP bodies."""
+        return json.dumps(unwrap(obj), ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+    def loads(self, content: Union[str, bytes]) -> Any:
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        self._orjson = importlib.import_module("orjson")
+        # encoded by the fallback hook, as the standard library does
+        self._option = self._orjson.OPT_PASSTHROUGH_DATETIME | self._orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps(self, obj: Any, *, indent: int = None) -> str:
+        if indent not in (None, 2):  # the only indentation supported by orjson
+            return super().dumps(obj, indent=indent)
+        option = (self._option | self._orjson.OPT_INDENT_2) if indent else self._option
+        return self._orjson.dumps(unwrap(obj), default=_default, option=option).decode()
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self._orjson.dumps(unwrap(obj), default=_default, option=self._option)
+
+    def loads(self, content: Union[str, bytes]) -> Any:
+        return self._orjson.loads(content)
+
+
+class MsgspecCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        msgspec = importlib.import_module("msgspec")
+        self._encoder = msgspec.json.Encoder(enc_hook=_default)
+        self._decoder = msgspec.json.Decoder()
+        self._format = msgspec.json.format
+
+    def dumps(self, obj: Any, *, indent: int = None) -> str:
+        content = self._encoder.encode(unwrap(obj))
+        if indent:
+            content = self._format(content, indent=indent)
+        return content.decode()
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self._encoder.encode(unwrap(obj))
+
+    def loads(self, content: Union[str, bytes]) -> Any:
+        return self._decoder.decode(content)
+
+
+CODECS = {"json": JsonCodec, "orjson": OrjsonCodec, "msgspec": MsgspecCodec}
+
+_codecs: Dict[str, JsonCodec] = {}
+
+
+def get_codec(name: str = None) -> JsonCodec:
+    """Return the codec of the given backend, by default the one selected in globalsettings.
+
+    Raises
+    ------
+    ValueError
+        The backend is unknown
+    ModuleNotFoundError
+        The backend is not installed
+    """
+    if name is None:
+        from ngsildclient.settings import globalsettings
+
+        name = globalsettings.jsonlib
+    codec = _codecs.get(name)
+    if codec is None:
+        if name == "auto":
+            backend = next(b for b in BACKENDS if b == "json" or importlib.util.find_spec(b) is not None)
+            codec = get_codec(backend)
+        elif name in CODECS:
+            codec = CODECS[name]()
+        else:
+            raise ValueError(f"Unknown JSON backend {name}. Expected one of {BACKENDS} or auto.")
+        _codecs[name] = codec
+    return codec
+
+
+def dumps(obj: Any, *, indent: int = None) -> str:
+    return get_codec().dumps(obj, indent=indent)
+
+
+def dumpb(obj: Any) -> bytes:
+    return get_codec().dumpb(obj)
+
+
+def loads(content: Union[str, bytes]) -> Any:
+    return get_codec().loads(content)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+"""Read-ahead iterators.
+
+Items (i.e. pages of a paginated query) are fetched in the background into a bounded queue,
+while the consumer processes the current one. Network time and processing time overlap instead of adding up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, TypeVar
+
+from .sentinel import Sentinel
+
+T = TypeVar("T")
+
+
+class Done(Sentinel):
+    pass
+
+
+def prefetch(items: Iterable[T], size: int = 1) -> Iterator[T]:
+    """Iterate over items, fetching up to size items ahead in a background thread.
+
+    Exceptions raised while fetching are raised again on the consumer side.
+    Closing the iterator stops the background thread as soon as its pending fetch has completed.
+    """
+    q: queue.Queue = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((Done, e))
+        else:
+            put((Done, None))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is Done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+async def aprefetch(items: AsyncIterable[T], size: int = 1) -> AsyncIterator[T]:
+    """Iterate over items, fetching up to size items ahead in a background task.
+
+    Exceptions raised while fetching are raised again on the consumer side.
+    Closing the iterator cancels the background task.
+    """
+    q: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    async def produce():
+        try:
+            async for item in items:
+                await q.put((item, None))
+        except Exception as e:
+            await q.put((Done, e))
+        else:
+            await q.put((Done, None))
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await q.get()
+            if item is Done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        task.cancel()
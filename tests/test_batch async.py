@@ -9,14 +9,16 @@
 #
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
+import json
 import logging
+import httpx
 import pytest
 
 from pytest_httpx import HTTPXMock
 
 from ngsildclient.model.entity import Entity
 from ngsildclient.api.asyn.client import AsyncClient
-from ngsildclient.api.batch import BatchResult
+from ngsildclient.api.batch import BatchResult, AdaptiveBatchSize, RetryPolicy
 from .common import sample_entity
 
 logger = logging.getLogger(__name__)
@@ -141,6 +143,178 @@ async def test_api_batch_create_multi_ok(mocked_connected, httpx_mock: HTTPXMock
     assert r.errors == []
 
 
+@pytest.mark.asyncio
+async def test_api_batch_create_multi_concurrent_ok(mocked_connected, httpx_mock: HTTPXMock):
+    def created(request: httpx.Request):
+        return httpx.Response(status_code=201, json=[e["id"] for e in json.loads(request.content)])
+
+    httpx_mock.add_callback(created, method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/create/")
+    client = AsyncClient()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 8)]
+    r: BatchResult = await client.batch.create(rooms, batchsize=2, max_inflight=3)
+    assert len(httpx_mock.get_requests()) == 4
+    assert r.ok
+    assert r.n_ok == 7
+    assert r.success == [room.id for room in rooms]
+
+
+@pytest.mark.asyncio
+async def test_api_batch_upsert_async_generator_ok(mocked_connected, httpx_mock: HTTPXMock):
+    def upserted(request: httpx.Request):
+        return httpx.Response(status_code=201, json=[e["id"] for e in json.loads(request.content)])
+
+    async def rooms():
+        for i in range(1, 8):
+            yield Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i)
+
+    httpx_mock.add_callback(
+        upserted, method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/?options=replace"
+    )
+    client = AsyncClient()
+    r: BatchResult = await client.batch.upsert(rooms(), batchsize=3, max_inflight=2)
+    assert len(httpx_mock.get_requests()) == 3
+    assert r.ok
+    assert r.success == [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(1, 8)]
+
+
+@pytest.mark.asyncio
+async def test_api_batch_adaptive_upsert_413(mocked_connected, httpx_mock: HTTPXMock):
+    def upserted(request: httpx.Request):
+        entities = json.loads(request.content)
+        if len(entities) > 2:
+            return httpx.Response(status_code=413, text="Payload Too Large")
+        return httpx.Response(status_code=201, json=[e["id"] for e in entities])
+
+    async def rooms():
+        for i in range(1, 8):
+            yield Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i)
+
+    httpx_mock.add_callback(
+        upserted, method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/?options=replace"
+    )
+    client = AsyncClient()
+    sizer = AdaptiveBatchSize(4)
+    r: BatchResult = await client.batch.upsert(rooms(), batchsize=sizer)
+    assert r.ok
+    assert r.success == [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(1, 8)]
+    assert [len(json.loads(request.content)) for request in httpx_mock.get_requests()] == [4, 2, 2, 3, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_api_batch_create_retry_207(mocked_connected, httpx_mock: HTTPXMock):
+    internal_error = {"type": "https://uri.etsi.org/ngsi-ld/errors/InternalError", "status": 500}
+    attempts = []
+
+    def created(request: httpx.Request):
+        ids = [e["id"] for e in json.loads(request.content)]
+        attempts.append(ids)
+        if len(attempts) < 3:
+            content = {"success": ids[1:], "errors": [{"entityId": ids[0], "error": internal_error}]}
+            return httpx.Response(status_code=207, json=content)
+        return httpx.Response(status_code=201, json=ids)
+
+    httpx_mock.add_callback(created, method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/create/")
+    client = AsyncClient()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 4)]
+    r: BatchResult = await client.batch.create(rooms, retry=RetryPolicy(max_attempts=2, backoff=0.0))
+    assert attempts == [[room.id for room in rooms], [rooms[0].id]]
+    assert r.success == [rooms[1].id, rooms[2].id]
+    assert r.errors == [{"entityId": rooms[0].id, "error": internal_error}]
+    assert r.retries == 1
+
+
+@pytest.mark.asyncio
+async def test_api_batch_create_retry_207_then_503(mocked_connected, httpx_mock: HTTPXMock):
+    internal_error = {"type": "https://uri.etsi.org/ngsi-ld/errors/InternalError", "status": 500}
+    attempts = []
+
+    def created(request: httpx.Request):
+        ids = [e["id"] for e in json.loads(request.content)]
+        attempts.append(ids)
+        if len(attempts) > 1:
+            return httpx.Response(status_code=503, text="Service Unavailable")
+        content = {"success": ids[:2], "errors": [{"entityId": ids[2], "error": internal_error}]}
+        return httpx.Response(status_code=207, json=content)
+
+    httpx_mock.add_callback(created, method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/create/")
+    client = AsyncClient()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(3)]
+    r: BatchResult = await client.batch.create(rooms, retry=RetryPolicy(max_attempts=3, backoff=0.0))
+    assert attempts == [[room.id for room in rooms], [rooms[2].id], [rooms[2].id]]
+    assert r.success == [rooms[0].id, rooms[1].id]
+    assert [e["entityId"] for e in r.errors] == [rooms[2].id]
+    assert r.errors[0]["error"]["status"] == 503
+    assert r.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_api_batch_delete_where_purge(mocked_connected, httpx_mock: HTTPXMock):
+    ids = [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(25)]
+    bad_request = {"type": "https://uri.etsi.org/ngsi-ld/errors/BadRequestData", "status": 400}
+
+    def entities(request: httpx.Request):
+        params = request.url.params
+        offset, limit = int(params.get("offset", 0)), int(params["limit"])
+        headers = {"NGSILD-Results-Count": str(len(ids))} if params.get("count") == "true" else {}
+        content = [{"id": eid, "type": "RoomObserved"} for eid in ids[offset : offset + limit]]
+        return httpx.Response(status_code=200, headers=headers, json=content)
+
+    def deleted(request: httpx.Request):
+        todo = json.loads(request.content)
+        errors = [{"entityId": eid, "error": bad_request} for eid in todo if eid.endswith("Room2")]
+        success = [eid for eid in todo if not eid.endswith("Room2")]
+        for eid in success:
+            ids.remove(eid)
+        return httpx.Response(status_code=207, json={"success": success, "errors": errors})
+
+    httpx_mock.add_callback(entities, method="GET")
+    httpx_mock.add_callback(deleted, method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/delete/")
+    client = AsyncClient()
+    progress = []
+    r: BatchResult = await client.delete_where(
+        type="RoomObserved", batchsize=4, max_inflight=2, callback=progress.append
+    )
+    assert ids == ["urn:ngsi-ld:RoomObserved:Room2"]
+    assert r.n_ok == 24
+    assert r.errors == [{"entityId": "urn:ngsi-ld:RoomObserved:Room2", "error": bad_request}]
+    assert progress[0].total == 25
+    assert progress[-1].deleted == 24 and progress[-1].failed == 1
+    gets = [req for req in httpx_mock.get_requests() if req.method == "GET" and "type" in req.url.params]
+    assert gets and all(req.url.params["pick"] == "id" for req in gets)
+
+
+@pytest.mark.asyncio
+async def test_api_batch_update_changed(mocked_connected, httpx_mock: HTTPXMock):
+    httpx_mock.add_response(
+        method="POST", url="http://localhost:1026/ngsi-ld/v1/entityOperations/update/", status_code=204
+    )
+    httpx_mock.add_response(
+        method="DELETE",
+        url="http://localhost:1026/ngsi-ld/v1/entities/urn:ngsi-ld:RoomObserved:Room2/attrs/pressure",
+        status_code=204,
+    )
+    client = AsyncClient()
+    rooms = [
+        Entity.from_broker(
+            {
+                "id": f"urn:ngsi-ld:RoomObserved:Room{i}",
+                "type": "RoomObserved",
+                "temperature": {"type": "Property", "value": 20},
+                "pressure": {"type": "Property", "value": 720},
+            },
+            track=True,
+        )
+        for i in range(3)
+    ]
+    rooms[1]["temperature"].value = 21
+    rooms[2].rm("pressure")
+    r: BatchResult = await client.update_changed(rooms)
+    assert r.success == ["urn:ngsi-ld:RoomObserved:Room1"]
+    body = json.loads(httpx_mock.get_requests(method="POST")[0].content)
+    assert [e["id"] for e in body] == ["urn:ngsi-ld:RoomObserved:Room1"]
+    assert not any(room.dirty for room in rooms)
+
+
 @pytest.mark.asyncio
 async def test_api_batch_upsert_ok_201(mocked_connected, httpx_mock: HTTPXMock):
     httpx_mock.add_response(
@@ -9,13 +9,15 @@
 #
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
+import json
 import logging
 import pytest
 from pytest_mock.plugin import MockerFixture
 from requests_mock import Mocker
 
 from ngsildclient.api.client import Client, Entity
-from ngsildclient.api.batch import BatchResult
+from ngsildclient.api.batch import BatchResult, AdaptiveBatchSize, RetryPolicy, chunked, payload, entity_id
+from ngsildclient.api.purge import PURGE_MAX_INFLIGHT
 from .common import sample_entity
 
 logger = logging.getLogger(__name__)
@@ -135,6 +137,260 @@ def test_api_batch_create_multi_ok(mocked_connected, requests_mock: Mocker):
     assert r.errors == []
 
 
+def test_api_batch_create_multi_parallel_ok(mocked_connected, requests_mock: Mocker):
+    requests_mock.post(
+        "http://localhost:1026/ngsi-ld/v1/entityOperations/create/",
+        status_code=201,
+        json=lambda request, context: [e["id"] for e in request.json()],
+    )
+    client = Client()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 8)]
+    r: BatchResult = client.batch.create(rooms, batchsize=2, max_inflight=3)
+    assert len([req for req in requests_mock.request_history if req.method == "POST"]) == 4
+    assert r.ok
+    assert r.n_ok == 7
+    assert r.success == [room.id for room in rooms]
+    assert len(r.elapsed) == 4
+
+
+def test_api_batch_upsert_generator_ok(mocked_connected, requests_mock: Mocker):
+    requests_mock.post(
+        "http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/",
+        status_code=201,
+        json=lambda request, context: [e["id"] for e in request.json()],
+    )
+    client = Client()
+    rooms = (Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 8))
+    r: BatchResult = client.upsert(rooms, batchsize=3, max_inflight=2)
+    assert len([req for req in requests_mock.request_history if req.method == "POST"]) == 3
+    assert r.ok
+    assert r.success == [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(1, 8)]
+
+
+def test_api_batch_adaptive_chunked_payload():
+    small = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 5)]
+    big = [Entity("Building", f"Building{i}").prop("description", "x" * 1000) for i in range(1, 5)]
+    sizer = AdaptiveBatchSize(10, max_payload=2500)
+    chunks = list(chunked(small + big, sizer))
+    assert [len(chunk) for chunk in chunks] == [5, 2, 1]
+    assert all(len(chunk.body) <= 2500 for chunk in chunks)
+    assert [e["id"] for e in json.loads(chunks[0].body)] == [e.id for e in (small + big)[:5]]
+
+
+def test_api_batch_payload():
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("name", f"Pièce {i}") for i in range(1, 4)]
+    body = payload(rooms)
+    assert isinstance(body, bytes)
+    assert json.loads(body) == [room.to_dict() for room in rooms]
+    assert payload(list(chunked(rooms, AdaptiveBatchSize(10)))[0]) == body
+    assert json.loads(payload(rooms, entity_id)) == [room.id for room in rooms]
+    assert payload([]) == b"[]"
+
+
+def test_api_batch_adaptive_feedback():
+    sizer = AdaptiveBatchSize(8, maxsize=12, target_latency=0.5)
+    sizer.feedback(8, 0.1)
+    assert sizer.size == 10
+    sizer.feedback(4, 0.1)  # chunk bounded by the payload
+    assert sizer.size == 10
+    sizer.feedback(10, 0.1)
+    assert sizer.size == 12
+    sizer.feedback(12, 1.0)
+    assert sizer.size == 9
+    sizer.shrink()
+    assert sizer.size == 4
+
+
+def test_api_batch_adaptive_create_413(mocked_connected, requests_mock: Mocker):
+    def created(request, context):
+        entities = request.json()
+        if len(entities) > 2:
+            context.status_code = 413
+            return "Payload Too Large"
+        context.status_code = 201
+        return json.dumps([e["id"] for e in entities])
+
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/create/", text=created)
+    client = Client()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 8)]
+    sizer = AdaptiveBatchSize(8)
+    r: BatchResult = client.create(rooms, batchsize=sizer)
+    assert r.ok
+    assert r.success == [room.id for room in rooms]
+    assert sizer.size == 3
+    posts = [req for req in requests_mock.request_history if req.method == "POST"]
+    assert [len(req.json()) for req in posts] == [7, 3, 1, 2, 4, 2, 2]
+
+
+def test_api_batch_upsert_retry_207(mocked_connected, requests_mock: Mocker):
+    def error(entityId: str, pd_type: str):
+        return {
+            "entityId": entityId,
+            "error": {"type": f"https://uri.etsi.org/ngsi-ld/errors/{pd_type}", "status": 500},
+        }
+
+    attempts = []
+
+    def upserted(request, context):
+        ids = [e["id"] for e in request.json()]
+        attempts.append(ids)
+        if len(attempts) > 1:
+            context.status_code = 201
+            return ids
+        context.status_code = 207
+        return {
+            "success": ids[0:1] + ids[3:4],
+            "errors": [error(ids[1], "InternalError"), error(ids[2], "BadRequestData"), error(ids[4], "InternalError")],
+        }
+
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/", json=upserted)
+    client = Client()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 6)]
+    r: BatchResult = client.upsert(rooms, retry=RetryPolicy(backoff=0.0))
+    assert attempts[1] == [rooms[1].id, rooms[4].id]
+    assert r.success == [rooms[0].id, rooms[3].id, rooms[1].id, rooms[4].id]
+    assert [e["entityId"] for e in r.errors] == [rooms[2].id]
+    assert r.retries == 1
+
+
+def test_api_batch_upsert_retry_207_without_entity_id(mocked_connected, requests_mock: Mocker):
+    internal_error = {"type": "https://uri.etsi.org/ngsi-ld/errors/InternalError", "status": 500}
+    attempts = []
+
+    def upserted(request, context):
+        ids = [e["id"] for e in request.json()]
+        attempts.append(ids)
+        if len(attempts) > 1:
+            context.status_code = 201
+            return ids
+        context.status_code = 207
+        return {
+            "success": ids[2:],
+            "errors": [{"entityId": ids[0], "error": internal_error}, {"error": internal_error}],
+        }
+
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/", json=upserted)
+    client = Client()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 4)]
+    r: BatchResult = client.upsert(rooms, retry=RetryPolicy(backoff=0.0))
+    assert attempts[1] == [rooms[0].id]
+    assert r.success == [rooms[2].id, rooms[0].id]
+    assert r.errors == [{"error": internal_error}]
+
+
+def test_api_batch_upsert_retry_207_then_400(mocked_connected, requests_mock: Mocker):
+    internal_error = {"type": "https://uri.etsi.org/ngsi-ld/errors/InternalError", "status": 500}
+    bad_request = {
+        "type": "https://uri.etsi.org/ngsi-ld/errors/BadRequestData",
+        "title": "Bad Request",
+        "status": 400,
+        "detail": "invalid entity",
+    }
+    attempts = []
+
+    def upserted(request, context):
+        ids = [e["id"] for e in request.json()]
+        attempts.append(ids)
+        if len(attempts) > 1:
+            context.status_code = 400
+            return bad_request
+        context.status_code = 207
+        return {"success": ids[:2], "errors": [{"entityId": ids[2], "error": internal_error}]}
+
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/", json=upserted)
+    client = Client()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(3)]
+    r: BatchResult = client.upsert(rooms, retry=RetryPolicy(backoff=0.0))
+    assert attempts[1] == [rooms[2].id]
+    assert r.success == [rooms[0].id, rooms[1].id]
+    assert r.errors == [{"entityId": rooms[2].id, "error": bad_request}]
+    assert r.retries == 1
+
+
+def test_api_batch_upsert_retry_503(mocked_connected, requests_mock: Mocker):
+    requests_mock.register_uri(
+        "POST",
+        "http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/",
+        [
+            {"status_code": 503, "text": "Service Unavailable"},
+            {"status_code": 503, "text": "Service Unavailable"},
+            {"status_code": 204},
+        ],
+    )
+    client = Client()
+    rooms = [Entity("RoomObserved", f"Room{i}").prop("temperature", 20 + i) for i in range(1, 4)]
+    r: BatchResult = client.upsert(rooms, retry=RetryPolicy(max_attempts=3, backoff=0.0))
+    assert r.ok
+    assert r.success == [room.id for room in rooms]
+    assert r.retries == 2
+
+
+def test_api_batch_retry_policy_delay():
+    policy = RetryPolicy(backoff=1.0, max_backoff=5.0, jitter=False)
+    assert [policy.delay(attempt) for attempt in range(1, 5)] == [1.0, 2.0, 4.0, 5.0]
+    policy = RetryPolicy(backoff=1.0)
+    assert all(0.0 <= policy.delay(3) <= 4.0 for _ in range(10))
+
+
+def test_api_batch_delete_where_purge(mocked_connected, requests_mock: Mocker):
+    ids = [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(25)]
+    bad_request = {"type": "https://uri.etsi.org/ngsi-ld/errors/BadRequestData", "status": 400}
+
+    def entities(request, context):
+        if request.qs.get("count") == ["true"]:
+            context.headers["NGSILD-Results-Count"] = str(len(ids))
+        offset, limit = int(request.qs.get("offset", [0])[0]), int(request.qs["limit"][0])
+        return [{"id": eid, "type": "RoomObserved"} for eid in ids[offset : offset + limit]]
+
+    def deleted(request, context):
+        todo = request.json()
+        errors = [{"entityId": eid, "error": bad_request} for eid in todo if eid.endswith("Room2")]
+        success = [eid for eid in todo if not eid.endswith("Room2")]
+        for eid in success:
+            ids.remove(eid)
+        context.status_code = 207
+        return {"success": success, "errors": errors}
+
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/entities", json=entities)
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/delete/", json=deleted)
+    client = Client()
+    progress = []
+    r: BatchResult = client.delete_where(type="RoomObserved", batchsize=4, max_inflight=2, callback=progress.append)
+    assert ids == ["urn:ngsi-ld:RoomObserved:Room2"]
+    assert r.n_ok == 24
+    assert r.errors == [{"entityId": "urn:ngsi-ld:RoomObserved:Room2", "error": bad_request}]
+    assert progress[0].total == 25
+    assert progress[-1].deleted == 24 and progress[-1].failed == 1
+    gets = [req for req in requests_mock.request_history if req.method == "GET" and "type" in req.qs]
+    assert all(req.qs["options"] == ["keyvalues"] and req.qs["pick"] == ["id"] for req in gets)
+
+
+def test_api_batch_drop_without_pick(mocked_connected, requests_mock: Mocker):
+    ids = [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(10)]
+    bad_request = {"type": "https://uri.etsi.org/ngsi-ld/errors/BadRequestData", "title": "Unknown URI parameter"}
+
+    def entities(request, context):
+        if "pick" in request.qs:  # a broker prior to NGSI-LD 1.8
+            context.status_code = 400
+            return bad_request
+        limit = int(request.qs["limit"][0])
+        return [{"id": eid, "type": "RoomObserved", "temperature": 20} for eid in ids[:limit]]
+
+    def deleted(request, context):
+        for eid in request.json():
+            ids.remove(eid)
+        context.status_code = 204
+
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/entities", json=entities)
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/delete/", json=deleted)
+    client = Client()
+    client.drop("RoomObserved", batchsize=2)
+    assert ids == []
+    gets = [req for req in requests_mock.request_history if req.method == "GET" and "type" in req.qs]
+    assert "pick" in gets[0].qs and all("pick" not in req.qs for req in gets[1:])
+    assert int(gets[1].qs["limit"][0]) == 2 * PURGE_MAX_INFLIGHT  # concurrent deletions by default
+
+
 def test_api_batch_upsert_ok_201(mocked_connected, requests_mock):
     requests_mock.post(
         "http://localhost:1026/ngsi-ld/v1/entityOperations/upsert/",
@@ -220,6 +476,40 @@ def test_api_batch_update_ok_204(mocked_connected, requests_mock):
     ]
 
 
+def test_api_batch_update_changed(mocked_connected, requests_mock: Mocker):
+    bad_request = {"type": "https://uri.etsi.org/ngsi-ld/errors/BadRequestData", "status": 400}
+    bodies = []
+
+    def updated(request, context):
+        bodies.append(request.json())
+        context.status_code = 207
+        ids = [e["id"] for e in bodies[-1]]
+        return json.dumps({"success": ids[1:], "errors": [{"entityId": ids[0], "error": bad_request}]})
+
+    requests_mock.post("http://localhost:1026/ngsi-ld/v1/entityOperations/update/", text=updated)
+    client = Client()
+    rooms = [
+        Entity.from_broker(
+            {
+                "id": f"urn:ngsi-ld:RoomObserved:Room{i}",
+                "type": "RoomObserved",
+                "temperature": {"type": "Property", "value": 20},
+                "pressure": {"type": "Property", "value": 720},
+            },
+            track=True,
+        )
+        for i in range(4)
+    ]
+    for room in rooms[1:]:
+        room["temperature"].value = 21
+    r: BatchResult = client.update_changed(rooms)
+    assert r.success == ["urn:ngsi-ld:RoomObserved:Room2", "urn:ngsi-ld:RoomObserved:Room3"]
+    assert r.n_err == 1
+    assert [e["id"] for e in bodies[0]] == [room.id for room in rooms[1:]]
+    assert all("pressure" not in e and e["temperature"]["value"] == 21 for e in bodies[0])
+    assert [room.dirty for room in rooms] == [False, True, False, False]
+
+
 def test_api_batch_delete_ok_204(mocked_connected, requests_mock):
     requests_mock.post(
         "http://localhost:1026/ngsi-ld/v1/entityOperations/delete/",
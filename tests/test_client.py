@@ -10,6 +10,9 @@
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
 import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from ngsildclient.api.client import Client, Vendor
 
 logger = logging.getLogger(__name__)
@@ -32,3 +35,40 @@ def test_api_guess_broker(mocked_connected, requests_mock):
     logger.info(f"{vendor=}")
     assert vendor == Vendor.ORIONLD
     assert version == "post-v0.8.1"
+
+
+def test_api_session_per_thread(mocked_connected):
+    client = Client(tenant="openiot")
+    client._ensure_poolsize(4)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sessions = list(executor.map(lambda _: client.session, range(2)))
+    for session in sessions:
+        assert session is not client.session
+        assert session.headers["NGSILD-Tenant"] == "openiot"
+        assert session.get_adapter("http://localhost:1026") is client.session.get_adapter("http://localhost:1026")
+    closed = []
+    for session in sessions:
+        session.close = lambda s=session: closed.append(s)
+    client.close()
+    assert set(closed) == set(sessions)
+
+
+def test_api_ensure_poolsize_keeps_custom_adapter(mocked_connected):
+    client = Client()
+    adapter = HTTPAdapter(max_retries=3)
+    client.session.mount("http://", adapter)
+    client._ensure_poolsize(32)
+    assert client.session.get_adapter("http://localhost:1026") is adapter
+    assert adapter._pool_maxsize == 32 and adapter.max_retries.total == 3
+
+
+def test_api_set_session(mocked_connected):
+    client = Client()
+    session = requests.Session()
+    client.session = session
+    assert client.session is session
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        worker = executor.submit(lambda: client.session).result()
+    assert worker is not session and worker.get_adapter("http://localhost:1026") is session.get_adapter(
+        "http://localhost:1026"
+    )
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+from ngsildclient.model.entity import Entity
+from ngsildclient.model.constants import MultAttrValue
+from ngsildclient.model.diff import Change, _strip, diff
+from .common import sample_entity
+
+
+def test_diff_identical():
+    d = sample_entity.diff(sample_entity.dup())
+    assert not d
+    assert d.patch() == {"id": sample_entity.id, "type": sample_entity.type, "@context": sample_entity.ctx}
+
+
+def test_diff_attributes():
+    old = sample_entity
+    new = old.dup()
+    new["NO2.value"] = 23
+    new.rm("refPointOfInterest")
+    new.prop("PM10", 12)
+    d = old.diff(new)
+    assert d.changes == [
+        Change("remove", "refPointOfInterest", old["refPointOfInterest"].to_dict()),
+        Change("replace", "NO2.value", 22, 23),
+        Change("add", "PM10", None, {"type": "Property", "value": 12}),
+    ]
+    assert set(d.patch()) == {"id", "type", "@context", "NO2", "PM10"}
+    assert list(d.removed) == ["refPointOfInterest"]
+    assert d.apply(old.dup()) == new
+
+
+def test_diff_multi_attributes():
+    m = MultAttrValue()
+    m.add(55, datasetid="Dataset:GPS")
+    m.add(54.5, datasetid="Dataset:Radar")
+    m.add(56, datasetid="Dataset:Odometer")
+    old = Entity("Vehicle", "A4567").prop("speed", m)
+    m = MultAttrValue()
+    m.add(55, datasetid="Dataset:GPS")
+    m.add(60, datasetid="Dataset:Radar")
+    m.add(50)
+    new = Entity("Vehicle", "A4567").prop("speed", m)
+    d = diff(old, new)
+    assert [str(c) for c in d.changes] == [
+        "~ speed[urn:ngsi-ld:Dataset:Radar].value : 54.5 -> 60",
+        "+ speed[] = {'type': 'Property', 'value': 50}",
+        "- speed[urn:ngsi-ld:Dataset:Odometer]",
+    ]
+    assert d.changed["speed"] == [
+        {"type": "Property", "value": 60, "datasetId": "urn:ngsi-ld:Dataset:Radar"},
+        {"type": "Property", "value": 50},
+    ]
+    assert d.removed_instances == {"speed": ["urn:ngsi-ld:Dataset:Odometer"]}
+    assert d.apply(old.dup()) == new
+
+
+def test_diff_ignores_system_attributes():
+    old = sample_entity.dup().to_dict()
+    old["createdAt"] = old["modifiedAt"] = "2022-01-01T00:00:00Z"
+    old["NO2"]["modifiedAt"] = "2022-01-01T12:00:00Z"
+    new = sample_entity.dup()
+    assert not diff(old, new)
+    d = diff(old, new, sysattrs=True)
+    assert {(c.op, c.path) for c in d.changes} == {
+        ("remove", "createdAt"),
+        ("remove", "modifiedAt"),
+        ("remove", "NO2.modifiedAt"),
+    }
+
+
+def test_diff_keeps_system_keys_in_values():
+    old = Entity("Event", "E1").prop("log", {"createdAt": "2022-01-01T00:00:00Z"}).to_dict()
+    new = Entity("Event", "E1").prop("log", {"createdAt": "2022-02-01T00:00:00Z"}).to_dict()
+    new["log"]["modifiedAt"] = "2022-02-01T00:00:00Z"
+    d = diff(old, new)
+    assert d.changes == [Change("replace", "log.value.createdAt", "2022-01-01T00:00:00Z", "2022-02-01T00:00:00Z")]
+    assert d.changed["log"] == {"type": "Property", "value": {"createdAt": "2022-02-01T00:00:00Z"}}
+
+
+def test_diff_strip_keeps_unchanged_attributes():
+    old = sample_entity.dup().to_dict()
+    old["NO2"]["accuracy"] = {"type": "Property", "value": 0.95, "modifiedAt": "2022-01-01T12:00:00Z"}
+    stripped = _strip(old["NO2"])
+    assert stripped["accuracy"] == {"type": "Property", "value": 0.95}
+    assert stripped["value"] is old["NO2"]["value"]
+    assert _strip(old["refPointOfInterest"]) is old["refPointOfInterest"]
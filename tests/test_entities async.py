@@ -11,6 +11,7 @@
 
 import pytest
 import logging
+import httpx
 
 from pytest_httpx import HTTPXMock
 from pytest_mock.plugin import MockerFixture
@@ -199,3 +200,73 @@ async def test_api_update_nonexistent_entity(mocker: MockerFixture):
     mocker.patch.object(client._entities, "exists", return_value=False)
     res = await client._entities.update(sample_entity)
     assert res == False
+
+
+@pytest.mark.asyncio
+async def test_api_query_concurrent(httpx_mock: HTTPXMock):
+    rooms = [
+        {
+            "id": f"urn:ngsi-ld:RoomObserved:Room{i}",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "value": i},
+        }
+        for i in range(25)
+    ]
+
+    def entities(request: httpx.Request):
+        params = request.url.params
+        offset, limit = int(params.get("offset", 0)), int(params["limit"])
+        headers = {"NGSILD-Results-Count": str(len(rooms))} if params.get("count") == "true" else {}
+        return httpx.Response(status_code=200, headers=headers, json=rooms[offset : offset + limit])
+
+    httpx_mock.add_callback(entities, method="GET")
+    client = AsyncClient()
+    result = await client.query(type="RoomObserved", limit=10, max_inflight=3)
+    assert [e.id for e in result] == [room["id"] for room in rooms]
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_api_query_generator_count_first_page(httpx_mock: HTTPXMock):
+    rooms = [
+        {
+            "id": f"urn:ngsi-ld:RoomObserved:Room{i}",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "value": i},
+        }
+        for i in range(20)
+    ]
+
+    def entities(request: httpx.Request):
+        params = request.url.params
+        offset, limit = int(params.get("offset", 0)), int(params["limit"])
+        headers = {"NGSILD-Results-Count": str(len(rooms))} if params.get("count") == "true" else {}
+        return httpx.Response(status_code=200, headers=headers, json=rooms[offset : offset + limit])
+
+    httpx_mock.add_callback(entities, method="GET")
+    client = AsyncClient()
+    result = [entity async for entity in client.query_generator(type="RoomObserved", limit=10)]
+    assert [e.id for e in result] == [room["id"] for room in rooms]
+    assert len(httpx_mock.get_requests()) == 2  # no count request, no trailing empty page
+
+
+@pytest.mark.asyncio
+async def test_api_query_generator_keyvalues(httpx_mock: HTTPXMock):
+    parkings = [
+        {"id": f"urn:ngsi-ld:OffStreetParking:Parking{i}", "type": "OffStreetParking", "availableSpotNumber": i}
+        for i in range(3)
+    ]
+    httpx_mock.add_response(
+        method="GET",
+        url="http://localhost:1026/ngsi-ld/v1/entities?limit=100&count=true&type=OffStreetParking&attrs=availableSpotNumber&options=keyValues",
+        headers={"NGSILD-Results-Count": "3"},
+        json=parkings,
+    )
+    client = AsyncClient()
+    result = [
+        e
+        async for e in client.query_generator(
+            type="OffStreetParking", attrs=["availableSpotNumber"], format="keyValues"
+        )
+    ]
+    assert result == parkings
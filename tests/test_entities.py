@@ -9,16 +9,23 @@
 #
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
+import json
 import logging
+import time
 import pytest
+from typing import Callable, List
 from pytest_mock.plugin import MockerFixture
 
 from ngsildclient.api.client import Client
+from ngsildclient.model.entity import Entity
+from ngsildclient.api.constants import AttrsFormat
 from ngsildclient.api.exceptions import (
     NgsiAlreadyExistsError,
+    NgsiHttpError,
     NgsiResourceNotFoundError,
     ProblemDetails,
 )
+from ngsildclient.utils import jsoncodec
 from .common import sample_entity
 
 logger = logging.getLogger(__name__)
@@ -93,6 +100,20 @@ def test_api_retrieve_error_not_found(mocked_connected, requests_mock):
     assert excinfo.value.problemdetails.extension == {}
 
 
+def test_api_retrieve_error_decoded_by_codec(mocked_connected, requests_mock, mocker: MockerFixture):
+    url = "http://localhost:1026/ngsi-ld/v1/entities/urn:ngsi-ld:AirQualityObserved:RZ:Obsv4568"
+    requests_mock.get(url, status_code=404, json={"type": "https://uri.etsi.org/ngsi-ld/errors/ResourceNotFound"})
+    loads = mocker.spy(jsoncodec, "loads")
+    client = Client()
+    with pytest.raises(NgsiResourceNotFoundError):
+        client.entities.get("urn:ngsi-ld:AirQualityObserved:RZ:Obsv4568")
+    assert loads.call_count == 1
+    requests_mock.get(url, status_code=502, text="Bad Gateway")
+    with pytest.raises(NgsiHttpError) as excinfo:
+        client.entities.get("urn:ngsi-ld:AirQualityObserved:RZ:Obsv4568")
+    assert excinfo.value.statuscode == 502
+
+
 def test_api_exists(mocked_connected, requests_mock):
     requests_mock.get(
         "http://localhost:1026/ngsi-ld/v1/entities/urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567",
@@ -180,3 +201,135 @@ def test_api_update_nonexistent_entity(mocked_connected, mocker: MockerFixture):
     mocker.patch.object(client._entities, "exists", return_value=False)
     res = client._entities.update(sample_entity)
     assert res is False
+
+
+@pytest.fixture
+def serve_rooms(requests_mock) -> Callable[..., List[dict]]:
+    """Serve 25 rooms by pages, the first pages coming back last. Return the rooms."""
+
+    def serve(count: bool = True) -> List[dict]:
+        rooms = [
+            {
+                "id": f"urn:ngsi-ld:RoomObserved:Room{i}",
+                "type": "RoomObserved",
+                "temperature": {"type": "Property", "value": i},
+            }
+            for i in range(25)
+        ]
+
+        def entities(request, context):
+            if count and request.qs.get("count") == ["true"]:
+                context.headers["NGSILD-Results-Count"] = str(len(rooms))
+            offset, limit = int(request.qs.get("offset", [0])[0]), int(request.qs["limit"][0])
+            time.sleep(0.01 * (3 - offset // limit))
+            return rooms[offset : offset + limit]
+
+        requests_mock.get("http://localhost:1026/ngsi-ld/v1/entities", json=entities)
+        return rooms
+
+    return serve
+
+
+def test_api_query_parallel(mocked_connected, serve_rooms):
+    rooms = serve_rooms()
+    client = Client()
+    result = client.query(type="RoomObserved", limit=10, max_inflight=3)
+    assert [e.id for e in result] == [room["id"] for room in rooms]
+
+
+def test_api_query_generator_prefetch(mocked_connected, serve_rooms):
+    rooms = serve_rooms()
+    client = Client()
+    pages = list(client.query_generator(type="RoomObserved", limit=10, batch=True, prefetch=2))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [e.id for page in pages for e in page] == [room["id"] for room in rooms]
+
+
+def test_api_query_generator_without_count(mocked_connected, serve_rooms, requests_mock):
+    rooms = serve_rooms(count=False)  # the broker ignores the count option
+    client = Client()
+    result = list(client.query_generator(type="RoomObserved", gq="near;maxDistance==2000", limit=10))
+    assert len(result) == len(rooms)
+    gets = [req for req in requests_mock.request_history if req.path == "/ngsi-ld/v1/entities"]
+    assert len(gets) == 3  # stop on the short page, no count request
+    assert all(req.qs["limit"] == ["10"] and "geoq" in req.qs for req in gets)
+
+
+def test_api_query_generator_track(mocked_connected, serve_rooms):
+    serve_rooms()
+    client = Client()
+    assert not any(e.tracked for e in client.query_generator(type="RoomObserved", limit=10))
+    assert all(e.tracked for e in client.query_generator(type="RoomObserved", limit=10, track=True))
+
+
+def test_api_query_projection_keyvalues(mocked_connected, requests_mock):
+    parkings = [
+        {"id": f"urn:ngsi-ld:OffStreetParking:Parking{i}", "type": "OffStreetParking", "availableSpotNumber": i}
+        for i in range(3)
+    ]
+    requests_mock.get(
+        "http://localhost:1026/ngsi-ld/v1/entities?type=OffStreetParking&attrs=availableSpotNumber&options=keyValues",
+        headers={"NGSILD-Results-Count": "3"},
+        json=parkings,
+    )
+    client = Client()
+    result = client.query(type="OffStreetParking", attrs=["availableSpotNumber"], format=AttrsFormat.KEYVALUES)
+    assert result == parkings
+
+
+def test_api_retrieve_projection_asdict(mocked_connected, requests_mock):
+    payload = {
+        "id": "urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567",
+        "type": "AirQualityObserved",
+        "NO2": {"type": "Property", "value": 22, "unitCode": "GP"},
+    }
+    requests_mock.get(
+        "http://localhost:1026/ngsi-ld/v1/entities/urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567?attrs=NO2",
+        json=payload,
+    )
+    client = Client()
+    res = client.get("urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567", attrs=["NO2"], asdict=True)
+    assert res == payload
+
+
+def test_api_get_attrs_keeps_params(mocked_connected, requests_mock):
+    url = "http://localhost:1026/ngsi-ld/v1/entities/urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567"
+    requests_mock.get(url, json={"id": "urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567", "type": "AirQualityObserved"})
+    client = Client()
+    params = {"lang": "fr"}
+    client.get("urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567", attrs=["NO2"], params=params, asdict=True)
+    client.get("urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567", params=params, asdict=True)
+    assert params == {"lang": "fr"}
+    assert requests_mock.request_history[-1].qs == {"lang": ["fr"]}
+
+
+def test_api_update_changed(mocked_connected, requests_mock):
+    url = "http://localhost:1026/ngsi-ld/v1/entities/urn:ngsi-ld:RoomObserved:Room1"
+    requests_mock.patch(f"{url}/attrs", status_code=204)
+    requests_mock.post(f"{url}/attrs", status_code=204)
+    requests_mock.delete(f"{url}/attrs/humidity", status_code=204)
+    client = Client()
+    room = Entity.from_broker(
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "value": 20},
+            "pressure": {"type": "Property", "value": 720},
+            "humidity": {"type": "Property", "value": 40},
+        },
+        track=True,
+    )
+    assert client.update_changed(room) == False
+    room["temperature.value"] = 21
+    room.prop("luminosity", 300)
+    room.rm("humidity")
+    assert client.update_changed(room) == True
+    patch, post, delete = requests_mock.request_history[-3:]
+    assert patch.method == "PATCH"
+    assert json.loads(patch.body) == {
+        "temperature": {"type": "Property", "value": 21},
+        "@context": ["https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"],
+    }
+    assert post.method == "POST" and set(json.loads(post.body)) == {"luminosity", "@context"}
+    assert delete.method == "DELETE"
+    assert not room.dirty
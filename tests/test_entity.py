@@ -16,7 +16,7 @@ from pytest import fixture
 from datetime import datetime
 from dateutil.tz import UTC
 from ngsildclient.model.entity import Entity, mkprop, mkgprop, mktprop, mkrel
-from ngsildclient.model.constants import MultAttrValue
+from ngsildclient.model.constants import AttrValue, MultAttrValue
 from ngsildclient.model.helper.postal import PostalAddressBuilder
 
 
@@ -155,6 +155,33 @@ def test_air_quality_from_dict(expected_air_quality):
     assert e.to_dict() == expected_air_quality
 
 
+def test_air_quality_from_broker(expected_air_quality):
+    payload = {
+        "id": "urn:ngsi-ld:AirQualityObserved:RZ:Obsv4567",
+        "type": "AirQualityObserved",
+        "dateObserved": {
+            "type": "Property",
+            "value": {"@type": "DateTime", "@value": "2018-08-07T12:00:00Z"},
+        },
+        "NO2": {"type": "Property", "value": 22, "unitCode": "GP"},
+        "refPointOfInterest": {
+            "type": "Relationship",
+            "object": "urn:ngsi-ld:PointOfInterest:RZ:MainSquare",
+        },
+    }
+    e = Entity.from_broker(payload)
+    assert e.to_dict() == expected_air_quality
+    assert e["NO2.value"] == 22
+    e.prop("NO2", 23).prop("accuracy", 0.95, nested=True)
+    assert e["NO2.accuracy.value"] == 0.95
+
+
+def test_from_broker_empty_context():
+    payload = {"id": "urn:ngsi-ld:RoomObserved:Room1", "type": "RoomObserved", "@context": []}
+    e = Entity.from_broker(payload)
+    assert e.ctx == Entity("RoomObserved", "Room1").ctx
+
+
 def test_air_quality_from_json_file(expected_air_quality):
     filename = pkg_resources.resource_filename(__name__, "data/air_quality.json")
     e = Entity.load(filename)
@@ -364,3 +391,146 @@ def test_store_1_many_relationship():
     m.add("Shelf002", datasetid="Relationship:2")
     e.rel("furniture", m)
     assert e.to_dict() == expected_dict("store_1_many_relationship")
+
+
+def test_clone_copy_on_write():
+    template = Entity("RoomObserved", "Room0").prop("pressure", 720).prop("accuracy", 0.9, nested=True)
+    template.prop("temperature", 20)
+
+    def f(e: Entity, i: int):
+        e.id = f"urn:ngsi-ld:RoomObserved:Room{i}"
+        e["temperature"].value = 20 + i
+
+    rooms = Entity.clone(template, 3, f)
+    assert [room.id for room in rooms] == [f"urn:ngsi-ld:RoomObserved:Room{i}" for i in range(1, 4)]
+    assert [room["temperature.value"] for room in rooms] == [21, 22, 23]
+    assert template["temperature.value"] == 20
+    assert rooms[0].root._raw["@context"] is template.root._raw["@context"]
+    assert rooms[0].root._raw["pressure"] is rooms[1].root._raw["pressure"]
+    rooms[0]["pressure.value"] = 730
+    rooms[1].prop("humidity", 40).prop("accuracy", 0.8, nested=True)
+    template["pressure"].value = 740
+    assert [room["pressure.value"] for room in rooms] == [730, 720, 720]
+    assert template["pressure.value"] == 740
+    assert "humidity" not in template.root and "humidity" not in rooms[0].root
+    assert rooms[1]["humidity.accuracy.value"] == 0.8
+    rooms[2].prop("precision", 2, nested=True)
+    assert rooms[2]["temperature.precision.value"] == 2
+    assert "precision" not in template["temperature"]
+
+
+def test_clone_exposed_dicts_are_independent():
+    template = Entity("RoomObserved", "Room0").prop("temperature", 20).prop("pressure", 720)
+    a, b, c = template * 3
+    a.to_dict()["temperature"]["value"] = 5
+    for _, attr in b.root.items():
+        if isinstance(attr, dict) and "value" in attr:
+            attr["value"] = 6
+    c.root.data["pressure"]["value"] = 730
+    assert [a["temperature.value"], b["temperature.value"], c["temperature.value"]] == [5, 6, 20]
+    assert [a["pressure.value"], b["pressure.value"], c["pressure.value"]] == [720, 6, 730]
+    assert template.to_dict()["temperature"]["value"] == 20 and template["pressure.value"] == 720
+    assert template.to_dict() == template.dup().to_dict()
+
+
+def test_clone_views_held_across_copies():
+    e = Entity("RoomObserved", "Room1").prop("temperature", 20).prop("NO2", 3)
+    t = e["temperature"]
+    copies = e * 2
+    t.value = 99
+    assert [c["temperature.value"] for c in copies] == [20, 20]
+    no2 = e["NO2"]
+    e["NO2.value"] = 4  # drops the cached view, not the caller's reference
+    clones = Entity.clone(e, 2)
+    no2.value = 5
+    assert [c["NO2.value"] for c in clones] == [4, 4]
+    assert e["temperature.value"] == 99 and e["NO2.value"] == 5
+
+
+def test_change_tracking():
+    room = Entity.from_broker(
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "value": 20},
+            "pressure": {"type": "Property", "value": 720},
+            "humidity": {"type": "Property", "value": 40},
+        },
+        track=True,
+    )
+    assert room.tracked and not room.dirty
+    assert not Entity.from_broker(room.to_dict()).tracked  # opt-in
+    assert room["pressure.value"] == 720  # read only
+    room["temperature"].value = 21
+    room.prop("luminosity", 300)
+    room.rm("humidity")
+    assert room.changes() == (["luminosity"], ["temperature"], ["humidity"])
+    assert room.changed_dict() == {
+        "id": "urn:ngsi-ld:RoomObserved:Room1",
+        "type": "RoomObserved",
+        "@context": ["https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"],
+        "temperature": {"type": "Property", "value": 21},
+        "luminosity": {"type": "Property", "value": 300},
+    }
+    room.mark_synced()
+    assert not room.dirty
+    room.prop("accuracy", 0.9, nested=True)  # property chaining restarts from the root
+    room["luminosity.value"] = 310
+    assert room.changes() == (["accuracy"], ["luminosity"], [])
+    assert not room.dup().tracked
+    untracked = Entity("RoomObserved", "Room2").prop("temperature", 20)
+    assert not untracked.tracked
+    assert untracked.changes() == (["temperature"], [], [])
+
+
+def test_change_tracking_raw_dict():
+    def room():
+        payload = {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "value": 20},
+            "pressure": {"type": "Property", "value": 720},
+        }
+        return Entity.from_broker(payload, track=True)
+
+    e = room()
+    e.to_dict()["temperature"]["value"] = 99
+    assert e.changes() == ([], ["temperature"], [])
+    e = room()
+    for name, attr in e.root.items():
+        if name == "pressure":
+            attr["value"] = 730
+    assert e.changes() == ([], ["pressure"], [])
+    e = room()
+    e.root.data["temperature"]["value"] = 21
+    assert e.dirty
+    e.mark_synced()
+    assert not e.dirty
+    e.to_dict()["pressure"]["value"] = 740
+    assert e.changes() == ([], ["pressure"], [])
+    assert e.changed_dict()["pressure"]["value"] == 740
+
+
+def test_clone_nested_last_property():
+    template = Entity("RoomObserved", "Room0").prop("temperature", 20).anchor().prop("accuracy", 0.9)
+    rooms = template * 2
+    rooms[0].prop("precision", 2)
+    assert rooms[0]["temperature.precision.value"] == 2
+    assert "precision" not in template["temperature"]
+    assert "precision" not in rooms[1]["temperature"]
+
+
+def test_slotted():
+    e = Entity("RoomObserved", "Room0").prop("temperature", 20)
+    assert not hasattr(e, "__dict__")
+    assert not hasattr(e.root, "__dict__")
+    assert not hasattr(e["temperature"], "__dict__")
+
+
+def test_slotted_attr_values():
+    v = AttrValue(1, unitcode="CEL")
+    assert not hasattr(v, "__dict__")
+    assert v == AttrValue(1, unitcode="CEL") and v.userdata == {}
+    mv = MultAttrValue().add(1, datasetid="urn:ngsi-ld:Dataset:1")
+    assert not hasattr(mv, "__dict__")
+    assert len(mv) == 1 and mv.attrvalues[0].datasetid == "urn:ngsi-ld:Dataset:1"
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+import pytest
+
+from datetime import datetime, date
+from dateutil import tz
+
+from ngsildclient.utils import iso8601
+from ngsildclient.model.entity import Entity
+from ngsildclient.model.helper.columnar import ColumnarEntityBuilder, temporal_column
+
+
+def test_build_columnar_same_as_entity():
+    data = {
+        "name": ["falcon", "dog"],
+        "legs": [2, 4],
+        "seen": [datetime(2022, 1, 12, 12, 54, 38), "2022-01-13T08:00:00Z"],
+        "lat": [43.6046, 48.8566],
+        "lon": [1.4442, 2.3522],
+        "owner": ["Person:John", "urn:ngsi-ld:Person:Jane"],
+    }
+    builder = ColumnarEntityBuilder("SpecimenObserved", "name")
+    builder.obs("seen").prop("legs", "legs", unitcode="C62", observedat="seen").loc("lat", "lon").rel("owner", "owner")
+    entities = builder.build(data)
+    for i, name in enumerate(data["name"]):
+        e = Entity("SpecimenObserved", name)
+        e.obs(data["seen"][i])
+        e.prop("legs", data["legs"][i], unitcode="C62", observedat=data["seen"][i])
+        e.loc(data["lat"][i], data["lon"][i])
+        e.rel("owner", data["owner"][i])
+        assert entities[i] == e.to_dict()
+
+
+def test_build_columnar_missing_values():
+    data = {
+        "id": ["urn:ngsi-ld:Room:Room1", "Room2"],
+        "temperature": [20.5, float("nan")],
+        "updated": [None, "2022-01-13"],
+    }
+    entities = (
+        ColumnarEntityBuilder("Room", "id").prop("temperature", "temperature").tprop("updated", "updated").build(data)
+    )
+    assert [e["id"] for e in entities] == ["urn:ngsi-ld:Room:Room1", "urn:ngsi-ld:Room:Room2"]
+    assert entities[0]["temperature"] == {"type": "Property", "value": 20.5}
+    assert "updated" not in entities[0]
+    assert "temperature" not in entities[1]
+    assert entities[1]["updated"] == {"type": "Property", "value": {"@type": "Date", "@value": "2022-01-13"}}
+
+
+def test_temporal_column():
+    assert temporal_column([date(2022, 1, 12), None]) == [("Date", "2022-01-12"), None]
+    paris = datetime(2022, 1, 12, 13, 54, 38, 500, tzinfo=tz.gettz("Europe/Paris"))
+    assert temporal_column([paris]) == [("DateTime", iso8601.from_datetime(paris))]
+    with pytest.raises(ValueError):
+        temporal_column(["not a date"])
+
+
+def expected_specimens(names, legs, seen, lats, lons) -> list:
+    entities = []
+    for name, n, t, lat, lon in zip(names, legs, seen, lats, lons):
+        e = Entity("SpecimenObserved", name)
+        if t is not None:
+            e.obs(t)
+        e.prop("legs", n, observedat=t).loc(lat, lon)
+        entities.append(e.to_dict())
+    return entities
+
+
+def test_build_columnar_dataframe():
+    pandas = pytest.importorskip("pandas")
+    seen = [datetime(2022, 1, 12, 12, 54, 38), datetime(2022, 1, 13, 8, 0, 0)]
+    df = pandas.DataFrame(
+        {
+            "name": ["falcon", "dog"],
+            "legs": [2, 4],  # int64
+            "seen": pandas.to_datetime(seen).tz_localize("Europe/Paris"),  # converted to UTC
+            "lat": [43.6046, 48.8566],
+            "lon": [1.4442, 2.3522],
+        }
+    )
+    builder = ColumnarEntityBuilder("SpecimenObserved", "name")
+    entities = builder.obs("seen").prop("legs", "legs", observedat="seen").loc("lat", "lon").build(df)
+    utc = [t.to_pydatetime().astimezone(tz.UTC) for t in df["seen"]]
+    assert entities == expected_specimens(df["name"], [2, 4], utc, df["lat"], df["lon"])
+    assert all(type(e["legs"]["value"]) is int for e in entities)
+
+    df["seen"] = pandas.to_datetime([seen[0], None])  # naive, taken as UTC, with NaT
+    entities = ColumnarEntityBuilder("SpecimenObserved", "name").obs("seen").build(df)
+    assert entities[0]["dateObserved"]["value"]["@value"] == "2022-01-12T12:54:38Z"
+    assert "dateObserved" not in entities[1]
+
+
+def test_build_columnar_numpy():
+    numpy = pytest.importorskip("numpy")
+    data = {
+        "name": numpy.array(["falcon", "dog"]),
+        "legs": numpy.array([2, 4], dtype=numpy.int64),
+        "seen": numpy.array(["2022-01-12T12:54:38", "NaT"], dtype="datetime64[ms]"),
+        "lat": numpy.array([43.6046, 48.8566]),
+        "lon": numpy.array([1.4442, 2.3522]),
+    }
+    builder = ColumnarEntityBuilder("SpecimenObserved", "name")
+    entities = builder.obs("seen").prop("legs", "legs", observedat="seen").loc("lat", "lon").build(data)
+    seen = [datetime(2022, 1, 12, 12, 54, 38), None]
+    assert entities == expected_specimens(["falcon", "dog"], [2, 4], seen, [43.6046, 48.8566], [1.4442, 2.3522])
+    assert all(
+        type(e["legs"]["value"]) is int and type(e["location"]["value"]["coordinates"][0]) is float for e in entities
+    )
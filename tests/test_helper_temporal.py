@@ -9,6 +9,8 @@
 #
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
+import pytest
+
 from datetime import datetime
 from dateutil.tz import UTC
 from ngsildclient.api.helper.temporal import TemporalQuery, TimeProperty
@@ -89,3 +91,26 @@ def test_build_temporal_query_between_str():
     assert tq["timerel"] == "between"
     assert tq["timeAt"] == "2022-08-23T12:00:00Z"
     assert tq["endTimeAt"] == "2022-09-23T12:00:00Z"
+
+
+def test_split_temporal_query():
+    tq = TemporalQuery().between("2022-01-01T00:00:00Z", "2022-01-01T00:00:03Z", TimeProperty.CREATED_AT)
+    slices = tq.split(3)
+    assert [(s["timeAt"], s["endTimeAt"]) for s in slices] == [
+        ("2022-01-01T00:00:00Z", "2022-01-01T00:00:01Z"),
+        ("2022-01-01T00:00:01Z", "2022-01-01T00:00:02Z"),
+        ("2022-01-01T00:00:02Z", "2022-01-01T00:00:03Z"),
+    ]
+    assert all(s["timeproperty"] == "createdAt" for s in slices)
+    assert len(tq.split(10)) == 3  # boundaries rounded to the second
+    with pytest.raises(ValueError):
+        TemporalQuery().before().split(2)
+
+
+def test_split_temporal_query_fractional_start():
+    tq = TemporalQuery().between("2022-01-01T00:00:00.700Z", "2022-01-01T00:00:02Z")
+    slices = tq.split(4)
+    assert [(s["timeAt"], s["endTimeAt"]) for s in slices] == [
+        ("2022-01-01T00:00:00.700Z", "2022-01-01T00:00:01Z"),
+        ("2022-01-01T00:00:01Z", "2022-01-01T00:00:02Z"),
+    ]
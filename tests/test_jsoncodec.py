@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+import json
+import pytest
+
+from datetime import datetime
+from pathlib import Path
+
+from ngsildclient.model.entity import Entity
+from ngsildclient.settings import globalsettings
+from ngsildclient.utils import jsoncodec
+
+
+@pytest.fixture
+def entity() -> Entity:
+    e = Entity("OffStreetParking", "Downtown1")
+    e.prop("name", "Bösebrücke").prop("availableSpotNumber", 121).prop("reliability", 0.7, nested=True)
+    e.loc((52.5547, 13.3986))
+    return e
+
+
+def test_codec_stdlib(entity):
+    codec = jsoncodec.get_codec("json")
+    assert json.loads(codec.dumpb(entity)) == entity.to_dict()
+    assert "Bösebrücke".encode() in codec.dumpb(entity)
+    assert codec.dumps(entity.root, indent=2) == json.dumps(entity.to_dict(), ensure_ascii=False, indent=2)
+    assert codec.loads(codec.dumpb(entity)) == entity.to_dict()
+
+
+def test_codec_orjson(entity):
+    pytest.importorskip("orjson")
+    codec = jsoncodec.get_codec("orjson")
+    assert codec.dumpb(entity) == jsoncodec.get_codec("json").dumpb(entity)
+    assert codec.dumps(entity, indent=2) == jsoncodec.get_codec("json").dumps(entity, indent=2)
+    assert codec.loads(codec.dumpb(entity)) == entity.to_dict()
+    leftovers = {"date": datetime(2021, 1, 1), "path": Path("/tmp/x")}
+    assert codec.dumpb(leftovers) == jsoncodec.get_codec("json").dumpb(leftovers)
+
+
+def test_codec_msgspec(entity):
+    pytest.importorskip("msgspec")
+    codec = jsoncodec.get_codec("msgspec")
+    assert codec.dumpb(entity) == jsoncodec.get_codec("json").dumpb(entity)
+    assert json.loads(codec.dumps(entity, indent=2)) == entity.to_dict()
+    assert codec.loads(codec.dumpb(entity)) == entity.to_dict()
+
+
+def test_codec_leftover_objects():
+    codec = jsoncodec.get_codec("json")
+    assert codec.dumps({"p": Path("/tmp/x")}) == '{"p": "/tmp/x"}'
+    assert jsoncodec.unwrap(Path("/tmp/x")) == Path("/tmp/x")
+
+
+def test_codec_settings():
+    jsonlib = globalsettings.jsonlib
+    assert jsonlib == "json"  # the output doesn't depend on the packages installed
+    try:
+        globalsettings.jsonlib = "json"
+        assert jsoncodec.get_codec().name == "json"
+        globalsettings.jsonlib = "unknown"
+        with pytest.raises(ValueError):
+            jsoncodec.get_codec()
+    finally:
+        globalsettings.jsonlib = jsonlib
+
+
+def test_codec_plain_structures(entity):
+    entity["speed"] = entity["availableSpotNumber"] * 2
+    for attr in ("name", "availableSpotNumber", "location"):
+        assert type(entity.to_dict()[attr]) is dict
+    assert all(type(x) is dict for x in entity.to_dict()["speed"])
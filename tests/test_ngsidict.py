@@ -31,6 +31,25 @@ def test_type():
     assert prop.type == "Property"
 
 
+def test_attr_view_cached():
+    d = {
+        "@context": ["https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"],
+        "id": "urn:ngsi-ld:Barn:Barn001",
+        "type": "Barn",
+        "fillingLevel": {"type": "Property", "value": 0.6},
+    }
+    e = Entity(d)
+    prop = e["fillingLevel"]
+    assert e["fillingLevel"] is prop
+    assert e.root.get("fillingLevel") is prop
+    prop.value = 0.7
+    assert e["fillingLevel.value"] == 0.7
+    e["fillingLevel"] = {"type": "Relationship", "object": "urn:ngsi-ld:Tank:Tank001"}
+    assert e["fillingLevel"].type == "Relationship"
+    e.root.data["fillingLevel"] = {"type": "Property", "value": 0.5}
+    assert e["fillingLevel"].value == 0.5
+
+
 def test_prop():
     p = NgsiDict.mkprop(22)
     assert p == {"type": "Property", "value": 22}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+import pytest
+import threading
+
+from ngsildclient.utils.prefetch import prefetch, aprefetch
+
+
+def test_prefetch_order():
+    assert list(prefetch(range(10), 3)) == list(range(10))
+
+
+def test_prefetch_ahead():
+    fetched = []
+
+    def pages():
+        for i in range(10):
+            fetched.append(i)
+            yield i
+
+    it = prefetch(pages(), 2)
+    assert next(it) == 0
+    for _ in range(50):  # let the background thread fill the queue
+        if len(fetched) == 4:
+            break
+        threading.Event().wait(0.01)
+    assert fetched == [0, 1, 2, 3]  # the current one, 2 queued, 1 pending
+    it.close()
+
+
+def test_prefetch_error():
+    def pages():
+        yield 1
+        raise ValueError("broker down")
+
+    it = prefetch(pages(), 2)
+    assert next(it) == 1
+    with pytest.raises(ValueError, match="broker down"):
+        next(it)
+
+
+@pytest.mark.asyncio
+async def test_aprefetch():
+    async def pages():
+        for i in range(5):
+            yield i
+        raise ValueError("broker down")
+
+    result = []
+    with pytest.raises(ValueError, match="broker down"):
+        async for page in aprefetch(pages(), 2):
+            result.append(page)
+    assert result == list(range(5))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+import re
+import pytest
+
+from datetime import datetime
+
+from ngsildclient.model.entity import Entity
+from ngsildclient.model.constants import MultAttrValue
+from ngsildclient.model.template import EntityTemplate
+
+
+def build_entity(id: str, date: datetime, no2: float, accuracy: float, lat: float, lon: float, poi: str) -> Entity:
+    e = Entity("AirQualityObserved", id)
+    e.obs(date)
+    e.prop("NO2", no2, unitcode="GP", observedat=date).anchor().prop("accuracy", accuracy).unanchor()
+    e.loc(lat, lon)
+    e.rel("refPointOfInterest", poi)
+    return e
+
+
+def test_template_same_as_entity():
+    sample = build_entity("RZ:Obsv0", datetime(2018, 8, 7, 12), 22, 0.95, 43.6, 1.44, "PointOfInterest:RZ:MainSquare")
+    template = EntityTemplate(
+        sample,
+        date="dateObserved",
+        no2="NO2",
+        observed="NO2.observedAt",
+        accuracy="NO2.accuracy",
+        location="location",
+        poi="refPointOfInterest",
+    )
+    date = datetime(2022, 1, 12, 12, 54, 38)
+    e = template.new(
+        "RZ:Obsv1",
+        date=date,
+        no2=23,
+        observed=date,
+        accuracy=0.9,
+        location=(48.85, 2.35),
+        poi="PointOfInterest:RZ:Park",
+    )
+    assert e == build_entity("RZ:Obsv1", date, 23, 0.9, 48.85, 2.35, "PointOfInterest:RZ:Park")
+    assert e["NO2.accuracy.value"] == 0.9
+    other = template.new(
+        "RZ:Obsv2",
+        date=date,
+        no2=24,
+        observed=date,
+        accuracy=0.9,
+        location=(48.85, 2.35),
+        poi="PointOfInterest:RZ:Park",
+    )
+    assert other.root.data["@context"] is not e.root.data["@context"]
+    assert other.id == "urn:ngsi-ld:AirQualityObserved:RZ:Obsv2"
+
+
+def test_template_multi_attribute():
+    m = MultAttrValue()
+    m.add(55.0, datasetid="Property:speedometerA4567-speed")
+    m.add(54.5, datasetid="Property:gpsBxyz123-speed")
+    template = EntityTemplate(Entity("Vehicle", "A0").prop("speed", m), speedometer="speed[0]", gps="speed[1]")
+    d = template.build("A4567", speedometer=60.0, gps=59.5)
+    assert [x["value"] for x in d["speed"]] == [60.0, 59.5]
+    assert d["speed"][1]["datasetId"] == "urn:ngsi-ld:Property:gpsBxyz123-speed"
+    with pytest.raises(ValueError):
+        template.build("A4568", speedometer=60.0)
+
+
+def test_template_invalid_path():
+    sample = Entity("RoomObserved", "Room0").prop("temperature", 20).prop("speed", MultAttrValue().add(55.0))
+    for path in ("temprature.value", "temperature.foo.bar", "temperature.value.unit", "speed[3]"):
+        with pytest.raises(ValueError, match=f"Invalid path '{re.escape(path)}' for slot 't'"):
+            EntityTemplate(sample, t=path)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Software Name: ngsildclient
+# SPDX-FileCopyrightText: Copyright (c) 2021 Orange
+# SPDX-License-Identifier: Apache 2.0
+#
+# This software is distributed under the Apache 2.0;
+# see the NOTICE file for more details.
+#
+# Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
+
+import asyncio
+import re
+import pytest
+
+from pytest_httpx import HTTPXMock
+
+from ngsildclient.api.asyn.client import AsyncClient
+from ngsildclient.api.constants import AggrMethod
+from ngsildclient.api.helper.temporal import TemporalQuery
+
+
+@pytest.mark.asyncio
+async def test_api_temporal_aggregate_local_paginated(mocked_connected, httpx_mock: HTTPXMock):
+    url = re.compile(r"http://localhost:1026/ngsi-ld/v1/temporal/entities\?.*")
+    troe = {
+        "id": "urn:ngsi-ld:RoomObserved:Room1",
+        "type": "RoomObserved",
+        "temperature": {"type": "Property", "values": [[20, "2022-09-29T04:10:00Z"]]},
+    }
+    httpx_mock.add_response(method="GET", url=url, json=[troe], headers={"Next-Page": "page2"})
+    troe2 = {**troe, "temperature": {"type": "Property", "values": [[22, "2022-09-29T04:50:00Z"]]}}
+    httpx_mock.add_response(method="GET", url=url, json=[troe2])
+    client = AsyncClient()
+    tq = TemporalQuery().between("2022-09-29T00:00:00Z", "2022-09-30T00:00:00Z")
+    r = await client.temporal.aggregate(type="RoomObserved", tq=tq, methods=[AggrMethod.AVERAGE], local=True)
+    assert r.result[0]["temperature"]["avg"] == [[21.0, "2022-09-29T00:00:00Z", "2022-09-30T00:00:00Z"]]
+
+
+@pytest.mark.asyncio
+async def test_api_temporal_query_slices_max_inflight(mocked_connected, monkeypatch):
+    inflight, peak, windows = [0], [0], []
+
+    async def query_all(*args, **kwargs):
+        inflight[0] += 1
+        peak[0] = max(peak[0], inflight[0])
+        windows.append(args[7])
+        await asyncio.sleep(0.01)
+        inflight[0] -= 1
+        return []
+
+    client = AsyncClient()
+    monkeypatch.setattr(client.temporal, "_query_all", query_all)
+    tq = TemporalQuery().between("2022-01-01T00:00:00Z", "2023-01-01T00:00:00Z")
+    await client.temporal.query(type="RoomObserved", tq=tq, slices=24, max_inflight=3)
+    assert len(windows) == 24
+    assert peak[0] == 3
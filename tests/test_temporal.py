@@ -9,9 +9,22 @@
 #
 # Author: Fabien BATTELLO <fabien.battello@orange.com> et al.
 
-from datetime import datetime
+import json
+import threading
+import time
+import pytest
+
+from datetime import datetime, timedelta
 from dateutil.tz import UTC
-from ngsildclient.api.temporal import _troes_to_dfdict
+from urllib.parse import parse_qs, urlparse
+
+from ngsildclient.api.client import Client
+from ngsildclient.api.helper.temporal import TemporalQuery
+from ngsildclient.api.temporal_sync import TemporalSync
+from ngsildclient.api.temporal_cache import TemporalCache
+from ngsildclient.api.temporal_aggr import aggregate_troes
+from ngsildclient.api.constants import AggrMethod
+from ngsildclient.api.temporal import _instants, _troes_to_dfdict, _troes_to_columns, troes_to_dataframe, merge_troes
 
 troes_1entity_1attr_2measures = [
     {
@@ -124,3 +137,379 @@ def test_to_dfdict_2entities_2attrs_2measures():
         "temperature": [21.7, 21.6, 22.7, 22.6],
         "pressure": [721, 720, 731, 730],
     }
+
+
+troes_2entities_misaligned = [
+    {
+        "id": "urn:ngsi-ld:RoomObserved:Room1",
+        "type": "RoomObserved",
+        "temperature": {"type": "Property", "values": [[21.7, "2022-09-29T04:16:10Z"], [21.6, "2022-09-29T06:16:10Z"]]},
+        "pressure": {"type": "Property", "values": [[721, "2022-09-29T05:16:10Z"]]},
+    },
+    {
+        "id": "urn:ngsi-ld:RoomObserved:Room2",
+        "type": "RoomObserved",
+        "temperature": {"type": "Property", "values": [[22.7, "2022-09-29T04:16:10Z"]]},
+    },
+]
+
+
+def test_to_columns_misaligned():
+    columns = _troes_to_columns(troes_2entities_misaligned)
+    assert columns == {
+        "RoomObserved": ["Room1", "Room1", "Room1", "Room2"],
+        "observed": ["2022-09-29T04:16:10Z", "2022-09-29T05:16:10Z", "2022-09-29T06:16:10Z", "2022-09-29T04:16:10Z"],
+        "temperature": [21.7, None, 21.6, 22.7],
+        "pressure": [None, 721, None, None],
+    }
+
+
+def test_to_columns_long():
+    columns = _troes_to_columns(troes_2entities_misaligned, layout="long")
+    assert columns == {
+        "RoomObserved": ["Room1", "Room1", "Room1", "Room2"],
+        "observed": ["2022-09-29T04:16:10Z", "2022-09-29T06:16:10Z", "2022-09-29T05:16:10Z", "2022-09-29T04:16:10Z"],
+        "attribute": ["temperature", "temperature", "pressure", "temperature"],
+        "value": [21.7, 21.6, 721, 22.7],
+    }
+
+
+troes_mixed_timestamp_formats = {
+    "id": "urn:ngsi-ld:RoomObserved:Room1",
+    "type": "RoomObserved",
+    "temperature": {
+        "type": "Property",
+        "values": [
+            [21.7, "2022-09-29T04:16:10Z"],
+            [21.6, "2022-09-29T04:16:10.500Z"],
+            [21.5, "2022-09-29T06:16:11+02:00"],
+            [21.4, "2022-09-29T04:16:12"],
+        ],
+    },
+}
+
+mixed_timestamp_instants = [
+    datetime(2022, 9, 29, 4, 16, 10, tzinfo=UTC),
+    datetime(2022, 9, 29, 4, 16, 10, 500000, tzinfo=UTC),
+    datetime(2022, 9, 29, 4, 16, 11, tzinfo=UTC),
+    datetime(2022, 9, 29, 4, 16, 12, tzinfo=UTC),
+]
+
+
+def test_to_dataframe():
+    pandas = pytest.importorskip("pandas")
+    df = troes_to_dataframe(troes_2entities_misaligned)
+    assert isinstance(df["RoomObserved"].dtype, pandas.CategoricalDtype)
+    assert isinstance(df["observed"].dtype, pandas.DatetimeTZDtype) and str(df["observed"].dtype.tz) == "UTC"
+    assert df["pressure"].isna().tolist() == [True, False, True, True]
+    df = troes_to_dataframe(troes_mixed_timestamp_formats)
+    assert df["observed"].tolist() == [pandas.Timestamp(t) for t in mixed_timestamp_instants]
+
+
+def test_instants_mixed_timestamp_formats():
+    timestamps = [
+        "2022-09-29T04:16:10Z",
+        "2022-09-29T04:16:10.500Z",
+        "2022-09-29T06:16:11+02:00",
+        "2022-09-29T04:16:12",
+    ]
+    instants = _instants(timestamps)
+    assert [instants[t] for t in timestamps] == mixed_timestamp_instants
+
+
+def test_merge_troes():
+    part1 = [
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": [[21.7, "2022-09-29T04:16:10Z"]]},
+        },
+    ]
+    part2 = [
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room2",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": [[22.7, "2022-09-29T06:16:10Z"]]},
+        },
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": [[21.6, "2022-09-29T06:16:10Z"]]},
+        },
+    ]
+    troes = merge_troes(part1, part2)
+    assert [troe["id"] for troe in troes] == ["urn:ngsi-ld:RoomObserved:Room1", "urn:ngsi-ld:RoomObserved:Room2"]
+    assert troes[0]["temperature"]["values"] == [[21.7, "2022-09-29T04:16:10Z"], [21.6, "2022-09-29T06:16:10Z"]]
+    assert part1[0]["temperature"]["values"] == [[21.7, "2022-09-29T04:16:10Z"]]  # left untouched
+
+
+def test_api_temporal_query_slices(mocked_connected, requests_mock):
+    def troes(request, context):
+        start = parse_qs(urlparse(request.url).query)["timeAt"][0]
+        return [
+            {
+                "id": "urn:ngsi-ld:RoomObserved:Room1",
+                "type": "RoomObserved",
+                "temperature": {"type": "Property", "values": [[21, start]]},
+            }
+        ]
+
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/temporal/entities", status_code=200, json=troes)
+    client = Client()
+    tq = TemporalQuery().between("2022-01-01T00:00:00Z", "2022-01-05T00:00:00Z")
+    r = client.temporal.query(type="RoomObserved", tq=tq, slices=4)
+    assert len(requests_mock.request_history[-4:]) == 4
+    assert r[0]["temperature"]["values"] == [
+        [21, "2022-01-01T00:00:00Z"],
+        [21, "2022-01-02T00:00:00Z"],
+        [21, "2022-01-03T00:00:00Z"],
+        [21, "2022-01-04T00:00:00Z"],
+    ]
+    with pytest.raises(ValueError):
+        client.temporal.query(type="RoomObserved", slices=4)
+
+
+def test_api_temporal_query_slices_max_inflight(mocked_connected, requests_mock):
+    lock, inflight, peak, workers = threading.Lock(), [0], [0], set()
+
+    def troes(request, context):
+        with lock:
+            inflight[0] += 1
+            peak[0] = max(peak[0], inflight[0])
+            workers.add(threading.current_thread().name)
+        time.sleep(0.01)
+        with lock:
+            inflight[0] -= 1
+        return []
+
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/temporal/entities", status_code=200, json=troes)
+    client = Client()
+    tq = TemporalQuery().between("2022-01-01T00:00:00Z", "2023-01-01T00:00:00Z")
+    client.temporal.query(type="RoomObserved", tq=tq, slices=24, max_inflight=3)
+    assert len([req for req in requests_mock.request_history if "temporal" in req.path]) == 24
+    assert peak[0] <= 3
+    assert len(workers) <= 3
+
+
+def test_temporal_sync_watermarks(mocked_connected, requests_mock, tmp_path):
+    troes = [
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {
+                "type": "Property",
+                "values": [[21.7, "2022-09-29T04:16:10Z"], [21.6, "2022-09-29T06:16:10Z"]],
+            },
+        },
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room2",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": [[22.7, "2022-09-29T04:16:10Z"]]},
+        },
+    ]
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/temporal/entities", status_code=200, json=troes)
+    client = Client()
+    statefile = tmp_path / "rooms.json"
+    sync = TemporalSync(client, statefile, type="RoomObserved", start="2022-09-29T00:00:00Z")
+    assert len(list(sync.deltas())) == 2
+    assert requests_mock.last_request.qs["timeat"] == ["2022-09-29t00:00:00z"]
+
+    troes[0]["temperature"]["values"].append([21.5, "2022-09-29T08:16:10Z"])
+    sync = TemporalSync(client, statefile, type="RoomObserved", start="2022-09-29T00:00:00Z")
+    assert sync.watermark("urn:ngsi-ld:RoomObserved:Room1") == "2022-09-29T06:16:10Z"
+    deltas = list(sync.deltas())
+    assert requests_mock.last_request.qs["timeat"] == ["2022-09-29t04:16:10z"]  # the oldest watermark
+    assert deltas == [
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": [[21.5, "2022-09-29T08:16:10Z"]]},
+        }
+    ]
+    assert TemporalSync(client, statefile, type="RoomObserved").watermark("urn:ngsi-ld:RoomObserved:Room1") == (
+        "2022-09-29T08:16:10Z"
+    )
+
+
+def test_temporal_cache_fetches_gaps_only(mocked_connected, requests_mock, tmp_path):
+    days = [f"2022-01-0{d}T00:00:00Z" for d in range(1, 8)]
+
+    def troe(request, context):
+        qs = parse_qs(urlparse(request.url).query)
+        start, end = qs["timeAt"][0], qs["endTimeAt"][0]
+        values = [[i, day] for i, day in enumerate(days) if start <= day < end]
+        return {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": values},
+        }
+
+    url = "http://localhost:1026/ngsi-ld/v1/temporal/entities/urn:ngsi-ld:RoomObserved:Room1"
+    requests_mock.get(url, status_code=200, json=troe)
+    client = Client()
+    cache = TemporalCache(tmp_path)
+    tq = TemporalQuery().between(days[0], days[4])
+    r = client.temporal.get("RoomObserved:Room1", attrs=["temperature"], tq=tq, cache=cache)
+    assert r[0]["temperature"]["values"] == [[0, days[0]], [1, days[1]], [2, days[2]], [3, days[3]]]
+
+    tq = TemporalQuery().between(days[2], days[6])
+    r = client.temporal.get("RoomObserved:Room1", attrs=["temperature"], tq=tq, cache=cache)
+    qs = parse_qs(urlparse(requests_mock.last_request.url).query)
+    assert (qs["timeAt"][0], qs["endTimeAt"][0]) == (days[4], days[6])  # only the gap
+    assert r == [
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {"type": "Property", "values": [[2, days[2]], [3, days[3]], [4, days[4]], [5, days[5]]]},
+        }
+    ]
+    count = requests_mock.call_count
+    r2 = client.temporal.query(eid="RoomObserved:Room1", attrs=["temperature"], tq=tq, cache=TemporalCache(tmp_path))
+    assert requests_mock.call_count == count  # fully covered, read back from disk
+    assert r2 == r
+
+
+def test_aggregate_troes():
+    troes = [
+        {
+            "id": "urn:ngsi-ld:RoomObserved:Room1",
+            "type": "RoomObserved",
+            "temperature": {
+                "type": "Property",
+                "values": [[20, "2022-09-29T04:10:00Z"], [22, "2022-09-29T04:50:00Z"], [20, "2022-09-29T05:10:00Z"]],
+            },
+        }
+    ]
+    aggr = aggregate_troes(troes, list(AggrMethod), timedelta(hours=1))
+    temperature = aggr[0]["temperature"]
+    first, second = ["2022-09-29T04:00:00Z", "2022-09-29T05:00:00Z"], ["2022-09-29T05:00:00Z", "2022-09-29T06:00:00Z"]
+    assert temperature["totalCount"] == [[2, *first], [1, *second]]
+    assert temperature["distinctCount"] == [[2, *first], [1, *second]]
+    assert temperature["sum"] == [[42, *first], [20, *second]]
+    assert temperature["avg"] == [[21.0, *first], [20.0, *second]]
+    assert temperature["min"] == [[20, *first], [20, *second]]
+    assert temperature["max"] == [[22, *first], [20, *second]]
+    assert temperature["stddev"] == [[1.0, *first], [0.0, *second]]
+    assert temperature["sumsq"] == [[884, *first], [400, *second]]
+    with pytest.raises(ValueError):
+        aggregate_troes(troes, ["avg"])
+
+
+def test_api_temporal_aggregate_local(mocked_connected, requests_mock):
+    requests_mock.get(
+        "http://localhost:1026/ngsi-ld/v1/temporal/entities", status_code=200, json=troes_2entities_misaligned
+    )
+    client = Client()
+    tq = TemporalQuery().between("2022-09-29T00:00:00Z", "2022-09-30T00:00:00Z")
+    r = client.temporal.aggregate(type="RoomObserved", tq=tq, methods=[AggrMethod.MAXIMUM], local=True)
+    assert "aggrMethods" not in requests_mock.last_request.qs
+    assert r.result[0]["temperature"] == {
+        "type": "Property",
+        "max": [[21.7, "2022-09-29T00:00:00Z", "2022-09-30T00:00:00Z"]],
+    }
+    assert r.result[1]["temperature"]["max"] == [[22.7, "2022-09-29T00:00:00Z", "2022-09-30T00:00:00Z"]]
+
+
+def test_temporal_sync_lagging_entity(mocked_connected, requests_mock, tmp_path):
+    statefile = tmp_path / "rooms.json"
+    watermarks = {
+        "urn:ngsi-ld:RoomObserved:Room1": "2022-09-29T04:00:00Z",
+        "urn:ngsi-ld:RoomObserved:Room2": "2022-09-01T00:00:00Z",
+    }
+    statefile.write_text(json.dumps({"type": "RoomObserved", "perEntity": True, "watermarks": watermarks}))
+
+    def troes(request, context):
+        qs = parse_qs(urlparse(request.url).query)
+        room = "Room2" if "id" in qs else "Room1"
+        return [
+            {
+                "id": f"urn:ngsi-ld:RoomObserved:{room}",
+                "type": "RoomObserved",
+                "temperature": {"type": "Property", "values": [[20, "2022-09-29T05:00:00Z"]]},
+            }
+        ]
+
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/temporal/entities", status_code=200, json=troes)
+    sync = TemporalSync(Client(), statefile, type="RoomObserved")
+    assert [troe["id"] for troe in sync.deltas()] == [
+        "urn:ngsi-ld:RoomObserved:Room2",
+        "urn:ngsi-ld:RoomObserved:Room1",
+    ]
+    lagging, others = [parse_qs(urlparse(r.url).query) for r in requests_mock.request_history[-2:]]
+    assert (lagging["id"], lagging["timeAt"]) == (["urn:ngsi-ld:RoomObserved:Room2"], ["2022-09-01T00:00:00Z"])
+    assert "id" not in others and others["timeAt"] == ["2022-09-29T04:00:00Z"]  # not dragged back by Room2
+
+
+def test_temporal_sync_relationship(mocked_connected, requests_mock, tmp_path):
+    statefile = tmp_path / "vehicles.json"
+    statefile.write_text(json.dumps({"type": "Vehicle", "perEntity": True, "watermarks": {}}))
+    troes = [
+        {
+            "id": "urn:ngsi-ld:Vehicle:A4567",
+            "type": "Vehicle",
+            "isParked": {
+                "type": "Relationship",
+                "objects": [["urn:ngsi-ld:OffStreetParking:P1", "2022-09-29T04:00:00Z"]],
+            },
+        }
+    ]
+    requests_mock.get("http://localhost:1026/ngsi-ld/v1/temporal/entities", status_code=200, json=troes)
+    sync = TemporalSync(Client(), statefile, type="Vehicle", start="2022-09-29T00:00:00Z")
+    assert list(sync.deltas()) == troes
+    assert sync.watermark("urn:ngsi-ld:Vehicle:A4567") == "2022-09-29T04:00:00Z"
+    troes[0]["isParked"]["objects"].append(["urn:ngsi-ld:OffStreetParking:P2", "2022-09-29T06:00:00Z"])
+    deltas = list(TemporalSync(Client(), statefile, type="Vehicle").deltas())
+    assert deltas[0]["isParked"]["objects"] == [["urn:ngsi-ld:OffStreetParking:P2", "2022-09-29T06:00:00Z"]]
+
+
+def test_temporal_cache_merges_adjacent_chunks(tmp_path):
+    cache = TemporalCache(tmp_path)
+    eid, t0 = "urn:ngsi-ld:RoomObserved:Room1", 1664424000.0
+    for i in range(10):  # polling, twice a second
+        start = t0 + i * 0.5
+        observed = datetime.fromtimestamp(start, UTC).isoformat().replace("+00:00", "Z")
+        cache.store(eid, "temperature", start, start + 0.5, [[i, observed]])
+    assert cache.covered(eid, "temperature") == [(t0, t0 + 5)]
+    assert (
+        len(list((tmp_path / "urn%3Angsi-ld%3ARoomObserved%3ARoom1" / "temperature").glob("*.json"))) == 2
+    )  # chunk + index
+    assert [v for v, _ in cache.read(eid, "temperature", t0, t0 + 5)] == list(range(10))
+    assert [v for v, _ in TemporalCache(tmp_path).read(eid, "temperature", t0 + 1, t0 + 2)] == [2, 3]
+
+
+def test_temporal_cache_missing_chunk(tmp_path):
+    cache = TemporalCache(tmp_path)
+    eid, t0 = "urn:ngsi-ld:RoomObserved:Room1", 1664424000.0
+    cache.store(eid, "temperature", t0, t0 + 60, [[20, "2022-09-29T04:00:00Z"]])
+    for chunk in (tmp_path / "urn%3Angsi-ld%3ARoomObserved%3ARoom1" / "temperature").glob("*.json"):
+        if chunk.name != "index.json":
+            chunk.unlink()  # removed by hand
+    with pytest.raises(FileNotFoundError):
+        cache.read(eid, "temperature", t0, t0 + 60)
+    assert cache.gaps(eid, "temperature", t0, t0 + 60) == [(t0, t0 + 60)]  # to be retrieved again
+
+
+def test_temporal_query_cache_unsupported_options(mocked_connected, tmp_path):
+    client, cache = Client(), TemporalCache(tmp_path)
+    tq = TemporalQuery().between("2022-09-29T00:00:00Z", "2022-09-30T00:00:00Z")
+    for options in (dict(type="RoomObserved"), dict(q="temperature>20"), dict(lastn=10), dict(slices=4)):
+        with pytest.raises(ValueError):
+            client.temporal.query(eid="RoomObserved:Room1", attrs=["temperature"], tq=tq, cache=cache, **options)
+    with pytest.raises(ValueError):
+        client.temporal.get("RoomObserved:Room1", attrs=["temperature"], verbose=True, tq=tq, cache=cache)
+
+
+def test_to_columns_mixed_timestamp_formats():
+    troe = {
+        "id": "urn:ngsi-ld:RoomObserved:Room1",
+        "type": "RoomObserved",
+        "temperature": {
+            "type": "Property",
+            "values": [[21.7, "2022-09-29T04:16:10Z"], [21.6, "2022-09-29T04:16:10.500Z"]],
+        },
+        "pressure": {"type": "Property", "values": [[721, "2022-09-29T04:16:10+00:00"]]},
+    }
+    columns = _troes_to_columns(troe)
+    assert columns["observed"] == ["2022-09-29T04:16:10Z", "2022-09-29T04:16:10.500Z"]
+    assert columns["temperature"] == [21.7, 21.6]
+    assert columns["pressure"] == [721, None]